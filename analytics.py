@@ -0,0 +1,371 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from schema import DashboardSchema, ECOMMERCE_PLATFORMS, PredictorSchema, SOCIAL_PLATFORMS
+
+# 页面计算逻辑（不依赖Streamlit，可供命令行和基准测试复用）
+# schema 参数为加载时解析好的列结构，缺省时按传入数据的列解析一次
+
+COMBO_COLUMNS = ['IP名称', '商品编号', '销售渠道', '市场']
+
+
+# ---------- 数据大屏 ----------
+
+# 按IP和时间范围过滤
+def filter_dashboard_data(df, selected_ips, start_date, end_date):
+    return df[
+        (df['IP名称'].isin(selected_ips)) &
+        (df['日期'] >= pd.to_datetime(start_date)) &
+        (df['日期'] <= pd.to_datetime(end_date))
+    ].sort_values('日期')
+
+
+# 计算仪表盘指标，返回 (标题, 数值, 副标题) 列表
+def compute_dashboard_kpis(filtered_df, social_platforms, ecommerce_platforms, schema=None):
+    schema = schema or DashboardSchema(filtered_df.columns)
+    actual_df = filtered_df[filtered_df['数据状态'] == '实际']
+    cards = []
+
+    # 1. 日均发帖数 / 2. 日均互动量
+    for title, mapping in [("📤 日均发帖数", schema.post_columns), ("💬 日均互动量", schema.engagement_columns)]:
+        if social_platforms:
+            columns = schema.select(mapping, social_platforms)
+            if columns:
+                daily_value = actual_df[columns].sum(axis=1).mean()
+                cards.append((title, f"{daily_value:,.0f}", f"共{len(columns)}个平台"))
+            else:
+                cards.append((title, "0", "列不存在"))
+        else:
+            cards.append((title, "0", "未选择平台"))
+
+    # 3. 日均同人热度
+    if schema.fan_heat_column:
+        daily_fan_heat = actual_df[schema.fan_heat_column].mean()
+        cards.append(("🔥 日均同人热度", f"{daily_fan_heat:.1f}", "热度指数"))
+    else:
+        cards.append(("🔥 日均同人热度", "0", "数据不可用"))
+
+    # 4. 日均电商销量
+    if ecommerce_platforms:
+        sales_columns = schema.select(schema.sales_columns, ecommerce_platforms)
+        if sales_columns:
+            daily_sales = actual_df[sales_columns].sum(axis=1).mean()
+            cards.append(("🛒 日均电商销量", f"{daily_sales:,.0f}", f"共{len(sales_columns)}个平台"))
+        else:
+            cards.append(("🛒 日均电商销量", "0", "列不存在"))
+    else:
+        cards.append(("🛒 日均电商销量", "0", "未选择平台"))
+
+    # 5. 日均二手销量
+    if schema.secondhand_column:
+        daily_secondhand = actual_df[schema.secondhand_column].mean()
+        cards.append(("🔄 日均二手销量", f"{daily_secondhand:,.0f}", "二手市场"))
+    else:
+        cards.append(("🔄 日均二手销量", "0", "数据不可用"))
+
+    return cards
+
+
+# ---------- 预测模拟器 ----------
+
+# 按市场、渠道和商品属性过滤（空选择表示不过滤）
+def filter_predictor_data(df, markets, channels, ip_categories, materials, purposes):
+    filtered_df = df.copy()
+
+    if markets:
+        filtered_df = filtered_df[filtered_df['市场'].isin(markets)]
+    if channels:
+        filtered_df = filtered_df[filtered_df['销售渠道'].isin(channels)]
+    if ip_categories:
+        filtered_df = filtered_df[filtered_df['IP类别'].isin(ip_categories)]
+    if materials:
+        filtered_df = filtered_df[filtered_df['商品材质'].isin(materials)]
+    if purposes:
+        filtered_df = filtered_df[filtered_df['商品用途'].isin(purposes)]
+    return filtered_df
+
+
+def make_combo_key(ip_name, product_code, channel, market):
+    return f"{ip_name}|{product_code}|{channel}|{market}"
+
+
+# 构建商品配置表格数据和active_configs
+# store_counts / store_types 为会话中的配置字典，缺省项会在这里初始化
+def build_config_table(filtered_df, deleted_combinations, store_counts, store_types, schema=None):
+    schema = schema or PredictorSchema(filtered_df.columns)
+    unique_combinations = filtered_df[COMBO_COLUMNS].drop_duplicates()
+
+    active_configs = {}
+    table_data = []
+
+    # 收集所有可用的门店类型和最大门店数
+    all_available_types = set()
+    max_possible_stores = 0
+
+    for idx, combo in unique_combinations.iterrows():
+        combo_key = make_combo_key(combo['IP名称'], combo['商品编号'], combo['销售渠道'], combo['市场'])
+
+        if combo_key in deleted_combinations:
+            continue
+
+        # 获取该组合的数据
+        combo_data = filtered_df[
+            (filtered_df['IP名称'] == combo['IP名称']) &
+            (filtered_df['商品编号'] == combo['商品编号']) &
+            (filtered_df['销售渠道'] == combo['销售渠道']) &
+            (filtered_df['市场'] == combo['市场'])
+        ]
+
+        # 获取销售起始日期
+        start_date = combo_data[schema.start_date_column].min() if schema.start_date_column else datetime.date.today()
+
+        # 获取最大门店数
+        max_stores = len(combo_data['门店编号'].unique())
+
+        # 获取可用门店类型
+        available_types = []
+        if schema.store_type_column:
+            available_types = combo_data[schema.store_type_column].dropna().unique().tolist()
+
+        # 更新全局选项
+        all_available_types.update(available_types)
+        max_possible_stores = max(max_possible_stores, max_stores)
+
+        # 初始化配置
+        if combo_key not in store_counts:
+            store_counts[combo_key] = max_stores
+
+        if combo_key not in store_types:
+            store_types[combo_key] = list(available_types)
+
+        # 商品信息
+        if not combo_data.empty:
+            sample = combo_data.iloc[0]
+            material = sample.get("商品材质", "N/A")
+            purpose = sample.get("商品用途", "N/A")
+            color = sample.get("商品颜色", "N/A")
+            size = sample.get("商品尺寸", "N/A")
+            price = str(sample.get("商品价格", "N/A"))
+        else:
+            material = purpose = color = size = price = "N/A"
+
+        # 添加到表格数据
+        table_data.append({
+            'IP名称-商品编号': f"{combo['IP名称']}-{combo['商品编号']}",
+            '渠道': combo['销售渠道'],
+            '市场': combo['市场'],
+            '首次销售日期': str(start_date),
+            '覆盖门店种类': store_types[combo_key][0] if store_types[combo_key] else (available_types[0] if available_types else "N/A"),
+            '覆盖门店数': store_counts[combo_key],
+            '商品材质': material,
+            '商品用途': purpose,
+            '商品颜色': color,
+            '商品尺寸': size,
+            '商品价格': price,
+            '删除': False,
+            '确认': False,
+            'combo_key': combo_key,
+            'available_types': available_types,
+            'max_stores': max_stores
+        })
+
+        # 添加到active_configs
+        active_configs[combo_key] = {
+            'ip_name': combo['IP名称'],
+            'product_code': combo['商品编号'],
+            'channel': combo['销售渠道'],
+            'market': combo['市场'],
+            'start_date': start_date,
+            'store_count': store_counts[combo_key],
+            'store_types': store_types[combo_key]
+        }
+
+    return table_data, active_configs, all_available_types, max_possible_stores
+
+
+# 取出某个配置对应的门店数据（组合 + 门店类型）
+def select_combo_data(filtered_df, config, schema=None):
+    schema = schema or PredictorSchema(filtered_df.columns)
+    market_channel_df = filtered_df[
+        (filtered_df['IP名称'] == config['ip_name']) &
+        (filtered_df['商品编号'] == config['product_code']) &
+        (filtered_df['销售渠道'] == config['channel']) &
+        (filtered_df['市场'] == config['market'])
+    ]
+
+    # 按门店类型筛选
+    if config['store_types'] and schema.store_type_column:
+        market_channel_df = market_channel_df[market_channel_df[schema.store_type_column].isin(config['store_types'])]
+    return market_channel_df
+
+
+# 首周销量排名的排序键（从高到低排序时使用）：首周销量为空的门店排在最后，
+# 与数组排名 np.argsort(-first_week) 和 SQLite 后端的 ORDER BY ... DESC 一致
+def first_week_rank_key(value):
+    return (False, 0) if pd.isna(value) else (True, value)
+
+
+# 销量计算：按首周销量选出前N个门店，返回目标周数内的总销量和门店列表
+def calculate_sales_data(filtered_df, config, target_week, schema=None):
+    schema = schema or PredictorSchema(filtered_df.columns)
+    market_channel_df = select_combo_data(filtered_df, config, schema)
+
+    if market_channel_df.empty:
+        return 0, []
+
+    # 按首周销量排序选择前N个门店（没有首周列时各门店首周销量均视为0）
+    store_sales = []
+    for store in market_channel_df['门店编号'].unique():
+        store_data = market_channel_df[market_channel_df['门店编号'] == store]
+        first_week_sales = store_data[schema.first_week_column].iloc[0] if schema.first_week_column else 0
+        store_sales.append({'门店编号': store, '首周销量': first_week_sales})
+
+    # 按首周销量排序并选择前N个门店
+    store_sales.sort(key=lambda x: first_week_rank_key(x['首周销量']), reverse=True)
+    top_store_ids = [store['门店编号'] for store in store_sales[:config['store_count']]]
+
+    # 计算总销量（目标周数的总和）
+    total_sales = 0
+    top_rows = market_channel_df[market_channel_df['门店编号'].isin(top_store_ids)]
+    for sales_col in schema.week_columns(target_week):
+        if sales_col:
+            total_sales += top_rows[sales_col].sum()
+
+    return total_sales, top_store_ids
+
+
+# 计算选中门店的每周销量和对应日期（从首次销售日期开始）
+def calculate_weekly_sales(filtered_df, config, top_store_ids, target_week, schema=None):
+    schema = schema or PredictorSchema(filtered_df.columns)
+    market_channel_df = select_combo_data(filtered_df, config, schema)
+    if market_channel_df.empty or not top_store_ids:
+        return None
+
+    weekly_sales = []
+    dates = []
+    top_rows = market_channel_df[market_channel_df['门店编号'].isin(top_store_ids)]
+    for week, sales_col in enumerate(schema.week_columns(target_week)):
+        weekly_sales.append(top_rows[sales_col].sum() if sales_col else 0)
+        dates.append(config['start_date'] + datetime.timedelta(weeks=week))
+    return dates, weekly_sales
+
+
+# 门店明细：选中的前N门店按排名各一行，包含首周销量、起始周到目标周的每周销量、合计和累计占比
+def store_detail(filtered_df, config, target_week, schema=None, start_week=1):
+    schema = schema or PredictorSchema(filtered_df.columns)
+    _, top_store_ids = calculate_sales_data(filtered_df, config, target_week, schema)
+    week_labels = [f'第{week}周' for week in range(start_week, target_week + 1)]
+    if not top_store_ids:
+        return pd.DataFrame(columns=['排名', '门店编号', '门店类型', '首周销量'] + week_labels + ['合计', '累计占比'])
+
+    market_channel_df = select_combo_data(filtered_df, config, schema)
+    top_rows = market_channel_df[market_channel_df['门店编号'].isin(top_store_ids)]
+    stores = top_rows.groupby('门店编号', sort=False)
+    detail = pd.DataFrame({'门店编号': top_store_ids})
+    detail.insert(0, '排名', range(1, len(top_store_ids) + 1))
+    first_rows = stores.head(1).set_index('门店编号')
+    type_column = schema.store_type_column
+    detail['门店类型'] = first_rows[type_column].reindex(top_store_ids).to_numpy() if type_column else None
+    detail['首周销量'] = first_rows[schema.first_week_column].reindex(top_store_ids).to_numpy() if schema.first_week_column else 0
+    for label, sales_col in zip(week_labels, schema.week_columns(target_week, start_week)):
+        detail[label] = stores[sales_col].sum().reindex(top_store_ids).to_numpy() if sales_col else 0
+    detail['合计'] = detail[week_labels].sum(axis=1)
+    total = detail['合计'].sum()
+    detail['累计占比'] = detail['合计'].cumsum() / total if total else 0.0
+    return detail
+
+
+# 计算所有配置的环形图和趋势图数据
+def build_prediction_results(filtered_df, active_configs, target_week, schema=None):
+    schema = schema or PredictorSchema(filtered_df.columns)
+    pie_data = []
+    trend_data = []
+
+    for combo_key, config in active_configs.items():
+        total_sales, top_store_ids = calculate_sales_data(filtered_df, config, target_week, schema)
+        label = f"{config['ip_name']}-{config['product_code']}"
+
+        if total_sales > 0:  # 只添加有销量的数据
+            pie_data.append({'label': label, 'value': total_sales})
+
+            weekly = calculate_weekly_sales(filtered_df, config, top_store_ids, target_week, schema)
+            if weekly is not None:
+                dates, weekly_sales = weekly
+                trend_data.append({
+                    'label': label,
+                    'dates': dates,
+                    'sales': weekly_sales
+                })
+    return pie_data, trend_data
+
+
+# 周区间：只保留第 start_week 周到目标周，趋势截取对应的周，环形图为截取后的合计，截取后没有销量的组合去掉
+# pie_data 与 trend_data 为 build_prediction_results 的结果（一一对应，尚未折叠）
+def slice_weeks(pie_data, trend_data, start_week):
+    if start_week <= 1:
+        return pie_data, trend_data
+    sliced_pie = []
+    sliced_trend = []
+    for pie, trend in zip(pie_data, trend_data):
+        sales = trend['sales'][start_week - 1:]
+        total_sales = sum(sales)
+        if total_sales > 0:
+            sliced_pie.append({**pie, 'value': total_sales})
+            sliced_trend.append({**trend, 'dates': trend['dates'][start_week - 1:], 'sales': sales})
+    return sliced_pie, sliced_trend
+
+
+# 图表默认单独显示的组合数，其余组合合并为一项
+CHART_TOP_K = 20
+OTHERS_LABEL = '其他'
+
+
+# 总销量最高的K项的下标（保持原有顺序）；用 argpartition 部分排序，
+# 与第K名销量相同的项按原有顺序取前面的，结果稳定
+def top_k_positions(totals, k):
+    totals = np.asarray(totals, dtype=float)
+    if len(totals) <= k:
+        return np.arange(len(totals))
+    kth = len(totals) - k
+    threshold = totals[np.argpartition(totals, kth)[kth]]
+    above = np.flatnonzero(totals > threshold)
+    ties = np.flatnonzero(totals == threshold)[:k - len(above)]
+    return np.sort(np.concatenate([above, ties]))
+
+
+# 环形图和趋势图只保留前K个组合，其余组合的销量合并为"其他"（趋势按日期相加），
+# 合并项带有 others 字段记录合并的组合数
+def fold_top_k(pie_data, trend_data, k):
+    if k is None:
+        return pie_data, trend_data
+    return _fold_pie(pie_data, k), _fold_trend(trend_data, k)
+
+
+def _fold_pie(pie_data, k):
+    if len(pie_data) <= k:
+        return pie_data
+    keep = set(top_k_positions([item['value'] for item in pie_data], k).tolist())
+    folded = [item for i, item in enumerate(pie_data) if i not in keep]
+    result = [pie_data[i] for i in sorted(keep)]
+    result.append({'label': OTHERS_LABEL, 'value': sum(item['value'] for item in folded), 'others': len(folded)})
+    return result
+
+
+def _fold_trend(trend_data, k):
+    if len(trend_data) <= k:
+        return trend_data
+    keep = set(top_k_positions([sum(item['sales']) for item in trend_data], k).tolist())
+    others = {}
+    folded = 0
+    for i, item in enumerate(trend_data):
+        if i in keep:
+            continue
+        folded += 1
+        for date, sales in zip(item['dates'], item['sales']):
+            others[date] = others.get(date, 0) + sales
+    dates = sorted(others)
+    result = [trend_data[i] for i in sorted(keep)]
+    result.append({'label': OTHERS_LABEL, 'dates': dates, 'sales': [others[date] for date in dates], 'others': folded})
+    return result
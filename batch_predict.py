@@ -0,0 +1,300 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import analytics
+import data_loader
+import export
+import matrix_store
+import parallel
+import schema
+import streaming
+
+# 命令行批量预测（不依赖Streamlit/Plotly），按场景文件计算与预测模拟器页面相同的总销量和每周销量
+#   python batch_predict.py scenarios.json --output results --format parquet --workers 4   # csv / parquet / xlsx
+#   python batch_predict.py scenarios.json --stream --chunk-rows 100000   # 数据表过大时分块流式计算
+#
+# 场景文件可以是单个场景对象，也可以是 {"data": "...", "scenarios": [...]}：
+#   {
+#     "name": "古风木质箱包",
+#     "filters": {"markets": ["US"], "channels": [], "ip_categories": ["IP类别_古风独家IP"],
+#                 "materials": ["木质"], "purposes": ["箱包配饰"]},
+#     "target_weeks": [4, 8],
+#     "combos": {"甄嬛传|g514407|线下|MX": {"store_count": 3, "store_types": ["商业街"]}},
+#     "exclude": ["琅琊榜|g260227|线上|US"]
+#   }
+# 筛选项为空或缺省表示不过滤；未在 combos 中配置的组合与页面默认一致（全部门店、第一个门店类型）
+
+FILTER_KEYS = ['markets', 'channels', 'ip_categories', 'materials', 'purposes']
+
+
+def load_scenarios(path):
+    with open(path, encoding='utf-8') as f:
+        content = json.load(f)
+    if isinstance(content, list):
+        return None, content
+    if 'scenarios' in content:
+        return content.get('data'), content['scenarios']
+    return content.get('data'), [content]
+
+
+def scenario_target_weeks(scenario):
+    weeks = scenario.get('target_weeks', scenario.get('target_week', 8))
+    weeks = weeks if isinstance(weeks, list) else [weeks]
+    if not weeks or any(not isinstance(week, int) or week < 1 for week in weeks):
+        raise ValueError(f"场景 {scenario.get('name')!r} 的目标周数必须是正整数: {weeks}")
+    return weeks
+
+
+# 按场景构建各组合的配置，和页面经过表格编辑后的 active_configs 一致
+def build_scenario_configs(filtered_df, scenario, sheet_schema):
+    overrides = scenario.get('combos', {})
+    store_counts = {key: value['store_count'] for key, value in overrides.items() if 'store_count' in value}
+    store_types = {key: list(value['store_types']) for key, value in overrides.items() if 'store_types' in value}
+    explicit_types = set(store_types)
+    table_data, active_configs, _, _ = analytics.build_config_table(
+        filtered_df, set(scenario.get('exclude', [])), store_counts, store_types, sheet_schema
+    )
+    for row in table_data:
+        config = active_configs[row['combo_key']]
+        # 页面表格每个组合只选择一个门店类型；场景文件显式给出的类型列表保持原样
+        if row['combo_key'] not in explicit_types:
+            config['store_types'] = [row['覆盖门店种类']]
+    return active_configs
+
+
+# 读取预测表和它的数值数组（见 parallel.PredictorArrays）：返回 (数据, 数组, 共享对象)
+# xlsx 工作簿的数组映射工作簿旁按数据版本保存的 .npy 文件（见 matrix_store.py），与页面和工作进程共用同一份文件；
+# parquet 目录没有对应的工作簿，数组在内存中整理，多进程时复制到共享内存
+def load_predictor(source, workers):
+    if not os.path.isdir(source):
+        snapshot = data_loader.SnapshotLoader(source, data_loader.PREDICTOR_SHEET).get()
+        shared = matrix_store.MappedPredictorArrays(matrix_store.ensure(snapshot, source))
+        return snapshot.df, shared.local, shared
+    df, indexes = data_loader.load_sheet(source, data_loader.PREDICTOR_SHEET)
+    arrays = parallel.PredictorArrays.from_frame(df, indexes['schema'])
+    if workers <= 1:
+        return df, arrays, None
+    shared = parallel.SharedPredictorArrays(arrays)
+    return df, shared.local, shared
+
+
+# 计算一批组合（选店规则与 analytics.calculate_sales_data 相同，见 parallel.rank_top_stores）：
+# 返回 [(序号, 门店数, 每周销量)]，每周销量只算到最大目标周数，没有符合条件的门店时为 None
+def predict_combos(arrays, tasks, weeks):
+    results = []
+    for index, rows, allowed_types, store_count in tasks:
+        rows, stores, first_rows = parallel.rank_top_stores(arrays, rows, allowed_types, store_count)
+        weekly = parallel.top_weekly_sales(arrays, rows, stores, first_rows, weeks)
+        results.append((index, int(first_rows.size), None if weekly is None else weekly.tolist()))
+    return results
+
+
+# 工作进程任务：按 handle 重新映射数组后计算一批组合
+def predict_shard(handle, tasks, weeks):
+    return predict_combos(parallel.open_arrays(handle), tasks, weeks)
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# 运行一个场景；df 与 arrays 的行一一对应（见 load_predictor），executor 不为空时按组合分批交给进程池
+def run_scenario(df, arrays, scenario, chunk_size, executor=None, handle=None):
+    filters = scenario.get('filters', {})
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"未知的筛选项: {', '.join(sorted(unknown))}")
+    target_weeks = scenario_target_weeks(scenario)
+
+    sheet_schema = schema.PredictorSchema(df.columns)
+    filtered_df = analytics.filter_predictor_data(df, *(filters.get(key) for key in FILTER_KEYS))
+    active_configs = build_scenario_configs(filtered_df, scenario, sheet_schema)
+
+    # 任务只包含各组合在数组中的行号，工作进程按 handle 映射同一份数组，不传递数据
+    tasks = parallel.combo_tasks(arrays, df.index.get_indexer(filtered_df.index), active_configs)
+    weeks = min(max(target_weeks), arrays.horizon)
+    batches = list(chunked(tasks, chunk_size))
+    if executor is None or handle is None or len(batches) <= 1:
+        results = [predict_combos(arrays.arrays, batch, weeks) for batch in batches]
+    else:
+        results = list(executor.map(predict_shard, [handle] * len(batches), batches, [weeks] * len(batches)))
+
+    totals = []
+    weekly = []
+    combo_keys = list(active_configs)
+    for index, stores, weekly_sales in (result for batch in results for result in batch):
+        combo_key = combo_keys[index]
+        config = active_configs[combo_key]
+        for target_week in target_weeks:
+            # 超出数据周数的部分销量为0
+            sales = [] if weekly_sales is None else weekly_sales[:target_week] + [0] * (target_week - len(weekly_sales))
+            totals.append({
+                'combo_key': combo_key,
+                'target_week': target_week,
+                'total_sales': sum(sales),
+                'stores': stores,
+            })
+            for week, week_sales in enumerate(sales, start=1):
+                weekly.append({
+                    'combo_key': combo_key,
+                    'target_week': target_week,
+                    'week': week,
+                    'date': config['start_date'] + datetime.timedelta(weeks=week - 1),
+                    'sales': week_sales,
+                })
+    return result_frames(scenario.get('name', ''), active_configs, totals, weekly)
+
+
+# 分块读取一遍数据；progress(名称, 已读行数, 总行数或None) 在每块后调用，读完后再以 已读行数=None 调用一次
+def read_pass(source, chunk_rows, columns, progress, label):
+    report = None if progress is None else lambda done, total: progress(label, done, total)
+    yield from streaming.iter_predictor_chunks(source, chunk_rows, report, columns)
+    if progress is not None:
+        progress(label, None, None)
+
+
+# 流式运行一个场景：分块读取数据两遍（先收集组合配置，再累积销量），内存只与组合和门店数量有关
+def run_scenario_streaming(source, scenario, chunk_rows, progress=None):
+    filters = scenario.get('filters', {})
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"未知的筛选项: {', '.join(sorted(unknown))}")
+    target_weeks = scenario_target_weeks(scenario)
+    columns = streaming.required_columns(max(target_weeks))
+
+    overrides = scenario.get('combos', {})
+    active_configs = streaming.collect_combo_configs(
+        read_pass(source, chunk_rows, columns, progress, '收集组合'),
+        filters,
+        store_counts={key: value['store_count'] for key, value in overrides.items() if 'store_count' in value},
+        store_types={key: value['store_types'] for key, value in overrides.items() if 'store_types' in value},
+        deleted_combinations=set(scenario.get('exclude', [])),
+    )
+    accumulator = streaming.StreamingSalesAccumulator(active_configs, max(target_weeks))
+    for chunk in read_pass(source, chunk_rows, columns, progress, '累积销量'):
+        accumulator.add(streaming.filter_chunk(chunk, filters))
+
+    totals = []
+    weekly = []
+    for combo_key, (_, top_store_ids, weekly_sales) in accumulator.results().items():
+        config = active_configs[combo_key]
+        for target_week in target_weeks:
+            totals.append({
+                'combo_key': combo_key,
+                'target_week': target_week,
+                'total_sales': sum(weekly_sales[:target_week]),
+                'stores': len(top_store_ids),
+            })
+            if not top_store_ids:
+                continue
+            for week, sales in enumerate(weekly_sales[:target_week], start=1):
+                weekly.append({
+                    'combo_key': combo_key,
+                    'target_week': target_week,
+                    'week': week,
+                    'date': config['start_date'] + datetime.timedelta(weeks=week - 1),
+                    'sales': sales,
+                })
+    return result_frames(scenario.get('name', ''), active_configs, totals, weekly)
+
+
+# 把计算结果整理为总销量表和每周销量表
+def result_frames(name, active_configs, totals, weekly):
+    info = pd.DataFrame([
+        {
+            'combo_key': combo_key,
+            'ip_name': config['ip_name'],
+            'product_code': config['product_code'],
+            'channel': config['channel'],
+            'market': config['market'],
+            'start_date': config['start_date'],
+            'store_types': '|'.join(str(store_type) for store_type in config['store_types']),
+            'store_count': config['store_count'],
+        }
+        for combo_key, config in active_configs.items()
+    ], columns=['combo_key', 'ip_name', 'product_code', 'channel', 'market', 'start_date', 'store_types', 'store_count'])
+    totals_df = info.merge(pd.DataFrame(totals, columns=['combo_key', 'target_week', 'total_sales', 'stores']), on='combo_key')
+    weekly_df = pd.DataFrame(weekly, columns=['combo_key', 'target_week', 'week', 'date', 'sales'])
+
+    totals_df.insert(0, 'scenario', name)
+    weekly_df.insert(0, 'scenario', name)
+    return totals_df, weekly_df
+
+
+# 结果表按块写入（见 export.py），写 parquet 时日期列统一为datetime
+def write_table(df, output_dir, name, fmt):
+    path = os.path.join(output_dir, f'{name}.{fmt}')
+    export.write_chunks(export.frame_chunks(df), path, fmt)
+    return path
+
+
+# 每遍读取的进度写在同一行，读完一遍后换行
+def print_progress(label, done, total):
+    if done is None:
+        print()
+        return
+    percent = f" ({done / total:.0%})" if total else ''
+    print(f"\r  {label}：已读取 {done:,} 行{percent}", end='', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='IP商品销量批量预测')
+    parser.add_argument('scenario', help='场景文件（JSON）')
+    parser.add_argument('--data', help='数据文件（xlsx）或parquet目录，默认使用场景文件中的 data 或 demo_data.xlsx')
+    parser.add_argument('--output', default='batch_results', help='结果目录')
+    parser.add_argument('--format', choices=list(export.FORMATS), default='csv')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='进程数，1 表示在当前进程内计算')
+    parser.add_argument('--chunk-size', type=int, default=50, help='每个任务包含的组合数')
+    parser.add_argument('--stream', action='store_true', help='分块流式读取数据，不把整张表读入内存')
+    parser.add_argument('--chunk-rows', type=int, default=50000, help='流式读取时每块的行数')
+    args = parser.parse_args(argv)
+
+    data_path, scenarios = load_scenarios(args.scenario)
+    if not scenarios:
+        parser.error('场景文件中没有场景')
+    source = args.data or data_path or data_loader.DATA_FILE
+
+    if args.stream:
+        df, arrays, shared = None, None, None
+    else:
+        start = time.perf_counter()
+        df, arrays, shared = load_predictor(source, args.workers)
+        print(f"读取 {source}: {len(df):,} 行，{time.perf_counter() - start:.2f}s")
+
+    executor = ProcessPoolExecutor(max_workers=args.workers) if shared is not None and args.workers > 1 else None
+    all_totals = []
+    all_weekly = []
+    try:
+        for scenario in scenarios:
+            start = time.perf_counter()
+            if args.stream:
+                totals_df, weekly_df = run_scenario_streaming(source, scenario, args.chunk_rows, print_progress)
+            else:
+                totals_df, weekly_df = run_scenario(df, arrays, scenario, args.chunk_size, executor, shared and shared.handle)
+            all_totals.append(totals_df)
+            all_weekly.append(weekly_df)
+            print(f"场景 {scenario.get('name', '')!r}: {totals_df['combo_key'].nunique():,} 个组合，{time.perf_counter() - start:.2f}s")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if shared is not None:
+            shared.close()
+
+    os.makedirs(args.output, exist_ok=True)
+    paths = [
+        write_table(pd.concat(all_totals, ignore_index=True), args.output, 'totals', args.format),
+        write_table(pd.concat(all_weekly, ignore_index=True), args.output, 'weekly', args.format),
+    ]
+    print("结果已写入 " + ", ".join(paths))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_loader
+
+# 合成数据生成器：按指定规模生成与 demo_data.xlsx 结构一致的两张表
+# xlsx 单表最多 1,048,576 行，超出时请使用 --format parquet（每张表一个文件）
+
+SCALES = {
+    'small': dict(ips=20, days=365, store_rows=5_000, weeks=8),
+    'medium': dict(ips=500, days=730, store_rows=100_000, weeks=26),
+    'large': dict(ips=10_000, days=1826, store_rows=1_000_000, weeks=52),
+}
+
+XLSX_MAX_ROWS = 1_048_575
+
+SOCIAL_BASE = {'tiktok_social': 50000, 'ins': 27000, 'facebook': 14000, 'twitter': 5000, 'news': 1500}
+IP_CATEGORIES = ['IP类别_成熟成功IP', 'IP类别_古风独家IP', 'IP类别_欧美流行IP', 'IP类别_童年记忆IP', 'IP类别_小众独家IP']
+MATERIALS = ['木质', '帆布', '塑料', '硅胶', '不锈钢', '玻璃']
+PURPOSES = ['箱包配饰', '化妆品', '摆件盲盒', '家居用品']
+COLORS = ['黑色', '红色', '蓝色', '白色', '绿色', '棕色', '银色']
+STORE_TYPES = ['居民区', '电商', '旅游区', '城市地标区', '商业街']
+STORE_LEVELS = ['A', 'B', 'C', 'D']
+FESTIVALS = ['感恩节', '万圣节', '圣诞节', '黑五']
+TREND_TYPES = ['stable', 'growing', 'seasonal', 'declining']
+
+
+def ip_names(n):
+    return np.array([f'IP{i:05d}' for i in range(n)], dtype=object)
+
+
+# 周销量列名与原始数据保持一致：第一周为"销量_上市第一周"，之后为"销量_上市第N周"
+def week_columns(weeks):
+    return ['销量_上市第一周'] + [f'销量_上市第{week}周' for week in range(2, weeks + 1)]
+
+
+# 社媒_电商原始数据表：每个IP每天一行，最后10%的日期为预测数据
+def generate_dashboard(ips, days, seed=0):
+    rng = np.random.default_rng(seed)
+    names = ip_names(ips)
+    dates = pd.date_range('2024-01-01', periods=days, freq='D')
+    n = ips * days
+
+    ip_idx = np.tile(np.arange(ips), days)
+    day_idx = np.repeat(np.arange(days), ips)
+    forecast_start = int(days * 0.9)
+
+    scale = rng.uniform(0.5, 2.0, ips)[ip_idx]
+    growth = rng.uniform(-0.3, 0.6, ips)[ip_idx] * day_idx / max(days, 1)
+    season = 0.2 * np.sin(2 * np.pi * day_idx / 365 + rng.uniform(0, 2 * np.pi, ips)[ip_idx])
+    level = scale * (1 + growth + season)
+
+    df = pd.DataFrame({
+        '日期': dates[day_idx],
+        'IP名称': names[ip_idx],
+        '数据状态': np.where(day_idx >= forecast_start, '预测', '实际'),
+        '趋势类型': np.array(TREND_TYPES, dtype=object)[np.arange(ips) % len(TREND_TYPES)][ip_idx],
+    })
+    for platform, base in SOCIAL_BASE.items():
+        noise = rng.normal(1.0, 0.08, n)
+        df[f'社媒热度_发帖数_{platform}'] = np.maximum(base * level * noise, 0).astype(np.int64)
+    for platform, base in SOCIAL_BASE.items():
+        noise = rng.normal(1.0, 0.1, n)
+        df[f'社媒热度_互动量_{platform}'] = np.maximum(base * 30 * level * noise, 0).astype(np.int64)
+    df['社媒热度_同人热度'] = np.clip(60 + 30 * (level - 1) + rng.normal(0, 5, n), 0, 100).round(1)
+    df['电商热度_销量_amazon'] = np.maximum(300000 * level * rng.normal(1.0, 0.1, n), 0).astype(np.int64)
+    df['电商热度_销量_tiktok_sale'] = np.maximum(160000 * level * rng.normal(1.0, 0.1, n), 0).astype(np.int64)
+    df['电商热度_二手销量'] = np.maximum(30000 * level * rng.normal(1.0, 0.15, n), 0).astype(np.int64)
+    df['日期'] = df['日期'].dt.strftime('%Y-%m-%d')
+    return df
+
+
+# 预测结果底表：每个 IP-商品-渠道-市场 组合若干门店，每个组合内门店不重复
+def generate_predictor(ips, store_rows, weeks, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    names = ip_names(ips)
+
+    # 每个组合的门店数（平均约3家），累计到目标行数为止
+    counts = 1 + rng.poisson(2.0, size=store_rows)
+    counts = counts[:np.searchsorted(np.cumsum(counts), store_rows) + 1]
+    counts[-1] -= counts.sum() - store_rows
+    counts = counts[counts > 0]
+    n_combos = len(counts)
+
+    # 组合 = 商品 × 渠道 × 市场，不放回抽样保证组合唯一，每个商品平均约两个组合
+    n_products = max(n_combos // 2, 1)
+    combo_ids = rng.choice(n_products * 4, n_combos, replace=False)
+    product_of_combo = combo_ids // 4
+    combo_channel = (combo_ids // 2) % 2
+    combo_market = combo_ids % 2
+    product_ip = rng.integers(0, ips, n_products)
+    ip_category = rng.integers(0, len(IP_CATEGORIES), ips)
+
+    combo_idx = np.repeat(np.arange(n_combos), counts)
+    offset = np.arange(store_rows) - np.repeat(np.cumsum(counts) - counts, counts)
+    product_idx = product_of_combo[combo_idx]
+    channel = combo_channel[combo_idx]
+    market = combo_market[combo_idx]
+
+    # 门店池：线上为电商门店，线下按市场区分，组合内按偏移取连续编号保证不重复
+    pool_size = max(int(counts.max()) * 4, 50)
+    store_start = rng.integers(0, pool_size, n_combos)[combo_idx]
+    store_no = (store_start + offset) % pool_size + 1
+    market_code = np.array(['us', 'mx'], dtype=object)[market]
+    store_prefix = np.where(channel == 0, 'e', 's')
+    store_ids = pd.Series(store_prefix + market_code).str.cat(pd.Series(store_no).astype(str).str.zfill(3))
+
+    start_dates = pd.Timestamp('2025-10-01') + pd.to_timedelta(rng.integers(0, 60, n_products), unit='D')
+
+    df = pd.DataFrame({
+        '数据状态': '预测',
+        '销售起始日期': start_dates[product_idx].strftime('%Y-%m-%d'),
+        '商品编号': pd.Series(product_idx).map(lambda i: f'g{i:07d}').values,
+        '门店编号': store_ids.values,
+        '市场': np.array(['US', 'MX'], dtype=object)[market],
+        '销售渠道': np.array(['线下', '线上'], dtype=object)[channel],
+        'IP名称': names[product_ip[product_idx]],
+        'IP类别': np.array(IP_CATEGORIES, dtype=object)[ip_category[product_ip[product_idx]]],
+    })
+
+    # 周销量：首周销量对数正态分布，之后按门店衰减率递减
+    first_week = rng.lognormal(5.5, 0.8, store_rows)
+    decay = rng.uniform(0.75, 0.92, store_rows)
+    weekly = first_week[:, None] * decay[:, None] ** np.arange(weeks)[None, :]
+    weekly = weekly.astype(np.int64)
+    for i, column in enumerate(week_columns(weeks)):
+        df[column] = weekly[:, i]
+    df['销量_上市前三月总和'] = weekly[:, :min(weeks, 13)].sum(axis=1)
+
+    def product_attr(values):
+        return np.array(values, dtype=object)[rng.integers(0, len(values), n_products)][product_idx]
+
+    df['商品价格'] = rng.integers(20, 600, n_products)[product_idx]
+    df['商品上市折扣'] = rng.uniform(0.6, 1.2, n_products).round(2)[product_idx]
+    df['商品材质'] = product_attr(MATERIALS)
+    df['商品用途'] = product_attr(PURPOSES)
+    df['商品颜色'] = product_attr(COLORS)
+    df['商品尺寸'] = rng.integers(5, 60, n_products)[product_idx]
+    df['商品重量'] = rng.integers(50, 1500, n_products)[product_idx]
+    df['商品上市重要节日'] = product_attr(FESTIVALS)
+    df['门店信息_门店面积'] = rng.integers(50, 1000, store_rows)
+    df['门店信息_门店等级'] = np.array(STORE_LEVELS, dtype=object)[rng.integers(0, len(STORE_LEVELS), store_rows)]
+    df['门店信息_门店商圈类型'] = np.where(
+        channel == 1, '电商',
+        np.array(STORE_TYPES, dtype=object)[rng.integers(0, len(STORE_TYPES), store_rows)]
+    )
+    return df
+
+
+def generate(ips, days, store_rows, weeks, seed=0):
+    return {
+        data_loader.DASHBOARD_SHEET: generate_dashboard(ips, days, seed),
+        data_loader.PREDICTOR_SHEET: generate_predictor(ips, store_rows, weeks, seed),
+    }
+
+
+# 写出数据：xlsx 为单个工作簿，parquet 为目录下每张表一个文件
+def write(frames, path, fmt):
+    if fmt == 'xlsx':
+        too_large = [sheet for sheet, df in frames.items() if len(df) > XLSX_MAX_ROWS]
+        if too_large:
+            raise ValueError(f"以下数据表超过xlsx行数上限，请使用 --format parquet: {too_large}")
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            for sheet, df in frames.items():
+                df.to_excel(writer, sheet_name=sheet, index=False)
+    else:
+        os.makedirs(path, exist_ok=True)
+        for sheet, df in frames.items():
+            df.to_parquet(os.path.join(path, f'{sheet}.parquet'), index=False)
+
+
+def parse_scale(args):
+    scale = dict(SCALES[args.scale])
+    for key in scale:
+        value = getattr(args, key)
+        if value is not None:
+            scale[key] = value
+    return scale
+
+
+def add_scale_arguments(parser):
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='预设规模')
+    parser.add_argument('--ips', type=int, help='IP数量')
+    parser.add_argument('--days', type=int, help='社媒/电商数据天数')
+    parser.add_argument('--store-rows', type=int, help='预测结果底表门店行数')
+    parser.add_argument('--weeks', type=int, help='周销量列数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成指定规模的合成数据')
+    add_scale_arguments(parser)
+    parser.add_argument('--format', choices=['xlsx', 'parquet'], default='xlsx')
+    parser.add_argument('--output', required=True, help='输出文件（xlsx）或目录（parquet）')
+    args = parser.parse_args()
+
+    scale = parse_scale(args)
+    frames = generate(seed=args.seed, **scale)
+    write(frames, args.output, args.format)
+    for sheet, df in frames.items():
+        print(f"{sheet}: {len(df):,} 行 × {len(df.columns)} 列")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+APP_FILE = os.path.join(APP_DIR, 'ip_sale_prediction_demo.py')
+
+# 并发会话压测：启动本地 streamlit 服务，用 websocket 客户端模拟 N 个浏览器会话，
+# 按真实操作脚本（导航、IP多选、日期、表格编辑、目标周数）驱动重跑，
+# 统计各并发度下的 p50/p95/p99 重跑延迟和服务进程内存峰值
+#   python benchmarks/load_test.py --sessions 1 2 4 8 --iterations 3
+#   python benchmarks/load_test.py --url ws://127.0.0.1:8501 --server-pid 12345
+# Streamlit 的 AppTest 共享进程级 Runtime，不能在同一进程中并发运行，因此这里直接走 websocket 协议
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+# 读取进程常驻内存（Linux /proc），读取失败返回 None
+def process_rss(pid):
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+# 后台采样服务进程内存，记录每个并发度期间的峰值
+class RssSampler:
+    def __init__(self, pid, interval=0.02):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        rss = process_rss(self.pid) if self.pid else None
+        if rss is not None:
+            self.peak = max(self.peak or 0, rss)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, timeout=60):
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'streamlit', 'run', APP_FILE,
+            '--server.headless', 'true',
+            '--server.port', str(port),
+            '--server.address', '127.0.0.1',
+            '--browser.gatherUsageStats', 'false',
+            '--server.fileWatcherType', 'none',
+        ],
+        cwd=APP_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health', timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('streamlit 服务启动超时')
+
+
+# 一个模拟的浏览器会话：像前端一样在本地维护控件状态，每次交互后发送完整的控件状态触发重跑
+class SimulatedSession:
+    def __init__(self, session_id, url, timeout, seed):
+        self.session_id = session_id
+        self.url = url
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.widget_states = {}
+        self.page_script_hash = ''
+        self.tree = None
+        self.latencies = []
+        self.errors = []
+
+    async def rerun(self, name, changes=()):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        from streamlit.testing.v1.element_tree import parse_tree_from_messages
+
+        for state in changes:
+            self.widget_states[state.id] = state
+        back_msg = BackMsg()
+        back_msg.rerun_script.query_string = ''
+        back_msg.rerun_script.page_script_hash = self.page_script_hash
+        back_msg.rerun_script.widget_states.widgets.extend(self.widget_states.values())
+        # 按钮的触发值只发送一次
+        self.widget_states = {
+            widget_id: state for widget_id, state in self.widget_states.items()
+            if state.WhichOneof('value') != 'trigger_value'
+        }
+
+        start = time.perf_counter()
+        await self.ws.send(back_msg.SerializeToString())
+        messages = []
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await asyncio.wait_for(self.ws.recv(), self.timeout))
+            msg_type = msg.WhichOneof('type')
+            if msg_type == 'new_session':
+                self.page_script_hash = msg.new_session.page_script_hash
+                messages = []
+            messages.append(msg)
+            if msg_type == 'script_finished':
+                break
+        elapsed = time.perf_counter() - start
+
+        self.latencies.append((name, elapsed))
+        self.tree = parse_tree_from_messages(messages)
+        for exception in self.tree.exception:
+            self.errors.append(f"{name}: {exception.message}")
+        for error in self.tree.error:
+            self.errors.append(f"{name}: {error.value}")
+
+    # 多选框/下拉框按前端的方式以选项文本提交
+    def _ip_select(self):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        selector = self.tree.multiselect(key='ip_selector')
+        options = list(selector.options)
+        state = WidgetState(id=selector.id)
+        state.string_array_value.data[:] = self.rng.sample(options, k=self.rng.randint(1, min(3, len(options))))
+        return [state]
+
+    def _date_change(self):
+        start_input, end_input = self.tree.date_input[0], self.tree.date_input[1]
+        span = (end_input.max - start_input.min).days
+        start_input.set_value(start_input.min + datetime.timedelta(days=self.rng.randint(0, max(span // 2, 0))))
+        end_input.set_value(end_input.max)
+        return [start_input._widget_state, end_input._widget_state]
+
+    def _navigate(self, page):
+        button = self.tree.button(key=f'nav_{page}').click()
+        return [button._widget_state]
+
+    # 等价于在 data_editor 中修改第一行的门店数量
+    def _config_edit(self):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        editors = [node for node in self.tree.dataframe if node.proto.id]
+        if not editors:
+            return []
+        state = WidgetState(id=editors[0].proto.id)
+        state.string_value = json.dumps({
+            'edited_rows': {'0': {'覆盖门店数': self.rng.randint(1, 3)}},
+            'added_rows': [],
+            'deleted_rows': [],
+        })
+        return [state]
+
+    def _target_week(self):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        selectbox = self.tree.selectbox(key='target_week_select')
+        return [WidgetState(id=selectbox.id, string_value=self.rng.choice(list(selectbox.options)))]
+
+    async def run_script(self, iterations):
+        import websockets
+
+        async with websockets.connect(self.url, subprotocols=['streamlit'], max_size=None) as self.ws:
+            await self.rerun('dashboard_open')
+            for _ in range(iterations):
+                for name, action in [
+                    ('ip_select', self._ip_select),
+                    ('date_change', self._date_change),
+                    ('nav_predictor', lambda: self._navigate('predictor')),
+                    ('config_edit', self._config_edit),
+                    ('target_week', self._target_week),
+                    ('nav_dashboard', lambda: self._navigate('dashboard')),
+                ]:
+                    try:
+                        changes = action()
+                    except Exception as e:
+                        self.errors.append(f"{name}: {e!r}")
+                        continue
+                    await self.rerun(name, changes)
+
+
+async def run_sessions(sessions, iterations):
+    results = await asyncio.gather(*(session.run_script(iterations) for session in sessions), return_exceptions=True)
+    for session, result in zip(sessions, results):
+        if isinstance(result, BaseException):
+            session.errors.append(f"session: {result!r}")
+
+
+def run_level(url, server_pid, concurrency, iterations, timeout, seed):
+    sessions = [SimulatedSession(i, url, timeout, seed + i) for i in range(concurrency)]
+    with RssSampler(server_pid) as sampler:
+        start = time.perf_counter()
+        asyncio.run(run_sessions(sessions, iterations))
+        wall = time.perf_counter() - start
+
+    latencies = [seconds for session in sessions for _, seconds in session.latencies]
+    by_step = {}
+    for session in sessions:
+        for name, seconds in session.latencies:
+            by_step.setdefault(name, []).append(seconds)
+    errors = [error for session in sessions for error in session.errors]
+    return {
+        'sessions': concurrency,
+        'reruns': len(latencies),
+        'wall_seconds': wall,
+        'throughput_rps': len(latencies) / wall if wall > 0 else None,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.mean(latencies) if latencies else None,
+        'peak_rss_mb': sampler.peak / 1024 / 1024 if sampler.peak else None,
+        'steps': {name: {'p50': percentile(values, 50), 'p95': percentile(values, 95)} for name, values in by_step.items()},
+        'errors': errors[:20],
+        'error_count': len(errors),
+    }
+
+
+def format_ms(value):
+    return f"{value * 1000:>10.1f}" if value is not None else f"{'-':>10}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streamlit 并发会话压测')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8], help='依次测试的并发会话数')
+    parser.add_argument('--iterations', type=int, default=2, help='每个会话重复操作脚本的次数')
+    parser.add_argument('--timeout', type=float, default=120, help='单次重跑超时（秒）')
+    parser.add_argument('--url', help='已运行服务的地址（如 ws://127.0.0.1:8501），默认自动启动本地服务')
+    parser.add_argument('--server-pid', type=int, help='已运行服务的进程号，用于统计内存')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果JSON路径，默认写入 benchmarks/results/')
+    args = parser.parse_args()
+
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+
+    process = None
+    if args.url:
+        url, server_pid = args.url.rstrip('/') + '/_stcore/stream', args.server_pid
+    else:
+        port = free_port()
+        process = start_server(port)
+        url, server_pid = f'ws://127.0.0.1:{port}/_stcore/stream', process.pid
+
+    try:
+        # 预热：首次读取数据不计入各并发度的统计
+        run_level(url, None, 1, 1, args.timeout, args.seed)
+
+        levels = []
+        print(f"{'会话数':>6} {'重跑次数':>8} {'p50(ms)':>10} {'p95(ms)':>10} {'p99(ms)':>10} {'吞吐(次/秒)':>12} {'内存峰值(MB)':>14}")
+        for concurrency in args.sessions:
+            level = run_level(url, server_pid, concurrency, args.iterations, args.timeout, args.seed)
+            levels.append(level)
+            rss = f"{level['peak_rss_mb']:>14.1f}" if level['peak_rss_mb'] else f"{'-':>14}"
+            print(
+                f"{level['sessions']:>6} {level['reruns']:>8} {format_ms(level['p50'])} {format_ms(level['p95'])} "
+                f"{format_ms(level['p99'])} {level['throughput_rps'] or 0:>12.2f} {rss}"
+            )
+            if level['error_count']:
+                print(f"       ⚠️ {level['error_count']} 个错误，例如: {level['errors'][0]}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    results = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'params': {'iterations': args.iterations, 'seed': args.seed, 'url': url},
+        'levels': levels,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(os.path.join(BENCH_DIR, 'results'), exist_ok=True)
+        output = os.path.join(BENCH_DIR, 'results', f"load_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+
+
+if __name__ == '__main__':
+    main()
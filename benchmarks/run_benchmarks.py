@@ -0,0 +1,265 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import plotly.io
+import plotly.tools
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import analytics
+import bootstrap
+import charts
+import data_loader
+import generate_data
+import leadlag
+import parallel
+import portfolio
+import rolling
+import sales_model
+
+# 基准测试：按阶段计时两个页面的完整计算流程，结果写入JSON便于逐次对比
+#   python benchmarks/run_benchmarks.py --scale medium
+#   python benchmarks/run_benchmarks.py --workbook demo_data.xlsx --compare benchmarks/results/上次结果.json
+#   python benchmarks/run_benchmarks.py --scale medium --workers 4   # 额外计时多进程销量计算
+
+# 预测模拟器的默认筛选条件（与页面默认值一致）
+PREDICTOR_DEFAULTS = dict(ip_categories=["IP类别_古风独家IP"], materials=["木质"], purposes=["箱包配饰"])
+
+
+# 读取数据：xlsx 走页面使用的快照加载器，parquet 目录直接读取并做同样的预处理
+def load_sheet(source, sheet_name):
+    if os.path.isdir(source):
+        return data_loader.load_sheet(source, sheet_name)
+    snapshot = data_loader.SnapshotLoader(source, sheet_name).get()
+    return snapshot.df, snapshot.indexes
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, func, *args, count=None, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        stage = self.stages.setdefault(name, {'runs': []})
+        stage['runs'].append(elapsed)
+        if count is not None:
+            stage['count'] = count(result) if callable(count) else count
+        return result
+
+    def summary(self):
+        return {
+            name: dict(stage, seconds=statistics.median(stage['runs']), min=min(stage['runs']))
+            for name, stage in self.stages.items()
+        }
+
+
+# 与 st.plotly_chart 相同的序列化：图表 -> 字典 -> JSON
+def serialize_figure(fig):
+    return plotly.io.to_json(plotly.tools.return_figure_from_figure_or_data(fig, validate_figure=True), validate=False)
+
+
+# 每个图表序列化两次：第一次为新构建的图表，第二次为页面按输入缓存后重新显示同一个图表（count 为 JSON 字节数）
+def time_serialization(timer, figures):
+    for name, fig in figures:
+        timer.run(f'serialize_{name}', serialize_figure, fig, count=len)
+        timer.run(f'serialize_{name}_cached', serialize_figure, fig, count=len)
+
+
+# 单次完整流程（count 记录各阶段处理的行数 / 组合数 / 曲线数）
+def run_once(timer, source, dashboard_ips, target_week, evaluator=None):
+    dashboard_df, dashboard_indexes = timer.run('load_dashboard', load_sheet, source, data_loader.DASHBOARD_SHEET, count=lambda r: len(r[0]))
+    predictor_df, predictor_indexes = timer.run('load_predictor', load_sheet, source, data_loader.PREDICTOR_SHEET, count=lambda r: len(r[0]))
+
+    # 数据大屏
+    selected_ips = dashboard_indexes['ip_options'][:dashboard_ips]
+    filtered_df = timer.run(
+        'dashboard_filter', analytics.filter_dashboard_data,
+        dashboard_df, selected_ips, dashboard_indexes['min_date'], dashboard_indexes['max_date'], count=len
+    )
+    social_platforms = analytics.SOCIAL_PLATFORMS
+    ecommerce_platforms = analytics.ECOMMERCE_PLATFORMS
+    timer.run('dashboard_kpis', analytics.compute_dashboard_kpis, filtered_df, social_platforms, ecommerce_platforms,
+              dashboard_indexes['schema'])
+
+    def build_dashboard_figures():
+        return [
+            charts.build_social_figure(filtered_df, selected_ips, social_platforms, True, True, dashboard_indexes['schema']),
+            charts.build_ecommerce_figure(filtered_df, selected_ips, ecommerce_platforms, True, True, dashboard_indexes['schema']),
+        ]
+    dashboard_figures = timer.run('dashboard_figures', build_dashboard_figures, count=lambda figs: sum(len(fig.data) for fig in figs))
+    time_serialization(timer, zip(['social', 'ecommerce'], dashboard_figures))
+    # 移动平均 / 增长率 / 异常点：所有IP和指标列一次计算
+    timer.run(
+        'dashboard_rolling', rolling.RollingStats.build, filtered_df, rolling.metric_columns(dashboard_indexes['schema']),
+        count=lambda stats: len(stats.table)
+    )
+    # 社媒 → 销量 领先 / 滞后：所有IP × 指标对的互相关一次批量计算
+    timer.run(
+        'dashboard_lead_lag', leadlag.compute_lead_lag, dashboard_df, dashboard_indexes['schema'],
+        count=lambda result: result.corr.size
+    )
+    # 组合视图：所有IP按周一次分组累加
+    timer.run(
+        'dashboard_portfolio', portfolio.PortfolioOverview.build, dashboard_df, dashboard_indexes['schema'],
+        analytics.SOCIAL_PLATFORMS, analytics.ECOMMERCE_PLATFORMS, dashboard_indexes['min_date'], dashboard_indexes['max_date'],
+        count=len
+    )
+
+    # 预测模拟器
+    filtered_df = timer.run(
+        'predictor_filter', analytics.filter_predictor_data,
+        predictor_df, predictor_indexes.get('市场'), predictor_indexes.get('销售渠道'),
+        PREDICTOR_DEFAULTS['ip_categories'], PREDICTOR_DEFAULTS['materials'], PREDICTOR_DEFAULTS['purposes'],
+        count=len
+    )
+    table_data, active_configs, _, _ = timer.run(
+        'config_table', analytics.build_config_table, filtered_df, set(), {}, {}, predictor_indexes['schema'],
+        count=lambda r: len(r[0])
+    )
+    pie_data, trend_data = timer.run(
+        'sales_calc', analytics.build_prediction_results, filtered_df, active_configs, target_week,
+        predictor_indexes['schema'],
+        count=len(active_configs)
+    )
+    # 页面默认后端：每周销量矩阵按快照整理一次，之后每次计算只取前 target_week 列，与目标周数无关
+    arrays = timer.run(
+        'predictor_arrays', parallel.PredictorArrays.from_frame, predictor_df, predictor_indexes['schema'],
+        count=len(predictor_df)
+    )
+    array_results = timer.run(
+        'sales_calc_arrays', parallel.build_prediction_results,
+        arrays, predictor_df.index.get_indexer(filtered_df.index), active_configs, target_week,
+        count=len(active_configs)
+    )
+    if array_results[0] != pie_data:
+        print("⚠️ 数组计算结果与 Pandas 计算不一致")
+    if evaluator is not None:
+        snapshot = data_loader.DataSnapshot(predictor_df, predictor_indexes, None, 0, None)
+        parallel_results = timer.run(
+            'sales_calc_parallel', evaluator.build_prediction_results, snapshot, filtered_df, active_configs, target_week,
+            count=len(active_configs)
+        )
+        if parallel_results[0] != pie_data:
+            print("⚠️ 多进程计算结果与单进程不一致")
+
+    # 置信区间：所有组合 × 1000 次重抽样
+    timer.run(
+        'bootstrap_bands', bootstrap.bootstrap_bands, filtered_df, active_configs, target_week, predictor_indexes['schema'],
+        count=len(active_configs)
+    )
+
+    # 新品模拟：训练销量模型，并对所有门店 × 底表中的商品批量预测
+    model = timer.run('sales_model_train', sales_model.train, predictor_df, predictor_indexes['schema'])
+    products = predictor_df.drop_duplicates('商品编号')
+    timer.run(
+        'sales_model_predict', model.top_store_curves, model.stores, products, 10, target_week,
+        count=len(model.stores) * len(products)
+    )
+
+    # 与页面一样只单独显示前K个组合
+    def build_prediction_figures():
+        chart_pie, chart_trend = analytics.fold_top_k(pie_data, trend_data, analytics.CHART_TOP_K)
+        return [charts.build_pie_figure(chart_pie), charts.build_trend_figure(chart_trend)]
+    prediction_figures = timer.run('prediction_charts', build_prediction_figures, count=lambda figs: sum(len(fig.data) for fig in figs))
+    time_serialization(timer, zip(['pie', 'trend'], prediction_figures))
+
+
+# 与历史结果对比，返回变慢超过阈值的阶段
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\n对比基线: {baseline_path}")
+    for name, stage in results['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if not base:
+            print(f"  {name:<20} 新增阶段")
+            continue
+        ratio = stage['seconds'] / base['seconds'] if base['seconds'] > 0 else float('inf')
+        flag = '  ⚠️ 变慢' if ratio > threshold else ''
+        print(f"  {name:<20} {base['seconds']:.4f}s -> {stage['seconds']:.4f}s  ×{ratio:.2f}{flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IP数据分析平台分阶段基准测试')
+    generate_data.add_scale_arguments(parser)
+    parser.add_argument('--workbook', help='使用已有的xlsx文件或parquet目录，不生成合成数据')
+    parser.add_argument('--format', choices=['xlsx', 'parquet'], default='parquet', help='合成数据的写出格式')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取中位数')
+    parser.add_argument('--dashboard-ips', type=int, default=2, help='数据大屏选中的IP数')
+    parser.add_argument('--target-week', type=int, default=8, help='预测目标周数')
+    parser.add_argument('--workers', type=int, default=0, help='大于1时额外计时多进程销量计算')
+    parser.add_argument('--output', help='结果JSON路径，默认写入 benchmarks/results/')
+    parser.add_argument('--compare', help='与之前的结果JSON对比')
+    parser.add_argument('--threshold', type=float, default=1.25, help='对比时判定为变慢的倍数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.workbook:
+            source = args.workbook
+            scale = {'workbook': os.path.abspath(args.workbook)}
+        else:
+            scale = generate_data.parse_scale(args)
+            frames = generate_data.generate(seed=args.seed, **scale)
+            source = os.path.join(tmp, 'bench_data.xlsx' if args.format == 'xlsx' else 'bench_data')
+            generate_data.write(frames, source, args.format)
+            del frames
+            scale['format'] = args.format
+
+        timer = StageTimer()
+        evaluator = parallel.ParallelEvaluator(args.workers) if args.workers > 1 else None
+        try:
+            for i in range(args.repeat):
+                run_once(timer, source, args.dashboard_ips, args.target_week, evaluator)
+        finally:
+            if evaluator is not None:
+                evaluator.close()
+
+    results = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'scale': scale,
+        'params': {'repeat': args.repeat, 'dashboard_ips': args.dashboard_ips, 'target_week': args.target_week,
+                   'workers': args.workers},
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'stages': timer.summary(),
+    }
+
+    for name, stage in results['stages'].items():
+        count = f"  (n={stage['count']:,})" if 'count' in stage else ''
+        print(f"{name:<20} {stage['seconds']:.4f}s{count}")
+
+    output = args.output
+    if output is None:
+        os.makedirs(os.path.join(BENCH_DIR, 'results'), exist_ok=True)
+        output = os.path.join(BENCH_DIR, 'results', f"bench_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from load_test import APP_DIR, free_port, start_server
+
+# 冷启动预算检查：
+#   1. 导入应用模块本身的耗时（不含已由服务进程加载的 streamlit），以及是否提前导入了 pandas / plotly 等重型模块
+#   2. 全新服务进程中第一个会话：侧边栏导航出现的时间（页面框架）和首页完整渲染的时间
+# 超出预算时以非零状态退出，可放在CI中
+#   python benchmarks/startup_budget.py --repeat 3 --import-budget 0.3 --shell-budget 1.0
+
+HEAVY_MODULES = ['pandas', 'numpy', 'plotly.subplots', 'openpyxl', 'analytics', 'charts', 'data_loader']
+
+IMPORT_PROBE = f"""
+import json, sys, time
+import streamlit
+start = time.perf_counter()
+import ip_sale_prediction_demo
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+# 在新的解释器中测量导入应用模块的耗时
+def measure_import():
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_PROBE],
+        cwd=APP_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# 全新服务进程的第一个会话：返回 (侧边栏导航出现耗时, 首页渲染完成耗时)
+async def measure_first_session(url, timeout):
+    import websockets
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    back_msg = BackMsg()
+    back_msg.rerun_script.query_string = ''
+    back_msg.rerun_script.page_script_hash = ''
+
+    async with websockets.connect(url, subprotocols=['streamlit'], max_size=None) as ws:
+        start = time.perf_counter()
+        await ws.send(back_msg.SerializeToString())
+        shell = None
+        while True:
+            msg = ForwardMsg()
+            msg.ParseFromString(await asyncio.wait_for(ws.recv(), timeout))
+            msg_type = msg.WhichOneof('type')
+            if (shell is None and msg_type == 'delta'
+                    and msg.delta.WhichOneof('type') == 'new_element'
+                    and msg.delta.new_element.WhichOneof('type') == 'button'):
+                shell = time.perf_counter() - start
+            if msg_type == 'script_finished':
+                return shell, time.perf_counter() - start
+
+
+def measure_cold_start(timeout):
+    port = free_port()
+    process = start_server(port)
+    try:
+        return asyncio.run(measure_first_session(f'ws://127.0.0.1:{port}/_stcore/stream', timeout))
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='冷启动导入耗时与首屏预算检查')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取中位数')
+    parser.add_argument('--import-budget', type=float, default=0.3, help='导入应用模块的预算（秒）')
+    parser.add_argument('--shell-budget', type=float, default=1.0, help='侧边栏导航出现的预算（秒）')
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.repeat)]
+    cold_starts = [measure_cold_start(args.timeout) for _ in range(args.repeat)]
+
+    import_seconds = statistics.median(item['seconds'] for item in imports)
+    heavy = sorted({module for item in imports for module in item['heavy']})
+    shells = [shell for shell, _ in cold_starts if shell is not None]
+    shell_seconds = statistics.median(shells) if shells else None
+    page_seconds = statistics.median(page for _, page in cold_starts)
+
+    failures = []
+    print(f"导入应用模块      {import_seconds:.3f}s  (预算 {args.import_budget:.3f}s)")
+    if import_seconds > args.import_budget:
+        failures.append('import')
+    if heavy:
+        print(f"  ⚠️ 启动时已导入重型模块: {', '.join(heavy)}")
+        failures.append('heavy_modules')
+    if shell_seconds is None:
+        print("侧边栏导航        未检测到")
+        failures.append('shell')
+    else:
+        print(f"侧边栏导航出现    {shell_seconds:.3f}s  (预算 {args.shell_budget:.3f}s)")
+        if shell_seconds > args.shell_budget:
+            failures.append('shell')
+    print(f"首页渲染完成      {page_seconds:.3f}s")
+
+    if failures:
+        print(f"\n超出预算: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import numpy as np
+
+import analytics
+import parallel
+from schema import PredictorSchema
+
+# 预测销量的置信区间（不依赖Streamlit）：对每个组合选中的前N个门店做有放回重抽样（bootstrap），
+# 每次抽出的门店每周销量之和作为组合销量的一个样本，取样本分位数作为区间
+# 所有组合的门店排成一个 (门店数, 周数) 矩阵，每个组合占连续的一段；一次生成 (重抽样次数, 门店数) 的下标矩阵，
+# 取行后用 np.add.reduceat 按组合求和，不按组合或重抽样逐个循环（按重抽样分块只为限制内存）
+#   bands = bootstrap_bands(filtered_df, active_configs, target_week, schema)
+#   intervals = bands.pie_intervals([item['value'] for item in pie_data], chart_top_k)   # 与 fold_top_k 的结果一一对应
+#   weekly = bands.trend_bands([sum(item['sales']) for item in trend_data], chart_top_k)
+
+RESAMPLES = 1000
+CONFIDENCE = 0.95
+SEED = 0
+# 每块 重抽样次数 × 门店数 × 周数 的上限
+BLOCK_CELLS = 4_000_000
+
+
+# 有销量的组合（与 analytics.build_prediction_results、slice_weeks 相同，按 active_configs 顺序）选中门店
+# 起始周到目标周的每周销量：[(门店数, 周数) 矩阵]
+def selected_store_sales(filtered_df, active_configs, target_week, schema=None, start_week=1):
+    schema = schema or PredictorSchema(filtered_df.columns)
+    arrays = parallel.PredictorArrays.from_frame(filtered_df, schema)
+    groups = arrays.combo_rows(np.arange(len(filtered_df)))
+    empty = np.array([], dtype=np.int64)
+    blocks = []
+    for config in active_configs.values():
+        rows = groups.get((config['ip_name'], config['product_code'], config['channel'], config['market']), empty)
+        _, sales = parallel.top_store_sales(arrays, rows, config, target_week)
+        sales = sales[:, start_week - 1:]
+        if sales.sum() > 0:
+            blocks.append(sales.astype(float))
+    return blocks
+
+
+# 所有组合的重抽样销量：(重抽样次数, 组合数, 周数)
+def resample_sums(blocks, resamples=RESAMPLES, seed=SEED):
+    weeks = blocks[0].shape[1] if blocks else 0
+    samples = np.zeros((resamples, len(blocks), weeks))
+    if not blocks:
+        return samples
+    sales = np.vstack(blocks)
+    sizes = np.array([len(block) for block in blocks])
+    starts = np.r_[0, np.cumsum(sizes)[:-1]]
+    # 每个门店位置所属组合的起始行和门店数：在本组合内均匀抽取
+    owner_start = np.repeat(starts, sizes)
+    owner_size = np.repeat(sizes, sizes)
+    rng = np.random.default_rng(seed)
+    step = max(1, BLOCK_CELLS // sales.size)
+    for first in range(0, resamples, step):
+        count = min(step, resamples - first)
+        index = owner_start + rng.integers(owner_size, size=(count, len(owner_size)))
+        samples[first:first + count] = np.add.reduceat(sales[index], starts, axis=1)
+    return samples
+
+
+class SalesBands:
+    def __init__(self, samples, confidence=CONFIDENCE):
+        # (重抽样次数, 组合数, 周数)
+        self.samples = samples
+        self.confidence = confidence
+
+    # 与 analytics.fold_top_k 相同的折叠：前K项各自保留，其余合并为“其他”；values 为折叠前各项的销量
+    def _fold(self, samples, values, k):
+        count = samples.shape[1]
+        if k is None or count <= k:
+            return samples
+        keep = analytics.top_k_positions(values, k)
+        rest = np.setdiff1d(np.arange(count), keep)
+        return np.concatenate([samples[:, keep], samples[:, rest].sum(axis=1, keepdims=True)], axis=1)
+
+    # (下限, 上限)，形状为样本去掉第一维
+    def _interval(self, samples):
+        tail = (1 - self.confidence) / 2 * 100
+        return np.percentile(samples, [tail, 100 - tail], axis=0)
+
+    # 环形图每项总销量的区间 [(下限, 上限)]；项数与组合数不一致（结果不是同一次计算）时为 None
+    def pie_intervals(self, values, k=None):
+        if len(values) != self.samples.shape[1]:
+            return None
+        lower, upper = self._interval(self._fold(self.samples.sum(axis=2), values, k))
+        return list(zip(lower.tolist(), upper.tolist()))
+
+    # 趋势图每条曲线每周的区间 [(下限列表, 上限列表)]；“其他”各组合的起始日期不同时按周序号合并
+    def trend_bands(self, values, k=None):
+        if len(values) != self.samples.shape[1]:
+            return None
+        lower, upper = self._interval(self._fold(self.samples, values, k))
+        return list(zip(lower.tolist(), upper.tolist()))
+
+
+def bootstrap_bands(filtered_df, active_configs, target_week, schema=None, resamples=RESAMPLES,
+                    confidence=CONFIDENCE, seed=SEED, start_week=1):
+    blocks = selected_store_sales(filtered_df, active_configs, target_week, schema, start_week)
+    return SalesBands(resample_sums(blocks, resamples, seed), confidence)
@@ -0,0 +1,437 @@
+import numpy as np
+import plotly.graph_objects as go
+
+from schema import DashboardSchema
+
+# 图表构建（不依赖Streamlit）
+# 趋势图和环形图直接由 NumPy 数组和字典拼出曲线与布局（make_figure），不经过 go.Scatter 等逐个属性的校验；
+# 数值数组在序列化时转为 base64 类型数组，日期为ISO字符串，安装了 orjson 时 plotly 自动用它编码JSON
+
+SOCIAL_COLORS = ['#4361ee', '#3a0ca3', '#4cc9f0', '#f72585', '#7209b7', '#4895ef', '#560bad', '#b5179e']
+ECOMMERCE_COLORS = ['#ff6b6b', '#ff9e00', '#06d6a0', '#118ab2', '#ef476f', '#ffd166', '#073b4c', '#7209b7']
+PREDICTION_COLORS = ['#4361ee', '#3a0ca3', '#4cc9f0', '#f72585', '#7209b7']
+# 合并后的"其他"项（见 analytics.fold_top_k）
+OTHERS_COLOR = '#adb5bd'
+
+# 主纵轴指标（实线）和副纵轴指标（点线）的线型
+PRIMARY_LINES = (dict(width=3, shape='spline'), dict(width=2, dash='dash', shape='spline'))
+SECONDARY_LINES = (dict(width=2, dash='dot', shape='spline'), dict(width=1.5, dash='dot', shape='spline'))
+# 移动平均叠加线（见 rolling.py），按窗口天数区分线型
+MOVING_AVERAGE_LINES = {7: dict(width=1.5), 28: dict(width=1.5, dash='longdash')}
+
+# 深灰色坐标轴样式
+AXIS_STYLE = dict(
+    zeroline=True,
+    zerolinewidth=1,
+    zerolinecolor='rgba(80,80,80,0.5)',
+    linecolor='rgba(80,80,80,0.8)',
+    linewidth=1
+)
+GRID_STYLE = dict(showgrid=True, gridwidth=0.5, gridcolor='rgba(128,128,128,0.1)')
+
+
+# 一条折线的数据（不经过 go.Scatter 的属性校验，见 make_figure）
+def line_trace(x, y, name, line, secondary_y=False, **kwargs):
+    return dict(type='scatter', x=x, y=y, name=name, line=line, mode='lines', xaxis='x', yaxis='y2' if secondary_y else 'y', **kwargs)
+
+
+class SeriesRows:
+    # 趋势图数据按IP分好的行号（保持原有顺序），日期只转换一次为ISO字符串，各列只取一次 NumPy 数组
+    def __init__(self, df):
+        self.df = df
+        self.dates = np.datetime_as_string(df['日期'].to_numpy(dtype='datetime64[us]'), unit='us')
+        self.status = df['数据状态'].to_numpy()
+        self.groups = df.groupby('IP名称', sort=False).indices if len(df) else {}
+        self._columns = {}
+
+    def column(self, column):
+        values = self._columns.get(column)
+        if values is None:
+            values = self._columns[column] = self.df[column].to_numpy()
+        return values
+
+    def rows(self, ip, status=None):
+        rows = self.groups.get(ip, np.array([], dtype=np.int64))
+        return rows if status is None else rows[self.status[rows] == status]
+
+
+# 一个IP的实际+预测曲线，并在实际数据最后一点添加标签：返回 (曲线列表, 标签列表)
+# overlays: 叠加的滚动统计（'ma7'、'ma28'、'anomaly'），数据需包含 rolling.py 计算出的统计列
+def ip_series_traces(series, ip, column, name, color, lines, secondary_y, overlays=()):
+    actual_line, forecast_line = lines
+    values = series.column(column)
+    traces = []
+    annotations = []
+    # 实际数据
+    actual = series.rows(ip, '实际')
+    if actual.size:
+        traces.append(line_trace(series.dates[actual].tolist(), values[actual], name, dict(actual_line, color=color), secondary_y))
+        # 在最后点添加标签
+        annotations.append(dict(
+            x=series.df['日期'].iat[actual[-1]].isoformat(),
+            y=values[actual[-1]],
+            text=name,
+            showarrow=False,
+            xshift=40,
+            yshift=0,
+            bgcolor="white",
+            bordercolor=color,
+            borderwidth=1,
+            borderpad=2,
+            font=dict(size=10, color=color)
+        ))
+    # 预测数据
+    forecast = series.rows(ip, '预测')
+    if forecast.size:
+        traces.append(line_trace(
+            series.dates[forecast].tolist(), values[forecast], f"{name}(预测)", dict(forecast_line, color=color), secondary_y,
+            showlegend=False
+        ))
+    if overlays:
+        traces.extend(rolling_overlay_traces(series, ip, column, name, color, secondary_y, overlays))
+    return traces, annotations
+
+
+# 移动平均线（悬停显示环比增长率）和异常点标记（|z| 超过阈值的实际数据）
+def rolling_overlay_traces(series, ip, column, name, color, secondary_y, overlays):
+    rows = series.rows(ip)
+    dates = series.dates[rows].tolist()
+    traces = []
+    for window, line in MOVING_AVERAGE_LINES.items():
+        if f'ma{window}' not in overlays:
+            continue
+        traces.append(line_trace(
+            dates, series.column(f'{column}|ma{window}')[rows], f"{name} {window}日均线", dict(line, color=color), secondary_y,
+            customdata=series.column(f'{column}|growth{window}')[rows],
+            opacity=0.6,
+            hovertemplate=f"{name} {window}日均线<br>%{{x|%Y-%m-%d}}: %{{y:,.1f}}<br>环比 %{{customdata:+.1%}}<extra></extra>",
+            showlegend=False
+        ))
+    if 'anomaly' in overlays:
+        anomalies = rows[series.column(f'{column}|anomaly')[rows].astype(bool)]
+        if anomalies.size:
+            traces.append(dict(
+                type='scatter',
+                x=series.dates[anomalies].tolist(),
+                y=series.column(column)[anomalies],
+                customdata=series.column(f'{column}|z')[anomalies],
+                name=f"{name} 异常",
+                marker=dict(symbol='circle-open', size=10, color=color, line=dict(width=2)),
+                mode='markers',
+                hovertemplate=f"{name} 异常<br>%{{x|%Y-%m-%d}}: %{{y:,.0f}}<br>z = %{{customdata:.1f}}<extra></extra>",
+                showlegend=False,
+                xaxis='x',
+                yaxis='y2' if secondary_y else 'y',
+            ))
+    return traces
+
+
+# 主纵轴 + 副纵轴的布局（与 make_subplots(specs=[[{"secondary_y": True}]]) 相同），
+# 深灰色坐标轴，紧凑间距，中文日期格式
+def trend_layout(primary_title, secondary_title, annotations):
+    yaxis = dict(anchor='x', domain=[0.0, 1.0])
+    if primary_title:
+        yaxis.update(title=dict(text=primary_title), **GRID_STYLE, **AXIS_STYLE)
+    yaxis2 = dict(anchor='x', overlaying='y', side='right')
+    if secondary_title:
+        yaxis2.update(title=dict(text=secondary_title), showgrid=False, **AXIS_STYLE)
+    return dict(
+        xaxis=dict(anchor='y', domain=[0.0, 0.94], **GRID_STYLE, **AXIS_STYLE, tickformat='%Y-%m', dtick="M1"),
+        yaxis=yaxis,
+        yaxis2=yaxis2,
+        annotations=annotations,
+        height=450,
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(size=11),
+        margin=dict(t=30, l=50, r=30, b=50),
+        showlegend=False,
+    )
+
+
+# 构建完成后不再修改的图表：Streamlit 每次显示都会调用 to_dict()（深拷贝并把 NumPy 数组转成 base64 类型数组），
+# 第一次的结果缓存下来，同一个图表对象再次显示时只剩 JSON 编码（安装了 orjson 时 plotly 自动使用）
+class PayloadFigure(go.Figure):
+    def to_dict(self):
+        payload = getattr(self, '_payload', None)
+        if payload is None:
+            payload = self._payload = super().to_dict()
+        return payload
+
+
+# 直接由曲线和布局的字典构建图表，跳过逐个属性的校验（曲线多时校验是构建图表的主要耗时）
+# 没有标签时不写 annotations（与逐个 add_annotation 的结果一致）
+def make_figure(data, layout):
+    if 'annotations' in layout and not layout['annotations']:
+        layout = {key: value for key, value in layout.items() if key != 'annotations'}
+    return PayloadFigure(dict(data=data, layout=layout), _validate=False)
+
+
+# 社媒热度趋势：互动量（主纵轴）+ 发帖数（副纵轴）
+def build_social_figure(filtered_df, selected_ips, social_platforms, show_engagement, show_posts, schema=None, overlays=()):
+    schema = schema or DashboardSchema(filtered_df.columns)
+    series = SeriesRows(filtered_df)
+    data = []
+    annotations = []
+    color_idx = 0
+
+    for enabled, metric, mapping, lines, secondary_y in [
+        (show_engagement, '互动量', schema.engagement_columns, PRIMARY_LINES, False),
+        (show_posts, '发帖数', schema.post_columns, SECONDARY_LINES, True),
+    ]:
+        if not enabled:
+            continue
+        for platform in social_platforms:
+            column = mapping.get(platform)
+            if column:
+                for ip in selected_ips:
+                    color = SOCIAL_COLORS[color_idx % len(SOCIAL_COLORS)]
+                    color_idx += 1
+                    traces, labels = ip_series_traces(series, ip, column, f"{ip} {platform}{metric}", color, lines, secondary_y, overlays)
+                    data.extend(traces)
+                    annotations.extend(labels)
+
+    return make_figure(data, trend_layout("互动量", "发帖数" if show_posts else None, annotations))
+
+
+# 电商热度趋势：销量（主纵轴）+ 二手销量（副纵轴）
+def build_ecommerce_figure(filtered_df, selected_ips, ecommerce_platforms, show_sales, show_secondhand, schema=None, overlays=()):
+    schema = schema or DashboardSchema(filtered_df.columns)
+    series = SeriesRows(filtered_df)
+    data = []
+    annotations = []
+    color_idx = 0
+
+    # 电商销量数据（主纵轴）
+    if show_sales:
+        for platform in ecommerce_platforms:
+            column = schema.sales_columns.get(platform)
+            if column:
+                for ip in selected_ips:
+                    color = ECOMMERCE_COLORS[color_idx % len(ECOMMERCE_COLORS)]
+                    color_idx += 1
+                    traces, labels = ip_series_traces(series, ip, column, f"{ip} {platform}销量", color, PRIMARY_LINES, False, overlays)
+                    data.extend(traces)
+                    annotations.extend(labels)
+
+    # 二手销量数据（副纵轴）
+    if show_secondhand and schema.secondhand_column:
+        for ip in selected_ips:
+            color = ECOMMERCE_COLORS[color_idx % len(ECOMMERCE_COLORS)]
+            color_idx += 1
+            traces, labels = ip_series_traces(series, ip, schema.secondhand_column, f"{ip} 二手销量", color, SECONDARY_LINES, True, overlays)
+            data.extend(traces)
+            annotations.extend(labels)
+
+    return make_figure(data, trend_layout("销量" if show_sales else None, "二手销量" if show_secondhand else None, annotations))
+
+
+# 销量占比环形图
+def build_pie_figure(pie_data, intervals=None):
+    colors = PREDICTION_COLORS
+    if any('others' in item for item in pie_data):
+        colors = [OTHERS_COLOR if 'others' in item else PREDICTION_COLORS[i % len(PREDICTION_COLORS)]
+                  for i, item in enumerate(pie_data)]
+    # 置信区间（bootstrap.SalesBands.pie_intervals）显示在悬停信息中
+    interval_args = {}
+    if intervals is not None:
+        interval_args = dict(
+            customdata=intervals,
+            hovertemplate='%{label}<br>%{value:,.0f}（%{percent}）<br>区间 %{customdata[0]:,.0f} – %{customdata[1]:,.0f}<extra></extra>'
+        )
+    pie = dict(
+        type='pie',
+        labels=[item['label'] for item in pie_data],
+        values=[item['value'] for item in pie_data],
+        hole=0.4,
+        textinfo='percent+label',
+        marker=dict(colors=colors),
+        showlegend=False,
+        **interval_args
+    )
+    return make_figure([pie], dict(height=275, margin=dict(l=10, r=10, t=30, b=10)))
+
+
+# 销量下钻旭日图：nodes 为 DrilldownTree.subtree 的结果，父节点销量等于子节点之和
+def build_drilldown_figure(nodes):
+    ids, labels, parents, values = nodes
+    fig = go.Figure(go.Sunburst(
+        ids=ids,
+        labels=labels,
+        parents=parents,
+        values=values,
+        branchvalues='total',
+        insidetextorientation='radial'
+    ))
+    fig.update_layout(height=360, margin=dict(l=10, r=10, t=30, b=10))
+    return fig
+
+
+def _format_pct(value):
+    return '' if value != value else f'{value:+.1%}'
+
+
+# 场景对比：各组合相对基准场景的总销量差值，每个场景一组柱，柱上标注差值百分比
+def build_scenario_delta_figure(comparison, baseline):
+    labels = list(comparison.labels.values())
+    fig = go.Figure()
+    for i, name in enumerate(name for name in comparison.names if name != baseline):
+        diff, pct = comparison.total_delta(name, baseline)
+        fig.add_trace(go.Bar(
+            x=labels,
+            y=diff,
+            name=name,
+            marker_color=PREDICTION_COLORS[i % len(PREDICTION_COLORS)],
+            text=[_format_pct(value) for value in pct],
+            textposition='outside',
+            hovertemplate='%{x}<br>差值 %{y:,.0f}<br>%{text}<extra>' + name + '</extra>'
+        ))
+    fig.update_layout(
+        barmode='group',
+        height=340,
+        margin=dict(l=10, r=10, t=30, b=10),
+        yaxis_title=f'相对“{baseline}”的销量差值',
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+        xaxis=dict(tickangle=30)
+    )
+    return fig
+
+
+# 场景对比：某个场景相对基准的每周销量差值百分比，行为组合、列为周
+def build_scenario_week_figure(comparison, name, baseline):
+    diff, pct = comparison.delta(name, baseline)
+    fig = go.Figure(go.Heatmap(
+        z=pct * 100,
+        x=[f'第{week}周' for week in range(1, comparison.weeks + 1)],
+        y=list(comparison.labels.values()),
+        customdata=diff,
+        colorscale='RdBu',
+        zmid=0,
+        colorbar=dict(title='%'),
+        hovertemplate='%{y}<br>%{x}<br>差值 %{customdata:,.0f}<br>%{z:+.1f}%<extra></extra>'
+    ))
+    fig.update_layout(
+        height=max(300, 22 * len(comparison.labels) + 80),
+        margin=dict(l=10, r=10, t=30, b=10),
+        yaxis=dict(autorange='reversed')
+    )
+    return fig
+
+
+# 领先 / 滞后热力图：行为指标对或IP，列为滞后天数（正数表示社媒领先销量），值为相关系数
+def build_lead_lag_figure(labels, lags, matrix):
+    fig = go.Figure(go.Heatmap(
+        z=matrix,
+        x=lags,
+        y=labels,
+        colorscale='RdBu',
+        zmin=-1,
+        zmax=1,
+        colorbar=dict(title='相关系数'),
+        hovertemplate='%{y}<br>领先 %{x} 天<br>相关系数 %{z:.2f}<extra></extra>'
+    ))
+    fig.add_vline(x=0, line=dict(color='rgba(0,0,0,0.4)', width=1, dash='dot'))
+    fig.update_layout(
+        height=max(300, 22 * len(labels) + 80),
+        margin=dict(l=10, r=10, t=30, b=10),
+        xaxis_title='社媒领先销量的天数',
+        yaxis=dict(autorange='reversed')
+    )
+    return fig
+
+
+# 组合视图：排名前N的IP每周合计（portfolio.PortfolioOverview.top_series），每个IP一条曲线，显示图例
+def build_portfolio_figure(ips, week_ends, matrix, label):
+    dates = [date.isoformat() for date in week_ends]
+    colors = SOCIAL_COLORS if label == '互动量' else ECOMMERCE_COLORS
+    data = [
+        line_trace(dates, matrix[i], ip, dict(width=2, color=colors[i % len(colors)]),
+                   hovertemplate=f'{ip}<br>%{{x}} 所在周<br>{label} %{{y:,.0f}}<extra></extra>')
+        for i, ip in enumerate(ips)
+    ]
+    layout = trend_layout(f"每周{label}", None, [])
+    layout.update(showlegend=True, legend=dict(orientation='h', yanchor='bottom', y=1.02, x=0))
+    return make_figure(data, layout)
+
+
+def _rgba(color, alpha):
+    color = color.lstrip('#')
+    return f"rgba({int(color[0:2], 16)}, {int(color[2:4], 16)}, {int(color[4:6], 16)}, {alpha})"
+
+
+# 销量趋势图：每个组合一条曲线，并在最后一个数据点添加标签
+# bands 为每条曲线每周的置信区间（bootstrap.SalesBands.trend_bands），画在曲线下方；周数与曲线不一致的项不画
+def build_trend_figure(trend_data, bands=None):
+    data = []
+    annotations = []
+
+    for i, item in enumerate(trend_data):
+        if item['sales'] and any(sales > 0 for sales in item['sales']):
+            color = PREDICTION_COLORS[i % len(PREDICTION_COLORS)]
+            line = dict(width=3, color=color, shape='spline')
+            label = item['label']
+            if 'others' in item:
+                color = OTHERS_COLOR
+                line = dict(width=2, color=color, shape='spline', dash='dash')
+                label = f"{item['label']}（{item['others']}个组合）"
+            if bands is not None and len(bands[i][0]) == len(item['dates']):
+                lower, upper = bands[i]
+                data.append(dict(
+                    type='scatter',
+                    x=list(item['dates']) + list(item['dates'])[::-1],
+                    y=list(upper) + list(lower)[::-1],
+                    fill='toself',
+                    fillcolor=_rgba(color, 0.15),
+                    line=dict(width=0),
+                    hoverinfo='skip',
+                    showlegend=False
+                ))
+            data.append(dict(
+                type='scatter',
+                x=item['dates'],
+                y=item['sales'],
+                mode='lines',
+                name=label,
+                line=line,
+                showlegend=False
+            ))
+
+            # 在最后一个数据点添加标签
+            if item['dates'] and item['sales']:
+                annotations.append(dict(
+                    x=item['dates'][-1],
+                    y=item['sales'][-1],
+                    text=label,
+                    showarrow=True,
+                    arrowhead=2,
+                    arrowsize=1,
+                    arrowwidth=2,
+                    arrowcolor=color,
+                    bgcolor="white",
+                    bordercolor=color,
+                    borderwidth=1,
+                    borderpad=4,
+                    font=dict(size=10, color=color),
+                    yshift=20
+                ))
+
+    return make_figure(data, dict(
+        annotations=annotations,
+        height=300,
+        margin=dict(l=10, r=10, t=30, b=10),
+        showlegend=False,
+        xaxis=dict(
+            title=dict(text="日期"),
+            tickformat='%Y-%m-%d',
+            tickangle=45,
+            linecolor='#666666',
+            gridcolor='rgba(128,128,128,0.2)',
+            zerolinecolor='rgba(128,128,128,0.5)'
+        ),
+        yaxis=dict(
+            title=dict(text="销量"),
+            linecolor='#666666',
+            gridcolor='rgba(128,128,128,0.2)',
+            zerolinecolor='rgba(128,128,128,0.5)'
+        )
+    ))
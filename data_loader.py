@@ -0,0 +1,161 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import schema
+
+DATA_FILE = 'demo_data.xlsx'
+DASHBOARD_SHEET = '社媒_电商原始数据表'
+PREDICTOR_SHEET = '预测结果底表'
+
+
+# 数据大屏：校验列结构、日期转换、按日期预排序，并派生IP列表和日期范围
+def prepare_dashboard(df):
+    sheet_schema = schema.DashboardSchema(df.columns)
+    df['日期'] = pd.to_datetime(df['日期'])
+    df = df.sort_values('日期', kind='mergesort').reset_index(drop=True)
+    indexes = {
+        'ip_options': list(df['IP名称'].unique()),
+        'min_date': df['日期'].min().date() if not df.empty else None,
+        'max_date': df['日期'].max().date() if not df.empty else None,
+        'schema': sheet_schema,
+    }
+    return df, indexes
+
+
+# 预测模拟器：校验列结构、日期转换，并派生各筛选项的可选值
+def prepare_predictor(df):
+    sheet_schema = schema.PredictorSchema(df.columns)
+    if sheet_schema.start_date_column:
+        df['销售起始日期'] = pd.to_datetime(df['销售起始日期']).dt.date
+    indexes = {
+        column: list(df[column].unique())
+        for column in ['市场', '销售渠道', 'IP类别', '商品材质', '商品用途']
+        if column in df.columns
+    }
+    indexes['schema'] = sheet_schema
+    return df, indexes
+
+
+SHEET_PREPARERS = {
+    DASHBOARD_SHEET: prepare_dashboard,
+    PREDICTOR_SHEET: prepare_predictor,
+}
+
+
+# 直接读取一张表并预处理（不做快照缓存），source 可以是xlsx文件或每张表一个parquet文件的目录
+def load_sheet(source, sheet_name):
+    if os.path.isdir(source):
+        df = pd.read_parquet(os.path.join(source, f'{sheet_name}.parquet'))
+    else:
+        df = pd.read_excel(source, sheet_name=sheet_name)
+    prepare = SHEET_PREPARERS.get(sheet_name)
+    indexes = {}
+    if prepare is not None:
+        df, indexes = prepare(df)
+    return df, indexes
+
+
+# 一次完整读取的结果：数据、派生索引和版本信息，创建后只读
+class DataSnapshot:
+    def __init__(self, df, indexes, version, generation, source_mtime, rows=None):
+        self.df = df
+        # 数据保存在外部（如数据库）时 df 为 None，只记录行数
+        self.rows = len(df) if df is not None else rows
+        self.indexes = indexes
+        self.version = version
+        self.generation = generation
+        self.source_mtime = source_mtime
+        self.loaded_at = time.time()
+
+    # 加载时解析好的列结构（见 schema.py）
+    @property
+    def schema(self):
+        return self.indexes.get('schema')
+
+    @property
+    def age(self):
+        return time.time() - self.loaded_at
+
+
+# 后台刷新加载器（stale-while-revalidate）
+# 首次读取同步完成；之后文件变化时在工作线程中重新读取并派生索引，
+# 期间继续返回旧快照，准备好后整体替换
+class SnapshotLoader:
+    def __init__(self, path, sheet_name, prepare=None):
+        self.path = path
+        self.sheet_name = sheet_name
+        self.prepare = prepare or SHEET_PREPARERS.get(sheet_name)
+        self.last_error = None
+        self._snapshot = None
+        self._generation = 0
+        self._pending = None
+        self._failed_mtime = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='data-refresh')
+
+    # 返回当前快照；如文件已变化则触发后台刷新，但不等待
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load()
+                return self._snapshot
+        self._maybe_refresh(snapshot)
+        return snapshot
+
+    @property
+    def refreshing(self):
+        pending = self._pending
+        return pending is not None and not pending.done()
+
+    # 手动触发刷新（例如文件被原地覆盖但修改时间未变）
+    def refresh(self):
+        with self._lock:
+            if not self.refreshing:
+                self._pending = self._executor.submit(self._refresh)
+            return self._pending
+
+    def _maybe_refresh(self, snapshot):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            # 文件暂时不可用（如正在被替换）时继续提供旧快照
+            return
+        if mtime == snapshot.source_mtime or mtime == self._failed_mtime:
+            return
+        self.refresh()
+
+    def _refresh(self):
+        mtime = None
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            snapshot = self._load()
+        except Exception as e:
+            # 读取失败（如文件写入未完成）时保留旧快照，等待下一次文件变化
+            self.last_error = e
+            self._failed_mtime = mtime
+            return None
+        with self._lock:
+            self._snapshot = snapshot
+            self.last_error = None
+            self._failed_mtime = None
+        return snapshot
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        version = hashlib.sha1(content).hexdigest()[:12]
+        df = pd.read_excel(io.BytesIO(content), sheet_name=self.sheet_name)
+        indexes = {}
+        if self.prepare is not None:
+            df, indexes = self.prepare(df)
+        self._generation += 1
+        return DataSnapshot(df, indexes, version, self._generation, mtime)
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+import parallel
+
+# 预测销量下钻：市场 → 销售渠道 → IP类别 → IP → 商品 → 门店类型 → 门店
+# 每个场景按页面相同的前N门店选择（parallel.rank_top_stores，与环形图、趋势图相同）计算一次门店明细，
+# 并预先汇总每一层每个节点的销量；展开节点、切换根节点只是查表，不重新计算
+#   detail = backend.drilldown_detail(snapshot, filters, filtered_df, active_configs, target_week, start_week)
+#   tree = build_drilldown(detail)
+#   tree.children(('US', '线下'))  ->  [('IP类别_古风独家IP', 12345), ...]
+
+SALES_COLUMN = '预测销量'
+# 层级取值为空（如门店类型未填写）时的节点名称；NaN 作为路径的一部分无法按键查找
+MISSING_LABEL = '未知'
+
+
+# 下钻层级（数据中没有的列跳过）
+def drilldown_levels(columns, schema):
+    levels = ['市场', '销售渠道', 'IP类别', 'IP名称', '商品编号', schema.store_type_column, '门店编号']
+    return [level for level in levels if level and level in columns]
+
+
+# 每个组合选中的前N门店各一行，销量为起始周到目标周的合计
+# arrays 为快照的 parallel.PredictorArrays，positions 为筛选后的行在数组中的行号，
+# frame 与数组行顺序相同，只用来按行号取各层级的取值
+def top_store_detail(arrays, positions, frame, active_configs, target_week, schema, start_week=1):
+    levels = drilldown_levels(frame.columns, schema)
+    selected = []
+    for _, rows, allowed_types, store_count in parallel.combo_tasks(arrays, positions, active_configs):
+        rows, stores, first_rows = parallel.rank_top_stores(arrays.arrays, rows, allowed_types, store_count)
+        if first_rows.size:
+            selected.append(rows[np.isin(stores, arrays.arrays['store_codes'][first_rows])])
+    if not selected:
+        return pd.DataFrame(columns=levels + [SALES_COLUMN])
+    top_rows = np.concatenate(selected)
+    weekly = arrays.arrays['weekly'][top_rows, start_week - 1:min(target_week, arrays.horizon)]
+    detail = frame[levels].iloc[top_rows].reset_index(drop=True)
+    return detail.assign(**{SALES_COLUMN: np.nan_to_num(weekly).sum(axis=1)})
+
+
+# 各层汇总：totals 以节点路径（各层取值组成的元组）为键，children 记录每个节点按销量降序的子节点
+class DrilldownTree:
+    def __init__(self, detail, levels):
+        self.levels = levels
+        detail = detail.assign(**{level: detail[level].astype(object).where(detail[level].notna(), MISSING_LABEL) for level in levels})
+        self.totals = {(): detail[SALES_COLUMN].sum()}
+        self._children = {}
+        for depth in range(1, len(levels) + 1):
+            sums = detail.groupby(levels[:depth], sort=False, dropna=False)[SALES_COLUMN].sum()
+            for key, value in sums.items():
+                path = key if isinstance(key, tuple) else (key,)
+                self.totals[path] = value
+                self._children.setdefault(path[:-1], []).append(path[-1])
+        for parent, names in self._children.items():
+            names.sort(key=lambda name: self.totals[parent + (name,)], reverse=True)
+
+    def total(self, path=()):
+        return self.totals.get(tuple(path), 0)
+
+    # 子节点及其销量（按销量降序）
+    def children(self, path=()):
+        path = tuple(path)
+        return [(name, self.totals[path + (name,)]) for name in self._children.get(path, [])]
+
+    # 节点下一层的名称（路径最后一层之后）
+    def child_level(self, path=()):
+        return self.levels[len(path)] if len(path) < len(self.levels) else None
+
+    # 以 path 为根、向下 depth 层的节点，供旭日图 / 矩形树图使用：(ids, labels, parents, values)
+    def subtree(self, path=(), depth=2):
+        path = tuple(path)
+        ids, labels, parents, values = ['0'], [' / '.join(map(str, path)) or '全部'], [''], [self.total(path)]
+        frontier = [(path, '0')]
+        for _ in range(depth):
+            next_frontier = []
+            for node, node_id in frontier:
+                for name, value in self.children(node):
+                    child_id = str(len(ids))
+                    ids.append(child_id)
+                    labels.append(str(name))
+                    parents.append(node_id)
+                    values.append(value)
+                    next_frontier.append((node + (name,), child_id))
+            frontier = next_frontier
+        return ids, labels, parents, values
+
+
+def build_drilldown(detail):
+    return DrilldownTree(detail, [column for column in detail.columns if column != SALES_COLUMN])
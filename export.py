@@ -0,0 +1,290 @@
+import datetime
+import importlib.util
+import io
+import tempfile
+from contextlib import contextmanager
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+import parallel
+from schema import DashboardSchema, ECOMMERCE_PLATFORMS, PredictorSchema, SOCIAL_PLATFORMS
+
+# 结果导出（不依赖Streamlit）：数据按块生成、按块写入文件，写文件时内存只与块大小有关
+# 预测结果逐个组合计算，只生成要导出的那张表；数据大屏的筛选结果按块展开为 日期 × IP × 平台 的长表
+#   chunks = backend.prediction_chunks(snapshot, filters, filtered_df, active_configs, target_week, 'weekly')
+#   chunks = prediction_chunks(arrays, positions, frame, active_configs, target_week, 'weekly', schema)
+#   write_chunks(chunks, 'weekly.parquet', 'parquet')           ->  写入的行数
+#   file = export_file(dashboard_chunks(filtered_df, social, ecommerce), 'xlsx')   # 临时文件，供下载按钮读取
+# 注意：st.download_button 会把临时文件的内容整个读入内存再发送给浏览器，页面下载时内存峰值为完整文件大小；
+# 预测结果很大时用 batch_predict.py 直接写文件
+# 列名与 batch_predict.py 的结果表一致
+
+CHUNK_ROWS = 50000
+
+# 格式 -> MIME 类型
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# Excel 单个工作表的最大行数（含表头），超出的行写到下一个工作表
+XLSX_MAX_ROWS = 1048576
+# 写 parquet 时统一为日期时间类型的列
+DATE_COLUMNS = ('start_date', 'date')
+
+# 预测结果可导出的表
+PREDICTION_TABLES = {'totals': '组合总销量', 'weekly': '每周销量曲线', 'stores': '选中门店明细'}
+TOTALS_COLUMNS = [
+    'combo_key', 'ip_name', 'product_code', 'channel', 'market', 'start_date', 'store_types', 'store_count',
+    'target_week', 'total_sales', 'stores',
+]
+WEEKLY_COLUMNS = ['combo_key', 'target_week', 'week', 'date', 'sales']
+DASHBOARD_COLUMNS = ['date', 'ip_name', 'status', 'metric', 'platform', 'value']
+
+
+# parquet 需要 pyarrow，未安装时不提供
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt != 'parquet' or importlib.util.find_spec('pyarrow')]
+
+
+# ---------- 分块 ----------
+
+# 把逐个产出的行（元组列表）按 chunk_rows 合并为 DataFrame；没有任何行时产出一个只有表头的空表
+def _batches(parts, columns, chunk_rows):
+    pending = []
+    produced = False
+    for rows in parts:
+        pending.extend(rows)
+        if len(pending) >= chunk_rows:
+            yield pd.DataFrame(pending, columns=columns)
+            pending = []
+            produced = True
+    if pending or not produced:
+        yield pd.DataFrame(pending, columns=columns)
+
+
+# 已在内存中的表按行切块（batch_predict 写结果表时使用）
+def frame_chunks(df, chunk_rows=CHUNK_ROWS):
+    if df.empty:
+        yield df
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+# ---------- 预测模拟器 ----------
+
+def prediction_columns(table, target_week):
+    if table == 'totals':
+        return TOTALS_COLUMNS
+    if table == 'weekly':
+        return WEEKLY_COLUMNS
+    week_labels = [f'week_{week}' for week in range(1, target_week + 1)]
+    return ['combo_key', 'rank', 'store_id', 'store_type', 'first_week_sales'] + week_labels + ['total_sales']
+
+
+# 一个组合要导出的行：stores / store_types / first_week 为选中的前N门店（按排名），sales 为门店 × 周的销量矩阵
+def _combo_rows(combo_key, config, target_week, table, stores, store_types, first_week, sales):
+    if table == 'totals':
+        return [(
+            combo_key, config['ip_name'], config['product_code'], config['channel'], config['market'],
+            config['start_date'], '|'.join(str(store_type) for store_type in config['store_types']),
+            config['store_count'], target_week, sales.sum().item(), len(stores),
+        )]
+    if len(stores) == 0:
+        return []
+    if table == 'weekly':
+        return [
+            (combo_key, target_week, week, config['start_date'] + datetime.timedelta(weeks=week - 1), value)
+            for week, value in enumerate(sales.sum(axis=0).tolist(), start=1)
+        ]
+    return list(zip(
+        repeat(combo_key), range(1, len(stores) + 1), stores, store_types, first_week,
+        *sales.T.tolist(), sales.sum(axis=1).tolist(),
+    ))
+
+
+def _prediction_rows(arrays, positions, frame, active_configs, target_week, table, schema):
+    groups = arrays.combo_rows(positions)
+    store_ids = frame['门店编号'].to_numpy()
+    store_types = frame[schema.store_type_column].to_numpy() if schema.store_type_column else np.full(len(frame), None)
+    empty = np.array([], dtype=np.int64)
+    for combo_key, config in active_configs.items():
+        rows = groups.get((config['ip_name'], config['product_code'], config['channel'], config['market']), empty)
+        first_rows, sales = parallel.top_store_sales(arrays, rows, config, target_week)
+        yield _combo_rows(
+            combo_key, config, target_week, table, store_ids[first_rows], store_types[first_rows],
+            arrays.arrays['first_week'][first_rows].tolist(), sales,
+        )
+
+
+def _check_table(table):
+    if table not in PREDICTION_TABLES:
+        raise ValueError(f"未知的导出表: {table}")
+
+
+# table: totals（每个组合一行）/ weekly（每个组合每周一行）/ stores（每个组合选中的每个门店一行）
+# arrays 为快照的 parallel.PredictorArrays（由数据后端按数据版本提供，见 query_backend.py），
+# positions 为筛选后的行在数组中的行号，frame 与数组行顺序相同，只用来按行号取门店编号和门店类型
+def prediction_chunks(arrays, positions, frame, active_configs, target_week, table, schema=None, chunk_rows=CHUNK_ROWS):
+    _check_table(table)
+    schema = schema or PredictorSchema(frame.columns)
+    rows = _prediction_rows(arrays, positions, frame, active_configs, target_week, table, schema)
+    return _batches(rows, prediction_columns(table, target_week), chunk_rows)
+
+
+# 数据后端已在查询中选好前N门店时使用（SQLite 后端）：top_stores 为 {组合: (门店编号, 门店类型, 首周销量, 销量矩阵)}，
+# 每个组合一项，门店按排名排列，销量矩阵为门店 × 周
+def top_store_chunks(top_stores, active_configs, target_week, table, chunk_rows=CHUNK_ROWS):
+    _check_table(table)
+    rows = (
+        _combo_rows(combo_key, config, target_week, table, *top_stores[combo_key])
+        for combo_key, config in active_configs.items()
+    )
+    return _batches(rows, prediction_columns(table, target_week), chunk_rows)
+
+
+# ---------- 数据大屏 ----------
+
+# 要导出的序列：[(指标, 平台, 列名)]，按选中的平台取存在的列
+def dashboard_series(schema, social_platforms=SOCIAL_PLATFORMS, ecommerce_platforms=ECOMMERCE_PLATFORMS):
+    series = []
+    for metric, mapping, platforms in [
+        ('posts', schema.post_columns, social_platforms),
+        ('engagement', schema.engagement_columns, social_platforms),
+        ('sales', schema.sales_columns, ecommerce_platforms),
+    ]:
+        series.extend((metric, platform, mapping[platform]) for platform in platforms if platform in mapping)
+    if schema.fan_heat_column:
+        series.append(('fan_heat', '', schema.fan_heat_column))
+    if schema.secondhand_column:
+        series.append(('secondhand_sales', '', schema.secondhand_column))
+    return series
+
+
+# 筛选后的每日数据展开为长表：每个 日期 × IP × 序列 一行
+def dashboard_chunks(filtered_df, social_platforms=SOCIAL_PLATFORMS, ecommerce_platforms=ECOMMERCE_PLATFORMS,
+                     schema=None, chunk_rows=CHUNK_ROWS):
+    schema = schema or DashboardSchema(filtered_df.columns)
+    series = dashboard_series(schema, social_platforms, ecommerce_platforms)
+    if not series or filtered_df.empty:
+        yield pd.DataFrame(columns=DASHBOARD_COLUMNS)
+        return
+    metrics = np.array([metric for metric, _, _ in series], dtype=object)
+    platforms = np.array([platform for _, platform, _ in series], dtype=object)
+    columns = [column for _, _, column in series]
+    block_rows = max(1, chunk_rows // len(series))
+    for start in range(0, len(filtered_df), block_rows):
+        block = filtered_df.iloc[start:start + block_rows]
+        yield pd.DataFrame({
+            'date': np.repeat(block['日期'].to_numpy(), len(series)),
+            'ip_name': np.repeat(block['IP名称'].to_numpy(), len(series)),
+            'status': np.repeat(block['数据状态'].to_numpy(), len(series)),
+            'metric': np.tile(metrics, len(block)),
+            'platform': np.tile(platforms, len(block)),
+            'value': block[columns].to_numpy(dtype=float).ravel(),
+        })
+
+
+# ---------- 写入 ----------
+
+# target 为文件路径或已打开的二进制文件对象（不关闭调用方传入的文件）
+@contextmanager
+def _binary(target):
+    if isinstance(target, (str, bytes)) or hasattr(target, '__fspath__'):
+        with open(target, 'wb') as f:
+            yield f
+    else:
+        yield target
+
+
+def _write_csv(chunks, target):
+    rows = 0
+    with _binary(target) as raw:
+        text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        for index, chunk in enumerate(chunks):
+            chunk.to_csv(text, header=index == 0, index=False)
+            rows += len(chunk)
+        text.flush()
+        text.detach()
+    return rows
+
+
+def _parquet_frame(chunk):
+    chunk = chunk.copy()
+    for column in DATE_COLUMNS:
+        if column in chunk.columns:
+            chunk[column] = pd.to_datetime(chunk[column])
+    return chunk
+
+
+# 表结构取第一块；第一块中全为空的列按字符串列写入
+def _write_parquet(chunks, target):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            chunk = _parquet_frame(chunk)
+            if writer is None:
+                fields = pa.Table.from_pandas(chunk, preserve_index=False).schema
+                writer = pq.ParquetWriter(target, pa.schema(
+                    [field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in fields],
+                    metadata=fields.metadata,
+                ))
+            writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+# openpyxl 只写模式逐行写入，不在内存中保留整个工作簿
+def _write_xlsx(chunks, target):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = rows = 0
+    for chunk in chunks:
+        if sheet is None:
+            sheet = workbook.create_sheet()
+            sheet.append(list(chunk.columns))
+            sheet_rows = 1
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            if sheet_rows >= XLSX_MAX_ROWS:
+                sheet = workbook.create_sheet()
+                sheet.append(list(chunk.columns))
+                sheet_rows = 1
+            sheet.append(row)
+            sheet_rows += 1
+        rows += len(chunk)
+    workbook.save(target)
+    return rows
+
+
+WRITERS = {'csv': _write_csv, 'parquet': _write_parquet, 'xlsx': _write_xlsx}
+
+
+# 逐块写入，返回写入的行数
+def write_chunks(chunks, target, fmt):
+    if fmt not in WRITERS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    return WRITERS[fmt](chunks, target)
+
+
+# 写入临时文件并回到文件开头，关闭后自动删除
+def export_file(chunks, fmt):
+    f = tempfile.TemporaryFile(suffix=f'.{fmt}')
+    try:
+        write_chunks(chunks, f, fmt)
+    except Exception:
+        f.close()
+        raise
+    f.seek(0)
+    return f
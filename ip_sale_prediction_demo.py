@@ -1,8 +1,9 @@
+import os
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import datetime
+import perf
+
+# pandas、plotly 以及依赖它们的 analytics / charts / data_loader 在页面首次用到时才导入，
+# 冷启动时页面框架和侧边栏导航无需等待这些模块加载
 
 # 设置页面配置
 st.set_page_config(
@@ -121,6 +122,540 @@ def create_navigation():
     if 'current_page' not in st.session_state:
         st.session_state.current_page = "dashboard"
 
+# 数据后端 - 由环境变量 IP_APP_BACKEND 选择（pandas / sqlite），所有会话共享
+@st.cache_resource
+def get_backend():
+    import query_backend
+    return query_backend.create_backend()
+
+# 数据加载器 - 所有会话共享，数据文件更新时在后台刷新，期间继续使用旧快照
+@st.cache_resource
+def get_data_loader(sheet_name):
+    return get_backend().loader(sheet_name)
+
+# 格式化快照时效
+def format_age(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}秒前"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}分钟前"
+    return f"{seconds / 3600:.1f}小时前"
+
+# 场景存档（本地SQLite）
+@st.cache_resource
+def get_scenario_store():
+    import scenario_store
+    return scenario_store.ScenarioStore(os.environ.get(scenario_store.DB_PATH_ENV, scenario_store.DEFAULT_DB_PATH))
+
+# 侧边栏显示数据版本
+def show_data_version(loader, snapshot):
+    status = "（后台刷新中…）" if loader.refreshing else ""
+    st.sidebar.markdown("---")
+    st.sidebar.caption(
+        f"数据版本 v{snapshot.generation} · {snapshot.version[:8]} · 加载于{format_age(snapshot.age)}{status}"
+    )
+    if loader.last_error is not None:
+        st.sidebar.caption(f"⚠️ 最近一次刷新失败，继续使用当前版本: {loader.last_error}")
+
+# 可选值很多时先搜索再选择：多选框只列出已选中的值和搜索结果，不把全部可选值发送到浏览器；
+# 搜索索引按数据版本建立一次，所有会话共用（见 search_index.py）。可选值不多时仍是普通多选框
+def searchable_multiselect(label, options, default, key, version, **kwargs):
+    import search_index
+
+    # 默认值只在第一次写入会话状态（打开已保存的场景时也直接写入该key），控件本身不再传入 default
+    st.session_state.setdefault(key, list(default))
+    if len(options) <= search_index.PLAIN_LIMIT:
+        return st.sidebar.multiselect(label, options=options, key=key, **kwargs)
+    query = st.sidebar.text_input(
+        f"搜索{label}",
+        placeholder=f"🔍 搜索（共 {len(options):,} 项）",
+        key=f"{key}_search",
+        label_visibility="collapsed"
+    )
+    matches = search_index.get_index(version, key, options).search(query)
+    selected = list(st.session_state[key])
+    return st.sidebar.multiselect(
+        label, options=list(dict.fromkeys(selected + matches)), key=key, **kwargs
+    )
+
+# 图表按输入缓存：inputs 为决定图表内容的上游标识（数据版本、筛选条件、场景指纹、显示选项等），不含图表数据本身，
+# 比较时不需要序列化或哈希大数组；输入不变的重新运行（切换其他控件、翻页等）直接复用上次的图表，
+# 不再构建，序列化结果也已缓存在图表对象中（见 charts.PayloadFigure）；每个图表只保留最新一份
+def cached_figure(name, inputs, build):
+    cache = st.session_state.setdefault('figure_cache', {})
+    cached = cache.get(name)
+    if cached is None or cached[0] != inputs:
+        cached = cache[name] = (inputs, build())
+    return cached[1]
+
+# 滚动统计：按所选IP的完整历史计算（日期范围只做截取），同一数据版本和IP选择只计算一次；
+# 数据文件更新后如果只是在末尾追加了新日期，只计算新增的行
+def get_rolling_stats(backend, snapshot, selected_ips):
+    import rolling
+
+    stats_key = (snapshot.version, snapshot.generation, tuple(selected_ips))
+    cached = st.session_state.get('rolling_stats')
+    if cached is not None and cached[0] == stats_key:
+        return cached[1]
+    history = backend.filter_dashboard(snapshot, {
+        'selected_ips': selected_ips,
+        'start_date': snapshot.indexes['min_date'],
+        'end_date': snapshot.indexes['max_date'],
+    })
+    if cached is not None and cached[0][2] == stats_key[2]:
+        stats = cached[1].update(history)
+    else:
+        stats = rolling.RollingStats.build(history, rolling.metric_columns(snapshot.schema))
+    st.session_state.rolling_stats = (stats_key, stats)
+    return stats
+
+# 领先 / 滞后分析：使用所有IP的完整实际数据，同一数据版本和最大滞后天数只计算一次
+def get_lead_lag(backend, snapshot, max_lag):
+    import leadlag
+
+    lead_lag_key = (snapshot.version, snapshot.generation, max_lag)
+    cached = st.session_state.get('lead_lag')
+    if cached is not None and cached[0] == lead_lag_key:
+        return cached[1]
+    history = backend.filter_dashboard(snapshot, {
+        'selected_ips': snapshot.indexes['ip_options'],
+        'start_date': snapshot.indexes['min_date'],
+        'end_date': snapshot.indexes['max_date'],
+    })
+    result = leadlag.compute_lead_lag(history, snapshot.schema, max_lag)
+    st.session_state.lead_lag = (lead_lag_key, result)
+    return result
+
+# 领先 / 滞后分析：所有IP平均的 指标对 × 滞后 热力图，以及所选IP在某个指标对上的热力图和最佳滞后
+def show_lead_lag(backend, snapshot, selected_ips):
+    import charts
+    import leadlag
+
+    max_lag = st.slider("最大滞后天数", min_value=7, max_value=90, value=leadlag.DEFAULT_MAX_LAG, step=7, key="lead_lag_max")
+    with perf.stage('lead_lag') as stage:
+        result = get_lead_lag(backend, snapshot, max_lag)
+        stage.count(ips=len(result.ips), pairs=len(result.pair_labels()))
+    if not result.ips:
+        st.info("没有实际数据，无法计算领先 / 滞后")
+        return
+
+    st.caption(
+        f"每个IP的社媒指标与 k 天后电商销量的相关系数（{len(result.ips)}个IP的实际数据，"
+        f"k > 0 表示社媒领先销量），下图为所有IP的平均值"
+    )
+    labels, lags, matrix = result.pair_matrix()
+    st.plotly_chart(charts.build_lead_lag_figure(labels, lags, matrix), use_container_width=True)
+    st.dataframe(
+        result.pair_summary(),
+        hide_index=True,
+        use_container_width=True,
+        column_config={'社媒领先占比': st.column_config.NumberColumn(format='percent')}
+    )
+
+    if not selected_ips:
+        return
+    pair = st.selectbox("指标对", range(len(labels)), format_func=lambda index: labels[index], key="lead_lag_pair")
+    social_index, sales_index = divmod(pair, len(result.sales_labels))
+    ips, lags, matrix = result.ip_matrix(selected_ips, social_index, sales_index)
+    if ips:
+        st.plotly_chart(charts.build_lead_lag_figure(ips, lags, matrix), use_container_width=True)
+    best = result.best_lags()
+    st.dataframe(best[best['IP'].isin(selected_ips)], hide_index=True, use_container_width=True)
+
+# 组合视图：日期范围内所有IP的每周合计，同一数据版本、日期范围和平台选择只计算一次
+def get_portfolio(backend, snapshot, start_date, end_date, social_platforms, ecommerce_platforms):
+    import portfolio
+
+    portfolio_key = (snapshot.version, snapshot.generation, start_date, end_date, tuple(social_platforms), tuple(ecommerce_platforms))
+    cached = st.session_state.get('portfolio')
+    if cached is not None and cached[0] == portfolio_key:
+        return cached[1]
+    history = backend.filter_dashboard(snapshot, {
+        'selected_ips': snapshot.indexes['ip_options'],
+        'start_date': start_date,
+        'end_date': end_date,
+    })
+    overview = portfolio.PortfolioOverview.build(history, snapshot.schema, social_platforms, ecommerce_platforms, start_date, end_date)
+    st.session_state.portfolio = (portfolio_key, overview)
+    return overview
+
+# 组合视图：所有IP按所选指标排名的汇总表（带每周迷你走势图），图表只画前N个IP
+def show_portfolio(backend, snapshot, start_date, end_date, social_platforms, ecommerce_platforms):
+    import charts
+    import portfolio
+
+    st.subheader("🗂️ 全部IP排名")
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        metric = st.selectbox("排名指标", list(portfolio.RANK_METRICS), key="portfolio_metric")
+    with col2:
+        top_n = st.number_input("图表显示前N个IP", min_value=1, max_value=50, value=10, step=1, key="portfolio_top_n")
+
+    with perf.stage('portfolio') as stage:
+        overview = get_portfolio(backend, snapshot, start_date, end_date, social_platforms, ecommerce_platforms)
+        stage.count(ips=len(overview), weeks=len(overview.week_ends))
+    if not len(overview):
+        st.warning("日期范围内没有实际数据，请调整时间范围")
+        return
+
+    series = portfolio.RANK_METRICS[metric][0]
+    label = portfolio.SERIES_LABELS[series]
+    st.caption(
+        f"{len(overview)}个IP在日期范围内的实际数据按周合计（截至{overview.week_ends[-1]}），"
+        f"增长率为最近{portfolio.GROWTH_WEEKS}周相对之前{portfolio.GROWTH_WEEKS}周的变化"
+    )
+    with perf.stage('portfolio_figure') as stage:
+        ips, week_ends, matrix = overview.top_series(metric, int(top_n))
+        fig = cached_figure('portfolio', (snapshot.version, snapshot.generation, start_date, end_date,
+                                          social_platforms, ecommerce_platforms, metric, int(top_n)),
+                            lambda: charts.build_portfolio_figure(ips, week_ends, matrix, label))
+        stage.count(traces=len(ips))
+    st.plotly_chart(fig, use_container_width=True)
+
+    with perf.stage('portfolio_table'):
+        table = overview.table(metric)
+    st.dataframe(
+        table,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            '互动量': st.column_config.NumberColumn(format='%.0f'),
+            '销量': st.column_config.NumberColumn(format='%.0f'),
+            '互动量增长率': st.column_config.NumberColumn(format='percent'),
+            '销量增长率': st.column_config.NumberColumn(format='percent'),
+            '互动量走势': st.column_config.LineChartColumn(f"互动量走势（最近{portfolio.SPARKLINE_WEEKS}周）"),
+            '销量走势': st.column_config.LineChartColumn(f"销量走势（最近{portfolio.SPARKLINE_WEEKS}周）"),
+        }
+    )
+
+# 新品销量模型：同一数据版本只训练一次并保存到磁盘（见 sales_model.py），会话中只读取一次
+def get_sales_model(backend, snapshot):
+    import sales_model
+
+    cached = st.session_state.get('sales_model')
+    if cached is not None and cached[0] == snapshot.version:
+        return cached[1]
+    model = sales_model.ensure(snapshot.version, lambda: backend.training_frame(snapshot), snapshot.schema)
+    st.session_state.sales_model = (snapshot.version, model)
+    return model
+
+# 新品模拟：底表中没有的商品用销量模型预测，所有候选 门店 × 新品 一次计算，
+# 每个新品在每个市场取预测首周销量最高的前N个门店汇总
+def show_new_products(backend, snapshot, target_week):
+    import datetime
+    import pandas as pd
+    import charts
+
+    with perf.stage('sales_model'):
+        model = get_sales_model(backend, snapshot)
+    features = model.features
+    type_column = next((column for column in features['store_categorical'] if column != '市场'), None)
+    st.caption(
+        f"模型用 {model.rows:,} 行底表数据训练（数据版本 {model.version[:8]}），"
+        f"训练集第1周 log 销量 R² {model.r2[0]:.2f}；每行一个新品，可添加多行对比"
+    )
+
+    column_config = {'新品': st.column_config.TextColumn('新品', required=True)}
+    column_config.update({
+        column: st.column_config.SelectboxColumn(column, options=model.categories[column], required=True)
+        for column in features['product_categorical']
+    })
+    column_config.update({
+        column: st.column_config.NumberColumn(column, min_value=0, required=True) for column in features['product_numeric']
+    })
+    products = st.data_editor(
+        pd.DataFrame([dict(新品='新品1', **model.default_product())]),
+        num_rows='dynamic',
+        column_config=column_config,
+        hide_index=True,
+        use_container_width=True,
+        key="new_product_editor"
+    ).dropna(subset=['新品'])
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        markets = st.multiselect("市场", model.categories['市场'], default=model.categories['市场'], key="new_product_markets")
+    with col2:
+        store_types = st.multiselect(
+            "门店类型", model.categories[type_column], default=model.categories[type_column], key="new_product_store_types"
+        ) if type_column else []
+    with col3:
+        store_count = st.number_input("每个市场门店数", min_value=1, max_value=max(1, len(model.stores)), value=min(10, max(1, len(model.stores))), key="new_product_store_count")
+    with col4:
+        launch_date = st.date_input("上市日期", value=datetime.date.today(), key="new_product_launch_date")
+
+    stores = model.stores[model.stores['市场'].isin(markets)]
+    if type_column:
+        stores = stores[stores[type_column].isin(store_types)]
+    if products.empty or stores.empty:
+        st.info("请至少添加一个新品并选择市场和门店类型")
+        return
+
+    with perf.stage('sales_model_predict') as stage:
+        market_list, counts, sales = model.top_store_curves(stores, products, store_count, target_week)
+        stage.count(pairs=len(stores) * len(products))
+    dates = [launch_date + datetime.timedelta(weeks=week) for week in range(target_week)]
+    trend_data, rows = [], []
+    for product_index, name in enumerate(products['新品']):
+        for market_index, market in enumerate(market_list):
+            curve = sales[product_index, market_index]
+            trend_data.append({'label': f"{name}|{market}", 'dates': dates, 'sales': curve.tolist()})
+            rows.append({'新品': name, '市场': market, '门店数': counts[market_index], f'第1-{target_week}周预测销量': curve.sum()})
+    st.plotly_chart(charts.build_trend_figure(trend_data), use_container_width=True)
+    st.dataframe(
+        pd.DataFrame(rows), hide_index=True, use_container_width=True,
+        column_config={f'第1-{target_week}周预测销量': st.column_config.NumberColumn(format='%.0f')}
+    )
+
+# 销量下钻：同一场景（数据版本、筛选条件、配置、目标周数）的汇总树只计算一次，
+# 之后选择节点只查表
+def show_drilldown(backend, snapshot, filters, filtered_df, active_configs, target_week, start_week):
+    import charts
+    import drilldown
+
+    scenario_key = (
+        snapshot.version, snapshot.generation, repr(sorted(filters.items())), target_week, start_week,
+        tuple((key, int(config['store_count']), tuple(config['store_types'])) for key, config in active_configs.items()),
+    )
+    cached = st.session_state.get('drilldown_tree')
+    if cached is None or cached[0] != scenario_key:
+        with perf.stage('drilldown_build') as stage:
+            detail = backend.drilldown_detail(snapshot, filters, filtered_df, active_configs, target_week, start_week)
+            tree = drilldown.build_drilldown(detail)
+            stage.count(nodes=len(tree.totals))
+        st.session_state.drilldown_tree = (scenario_key, tree)
+    tree = st.session_state.drilldown_tree[1]
+
+    # 逐层选择节点，选择“全部”的层及其后续层不再展开
+    path = ()
+    columns = st.columns(len(tree.levels))
+    for column, level in zip(columns, tree.levels):
+        options = [name for name, _ in tree.children(path)]
+        if not options:
+            break
+        with column:
+            choice = st.selectbox(level, ['全部'] + options, key='drilldown_' + '/'.join(map(str, path)))
+        if choice == '全部':
+            break
+        path = path + (choice,)
+
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        with perf.stage('drilldown_figure'):
+            st.plotly_chart(charts.build_drilldown_figure(tree.subtree(path, depth=2)), use_container_width=True)
+    with col2:
+        total = tree.total(path)
+        child_level = tree.child_level(path)
+        st.markdown(f"**{' / '.join(map(str, path)) or '全部'}** · 预测销量 {total:,.0f}")
+        if child_level:
+            rows = [
+                {child_level: str(name), '预测销量': value, '占比': f"{value / total:.1%}" if total else "-"}
+                for name, value in tree.children(path)
+            ]
+            st.dataframe(rows, hide_index=True, use_container_width=True, height=300)
+
+# 置信区间：同一场景的重抽样结果只计算一次，之后只按图表显示组合数重新折叠
+def get_sales_bands(snapshot, filters, filtered_df, active_configs, target_week, start_week):
+    import bootstrap
+
+    scenario_key = (
+        snapshot.version, snapshot.generation, repr(sorted(filters.items())), target_week, start_week,
+        tuple((key, int(config['store_count']), tuple(config['store_types'])) for key, config in active_configs.items()),
+    )
+    cached = st.session_state.get('sales_bands')
+    if cached is not None and cached[0] == scenario_key:
+        return cached[1]
+    bands = bootstrap.bootstrap_bands(filtered_df, active_configs, target_week, snapshot.schema, start_week=start_week)
+    st.session_state.sales_bands = (scenario_key, bands)
+    return bands
+
+# 门店明细：每个组合的排名表计算一次并缓存，翻页只把当前页发送到浏览器
+STORE_PAGE_SIZES = [20, 50, 100, 500]
+
+def show_store_detail(snapshot, filtered_df, active_configs, target_week, start_week):
+    import analytics
+
+    combo_keys = {
+        f"{config['ip_name']}-{config['product_code']} · {config['channel']} · {config['market']}": key
+        for key, config in active_configs.items()
+    }
+    combo_key = combo_keys[st.selectbox("组合", list(combo_keys), key="store_detail_combo")]
+    config = active_configs[combo_key]
+    detail_key = (
+        snapshot.version, snapshot.generation, combo_key, int(config['store_count']),
+        tuple(config['store_types']), target_week, start_week,
+    )
+    cached = st.session_state.get('store_detail')
+    if cached is None or cached[0] != detail_key:
+        with perf.stage('store_detail') as stage:
+            detail = analytics.store_detail(filtered_df, config, target_week, snapshot.schema, start_week)
+            stage.count(stores=len(detail))
+        st.session_state.store_detail = (detail_key, detail)
+    detail = st.session_state.store_detail[1]
+
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("每页门店数", STORE_PAGE_SIZES, key="store_detail_page_size")
+    pages = max(1, -(-len(detail) // page_size))
+    with col2:
+        # 总页数变化时重置页码
+        page = st.number_input("页码", min_value=1, max_value=pages, value=1, step=1, key=f"store_detail_page_{pages}")
+    with col3:
+        st.caption(f"共 {len(detail):,} 家门店 · 第 {page} / {pages} 页")
+    start = (page - 1) * page_size
+    st.dataframe(
+        detail.iloc[start:start + page_size],
+        hide_index=True,
+        use_container_width=True,
+        column_config={'累计占比': st.column_config.NumberColumn(format='percent')}
+    )
+
+# 场景对比：保存多套配置（门店数、门店类型、目标周数），一起计算并显示相对基准场景的差值
+def show_scenario_comparison(snapshot, filters, filtered_df, active_configs, target_week, chart_top_k):
+    import copy
+
+    import analytics
+    import charts
+    import scenarios
+
+    saved = st.session_state.setdefault('scenarios', {})
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        # 不设置 key：保存后默认名称变化，输入框随之重置
+        name = st.text_input("场景名称", value=f"场景{len(saved) + 1}").strip()
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)
+        full = len(saved) >= scenarios.MAX_SCENARIOS and name not in saved
+        if st.button("保存当前配置", key="scenario_save", disabled=not name or full):
+            saved[name] = {'target_week': target_week, 'configs': copy.deepcopy(active_configs)}
+            st.session_state.scenario_revision = st.session_state.get('scenario_revision', 0) + 1
+    with col3:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("清空场景", key="scenario_clear", disabled=not saved):
+            saved.clear()
+            st.session_state.scenario_revision = st.session_state.get('scenario_revision', 0) + 1
+    if full:
+        st.caption(f"最多保存 {scenarios.MAX_SCENARIOS} 个场景")
+
+    if len(saved) < 2:
+        st.info("保存至少两个场景（例如调整门店数、门店类型或目标周数后分别保存）即可对比")
+        return
+    # 同样不设置 key：新保存的场景默认加入对比
+    selected = st.multiselect("对比场景", list(saved), default=list(saved))
+    if len(selected) < 2:
+        st.info("请至少选择两个场景")
+        return
+    baseline = st.selectbox("基准场景", selected, key="scenario_baseline")
+
+    # 所有场景一起计算，共用筛选结果、组合行索引和门店排名
+    comparison_key = (
+        snapshot.version, snapshot.generation, repr(sorted(filters.items())),
+        st.session_state.get('scenario_revision', 0), tuple(selected),
+    )
+    cached = st.session_state.get('scenario_comparison')
+    if cached is None or cached[0] != comparison_key:
+        with perf.stage('scenario_compare') as stage:
+            comparison = scenarios.compare_scenarios(
+                filtered_df, [(name, saved[name]['target_week'], saved[name]['configs']) for name in selected],
+                snapshot.schema
+            )
+            stage.count(scenarios=len(selected), combos=len(comparison.labels))
+        st.session_state.scenario_comparison = (comparison_key, comparison)
+    comparison = st.session_state.scenario_comparison[1]
+
+    # 图表只显示差异最大的前K个组合
+    shown = comparison.subset(analytics.top_k_positions(comparison.max_abs_delta(baseline), chart_top_k))
+    st.plotly_chart(charts.build_scenario_delta_figure(shown, baseline), use_container_width=True)
+    others = [name for name in selected if name != baseline]
+    week_scenario = st.selectbox("每周差值", others, key="scenario_week_view") if len(others) > 1 else others[0]
+    st.plotly_chart(charts.build_scenario_week_figure(shown, week_scenario, baseline), use_container_width=True)
+
+    summary = comparison.summary(baseline)
+    st.dataframe(
+        summary,
+        hide_index=True,
+        use_container_width=True,
+        column_config={column: st.column_config.NumberColumn(format='percent') for column in summary.columns if column.endswith('差值%')}
+    )
+
+# 导出：点击下载时才在后台逐块生成文件（按块写入临时文件，不在内存中拼出完整结果表），
+# 按钮本身不触发页面重新运行；Streamlit 提供下载时会把生成的文件整个读入内存，下载期间内存峰值仍为完整文件大小
+def show_export_button(make_chunks, file_stem, key):
+    import export
+
+    formats = export.available_formats()
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        fmt = st.radio("格式", formats, horizontal=True, key=f"{key}_format")
+    with col2:
+        st.download_button(
+            "⬇️ 下载",
+            data=lambda: export.export_file(make_chunks(), fmt),
+            file_name=f"{file_stem}.{fmt}",
+            mime=export.FORMATS[fmt],
+            on_click="ignore",
+            key=key
+        )
+
+
+# 预测模拟器筛选项 -> (控件key, 可选值索引)
+PREDICTOR_FILTER_WIDGETS = {
+    'markets': ('market_select', '市场'),
+    'channels': ('channel_select', '销售渠道'),
+    'ip_categories': ('ip_category_select', 'IP类别'),
+    'materials': ('material_select', '商品材质'),
+    'purposes': ('purpose_select', '商品用途'),
+}
+
+# 打开已保存的场景（按钮回调，在下一次运行创建控件之前写入控件状态和表格配置）
+def open_saved_scenario(store, name, indexes, horizon):
+    settings = store.load(name)
+    if settings is None:
+        return
+    st.session_state.target_week_select = min(max(settings['target_week'], 1), horizon)
+    st.session_state.start_week_select = min(max(settings.get('start_week', 1), 1), st.session_state.target_week_select)
+    for filter_key, (widget_key, index_key) in PREDICTOR_FILTER_WIDGETS.items():
+        options = indexes.get(index_key, [])
+        st.session_state[widget_key] = [value for value in settings['filters'].get(filter_key, []) if value in options]
+    st.session_state.store_counts = dict(settings['store_counts'])
+    st.session_state.store_types = {key: list(value) for key, value in settings['store_types'].items()}
+    st.session_state.deleted_combinations = set(settings['deleted_combinations'])
+    # 丢弃表格中未保存的编辑，按场景配置重新显示
+    st.session_state.pop('config_editor', None)
+
+# 保存当前配置（连同计算结果）或打开 / 删除已保存的场景
+def show_saved_scenarios(store, snapshot, filters, target_week, start_week, result_fingerprint, results):
+    import scenario_store
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        name = st.text_input("场景名称", key="saved_scenario_name").strip()
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("保存", key="saved_scenario_save", disabled=not name):
+            settings = scenario_store.make_settings(
+                target_week, filters, st.session_state.store_counts, st.session_state.store_types,
+                st.session_state.deleted_combinations, start_week
+            )
+            store.save(name, settings, snapshot.version, result_fingerprint, *results)
+            st.success(f"已保存场景: {name}")
+
+    saved = store.saved()
+    if not saved:
+        st.caption("暂无已保存的场景")
+        return
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        selected = st.selectbox("已保存的场景", [name for name, _ in saved], key="saved_scenario_selected")
+    with col2:
+        st.markdown("<br>", unsafe_allow_html=True)
+        st.button("打开", key="saved_scenario_open", on_click=open_saved_scenario, args=(store, selected, snapshot.indexes, max(snapshot.schema.horizon, 1)))
+    with col3:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("删除", key="saved_scenario_delete"):
+            store.delete(selected)
+            st.rerun()
+
 # 创建指标卡片
 def create_metric_card(title, value, subtitle=""):
     st.markdown(f"""
@@ -134,18 +669,20 @@ def create_metric_card(title, value, subtitle=""):
 # 第一页：社媒/电商数据大屏 - 保持完全不变
 def dashboard_page():
     try:
-        # 读取数据
-        @st.cache_data
-        def load_data():
-            df = pd.read_excel('demo_data.xlsx', sheet_name='社媒_电商原始数据表')
-            df['日期'] = pd.to_datetime(df['日期'])
-            return df
-        
-        df = load_data()
-        
         # 左侧标题 - 减小上方间距
         st.markdown("<h2 style='text-align: left; margin-bottom: 0.5rem; padding-top: 0.2rem;'>📊 IP社媒/电商数据大屏</h2>", unsafe_allow_html=True)
         
+        with perf.stage('import'):
+            import analytics
+            import data_loader
+        
+        # 读取数据（只读取本页使用的工作表）
+        backend = get_backend()
+        loader = get_data_loader(data_loader.DASHBOARD_SHEET)
+        with perf.stage('load') as stage:
+            snapshot = loader.get()
+            stage.count(rows=snapshot.rows)
+        
         # 侧边栏
         st.sidebar.markdown("**指标筛选**")
         col1, col2 = st.sidebar.columns(2)
@@ -176,18 +713,19 @@ def dashboard_page():
         secondhand = st.sidebar.checkbox("二手市场", value=False, key="secondhand")
         
         st.sidebar.markdown("**IP选择**")
-        unique_ips = df['IP名称'].unique()
-        selected_ips = st.sidebar.multiselect(
+        unique_ips = snapshot.indexes['ip_options']
+        selected_ips = searchable_multiselect(
             "选择IP名称",
-            options=unique_ips,
-            default=list(unique_ips)[:2] if len(unique_ips) > 0 else [],
-            key="ip_selector",
+            unique_ips,
+            list(unique_ips)[:2] if len(unique_ips) > 0 else [],
+            "ip_selector",
+            snapshot.version,
             label_visibility="collapsed"
         )
         
         st.sidebar.markdown("**时间范围**")
-        min_date = df['日期'].min().date()
-        max_date = df['日期'].max().date()
+        min_date = snapshot.indexes['min_date']
+        max_date = snapshot.indexes['max_date']
         start_date = st.sidebar.date_input("起始日期", value=min_date, min_value=min_date, max_value=max_date, label_visibility="collapsed")
         end_date = st.sidebar.date_input("结束日期", value=max_date, min_value=min_date, max_value=max_date, label_visibility="collapsed")
         
@@ -195,12 +733,36 @@ def dashboard_page():
             st.sidebar.error("错误：起始日期不能晚于结束日期")
             start_date, end_date = end_date, start_date
         
+        st.sidebar.markdown("**趋势平滑**")
+        col1, col2 = st.sidebar.columns(2)
+        with col1:
+            show_ma7 = st.checkbox("7日均线", value=False, key="ma7")
+            show_ma28 = st.checkbox("28日均线", value=False, key="ma28")
+        with col2:
+            show_anomaly = st.checkbox("异常点", value=False, key="anomaly", help="与前28天相比 |z| ≥ 3 的实际数据")
+        
+        st.sidebar.markdown("**组合视图**")
+        portfolio_mode = st.sidebar.checkbox(
+            "全部IP排名", value=False, key="portfolio_mode",
+            help="按所选指标对所有IP排名，汇总表列出全部IP，图表只画前N个（不受IP选择影响）"
+        )
+        
+        show_data_version(loader, snapshot)
+        
+        social_platforms = [platform for platform, enabled in zip(
+            analytics.SOCIAL_PLATFORMS, [tiktok_social, ins, facebook, twitter, news]) if enabled]
+        ecommerce_platforms = [platform for platform, enabled in zip(
+            analytics.ECOMMERCE_PLATFORMS, [amazon, tiktok_sale]) if enabled]
+        
+        if portfolio_mode:
+            show_portfolio(backend, snapshot, start_date, end_date, social_platforms, ecommerce_platforms)
+            return
+        
         # 数据过滤
-        filtered_df = df[
-            (df['IP名称'].isin(selected_ips)) & 
-            (df['日期'] >= pd.to_datetime(start_date)) & 
-            (df['日期'] <= pd.to_datetime(end_date))
-        ].sort_values('日期')
+        with perf.stage('filter') as stage:
+            filters = {'selected_ips': selected_ips, 'start_date': start_date, 'end_date': end_date}
+            filtered_df = backend.filter_dashboard(snapshot, filters)
+            stage.count(rows=len(filtered_df))
         
         if filtered_df.empty:
             st.warning("没有找到符合条件的数据，请调整筛选条件")
@@ -211,91 +773,32 @@ def dashboard_page():
         st.subheader("📈 关键指标仪表盘")
         
         # 创建指标列
-        col1, col2, col3, col4, col5 = st.columns(5)
-        
-        # 1. 日均发帖数
-        with col1:
-            social_platforms = []
-            if tiktok_social: social_platforms.append('tiktok_social')
-            if ins: social_platforms.append('ins')
-            if facebook: social_platforms.append('facebook')
-            if twitter: social_platforms.append('twitter')
-            if news: social_platforms.append('news')
-            
-            if social_platforms:
-                post_columns = []
-                for platform in social_platforms:
-                    col_name = f'社媒热度_发帖数_{platform}'
-                    if col_name in filtered_df.columns:
-                        post_columns.append(col_name)
-                
-                if post_columns:
-                    daily_posts = filtered_df[filtered_df['数据状态'] == '实际'][post_columns].sum(axis=1).mean()
-                    create_metric_card("📤 日均发帖数", f"{daily_posts:,.0f}", f"共{len(post_columns)}个平台")
-                else:
-                    create_metric_card("📤 日均发帖数", "0", "列不存在")
-            else:
-                create_metric_card("📤 日均发帖数", "0", "未选择平台")
-        
-        # 2. 日均互动量
-        with col2:
-            if social_platforms:
-                engagement_columns = []
-                for platform in social_platforms:
-                    col_name = f'社媒热度_互动量_{platform}'
-                    if col_name in filtered_df.columns:
-                        engagement_columns.append(col_name)
-                
-                if engagement_columns:
-                    daily_engagement = filtered_df[filtered_df['数据状态'] == '实际'][engagement_columns].sum(axis=1).mean()
-                    create_metric_card("💬 日均互动量", f"{daily_engagement:,.0f}", f"共{len(engagement_columns)}个平台")
-                else:
-                    create_metric_card("💬 日均互动量", "0", "列不存在")
-            else:
-                create_metric_card("💬 日均互动量", "0", "未选择平台")
-        
-        # 3. 日均同人热度
-        with col3:
-            if '社媒热度_同人热度' in filtered_df.columns:
-                daily_fan_heat = filtered_df[filtered_df['数据状态'] == '实际']['社媒热度_同人热度'].mean()
-                create_metric_card("🔥 日均同人热度", f"{daily_fan_heat:.1f}", "热度指数")
-            else:
-                create_metric_card("🔥 日均同人热度", "0", "数据不可用")
-        
-        # 4. 日均电商销量
-        with col4:
-            ecommerce_platforms = []
-            if amazon: ecommerce_platforms.append('amazon')
-            if tiktok_sale: ecommerce_platforms.append('tiktok_sale')
-            
-            if ecommerce_platforms:
-                sales_columns = []
-                for platform in ecommerce_platforms:
-                    col_name = f'电商热度_销量_{platform}'
-                    if col_name in filtered_df.columns:
-                        sales_columns.append(col_name)
-                
-                if sales_columns:
-                    daily_sales = filtered_df[filtered_df['数据状态'] == '实际'][sales_columns].sum(axis=1).mean()
-                    create_metric_card("🛒 日均电商销量", f"{daily_sales:,.0f}", f"共{len(sales_columns)}个平台")
-                else:
-                    create_metric_card("🛒 日均电商销量", "0", "列不存在")
-            else:
-                create_metric_card("🛒 日均电商销量", "0", "未选择平台")
-        
-        # 5. 日均二手销量
-        with col5:
-            if '电商热度_二手销量' in filtered_df.columns:
-                daily_secondhand = filtered_df[filtered_df['数据状态'] == '实际']['电商热度_二手销量'].mean()
-                create_metric_card("🔄 日均二手销量", f"{daily_secondhand:,.0f}", "二手市场")
-            else:
-                create_metric_card("🔄 日均二手销量", "0", "数据不可用")
+        with perf.stage('kpis'):
+            kpi_cards = backend.dashboard_kpis(snapshot, filters, filtered_df, social_platforms, ecommerce_platforms)
+        for col, (title, value, subtitle) in zip(st.columns(5), kpi_cards):
+            with col:
+                create_metric_card(title, value, subtitle)
         
         st.markdown('</div>', unsafe_allow_html=True)
         
         # 趋势图表 - 使用Streamlit container实现浅灰色背景
         st.markdown('<div class="compact-section">', unsafe_allow_html=True)
         st.subheader("📊 趋势分析")
+        with perf.stage('import_charts'):
+            import charts
+
+        # 移动平均 / 异常点：图表改用带滚动统计列的数据（行与 filtered_df 相同）
+        overlays = tuple(name for name, enabled in [('ma7', show_ma7), ('ma28', show_ma28), ('anomaly', show_anomaly)] if enabled)
+        chart_df = filtered_df
+        rolling_stats = None
+        if overlays and selected_ips:
+            with perf.stage('rolling') as stage:
+                rolling_stats = get_rolling_stats(backend, snapshot, selected_ips)
+                chart_df = rolling_stats.between(start_date, end_date)
+                stage.count(rows=len(rolling_stats.table))
+
+        # 两张趋势图共同的输入（图表数据由数据版本和筛选条件决定）
+        figure_inputs = (snapshot.version, snapshot.generation, selected_ips, start_date, end_date, overlays)
 
         # 使用Streamlit容器包装整个趋势分析区域，添加浅灰色背景
         with st.container():
@@ -324,170 +827,13 @@ def dashboard_page():
                 st.markdown('<p class="chart-title">📱 社媒热度趋势</p>', unsafe_allow_html=True)
                 
                 if social_platforms and selected_ips:
-                    fig_social = make_subplots(specs=[[{"secondary_y": True}]])
-                    
-                    # 现代配色方案
-                    colors = ['#4361ee', '#3a0ca3', '#4cc9f0', '#f72585', '#7209b7', '#4895ef', '#560bad', '#b5179e']
-                    color_idx = 0
-                    
-                    # 互动量数据（主纵轴）
-                    if show_engagement:
-                        for platform in social_platforms:
-                            engagement_col = f'社媒热度_互动量_{platform}'
-                            if engagement_col in filtered_df.columns:
-                                for ip in selected_ips:
-                                    color = colors[color_idx % len(colors)]
-                                    color_idx += 1
-                                    ip_data = filtered_df[filtered_df['IP名称'] == ip]
-                                    # 实际数据
-                                    actual_data = ip_data[ip_data['数据状态'] == '实际']
-                                    if not actual_data.empty:
-                                        # 获取最后一天的数据点用于标签
-                                        last_date = actual_data['日期'].iloc[-1]
-                                        last_value = actual_data[engagement_col].iloc[-1]
-                                        
-                                        fig_social.add_trace(
-                                            go.Scatter(
-                                                x=actual_data['日期'],
-                                                y=actual_data[engagement_col],
-                                                name=f"{ip} {platform}互动量",
-                                                line=dict(width=3, shape='spline', color=color),
-                                                mode='lines'
-                                            ),
-                                            secondary_y=False
-                                        )
-                                        # 在最后点添加标签
-                                        fig_social.add_annotation(
-                                            x=last_date,
-                                            y=last_value,
-                                            text=f"{ip} {platform}互动量",
-                                            showarrow=False,
-                                            xshift=40,
-                                            yshift=0,
-                                            bgcolor="white",
-                                            bordercolor=color,
-                                            borderwidth=1,
-                                            borderpad=2,
-                                            font=dict(size=10, color=color)
-                                        )
-                                    # 预测数据
-                                    forecast_data = ip_data[ip_data['数据状态'] == '预测']
-                                    if not forecast_data.empty:
-                                        fig_social.add_trace(
-                                            go.Scatter(
-                                                x=forecast_data['日期'],
-                                                y=forecast_data[engagement_col],
-                                                name=f"{ip} {platform}互动量(预测)",
-                                                line=dict(width=2, dash='dash', shape='spline', color=color),
-                                                mode='lines',
-                                                showlegend=False
-                                            ),
-                                            secondary_y=False
-                                        )
-                    
-                    # 发帖数数据（副纵轴）
-                    if show_posts:
-                        for platform in social_platforms:
-                            posts_col = f'社媒热度_发帖数_{platform}'
-                            if posts_col in filtered_df.columns:
-                                for ip in selected_ips:
-                                    color = colors[color_idx % len(colors)]
-                                    color_idx += 1
-                                    ip_data = filtered_df[filtered_df['IP名称'] == ip]
-                                    # 实际数据
-                                    actual_data = ip_data[ip_data['数据状态'] == '实际']
-                                    if not actual_data.empty:
-                                        # 获取最后一天的数据点用于标签
-                                        last_date = actual_data['日期'].iloc[-1]
-                                        last_value = actual_data[posts_col].iloc[-1]
-                                        
-                                        fig_social.add_trace(
-                                            go.Scatter(
-                                                x=actual_data['日期'],
-                                                y=actual_data[posts_col],
-                                                name=f"{ip} {platform}发帖数",
-                                                line=dict(width=2, dash='dot', shape='spline', color=color),
-                                                mode='lines'
-                                            ),
-                                            secondary_y=True
-                                        )
-                                        # 在最后点添加标签
-                                        fig_social.add_annotation(
-                                            x=last_date,
-                                            y=last_value,
-                                            text=f"{ip} {platform}发帖数",
-                                            showarrow=False,
-                                            xshift=40,
-                                            yshift=0,
-                                            bgcolor="white",
-                                            bordercolor=color,
-                                            borderwidth=1,
-                                            borderpad=2,
-                                            font=dict(size=10, color=color)
-                                        )
-                                    # 预测数据
-                                    forecast_data = ip_data[ip_data['数据状态'] == '预测']
-                                    if not forecast_data.empty:
-                                        fig_social.add_trace(
-                                            go.Scatter(
-                                                x=forecast_data['日期'],
-                                                y=forecast_data[posts_col],
-                                                name=f"{ip} {platform}发帖数(预测)",
-                                                line=dict(width=1.5, dash='dot', shape='spline', color=color),
-                                                mode='lines',
-                                                showlegend=False
-                                            ),
-                                            secondary_y=True
-                                        )
-                    
-                    # 优化布局 - 深灰色坐标轴，紧凑间距
-                    fig_social.update_layout(
-                        height=450,
-                        plot_bgcolor='white',
-                        paper_bgcolor='white',
-                        font=dict(size=11),
-                        margin=dict(t=30, l=50, r=30, b=50),
-                        showlegend=False,
-                    )
-                    # 深灰色坐标轴
-                    fig_social.update_yaxes(
-                        title_text="互动量", 
-                        secondary_y=False, 
-                        showgrid=True,
-                        gridwidth=0.5,
-                        gridcolor='rgba(128,128,128,0.1)',
-                        zeroline=True,
-                        zerolinewidth=1,
-                        zerolinecolor='rgba(80,80,80,0.5)',
-                        linecolor='rgba(80,80,80,0.8)',
-                        linewidth=1
-                    )
-                    if show_posts:
-                        fig_social.update_yaxes(
-                            title_text="发帖数", 
-                            secondary_y=True, 
-                            showgrid=False,
-                            zeroline=True,
-                            zerolinewidth=1,
-                            zerolinecolor='rgba(80,80,80,0.5)',
-                            linecolor='rgba(80,80,80,0.8)',
-                            linewidth=1
-                        )
-                    # 深灰色X轴，中文日期格式
-                    fig_social.update_xaxes(
-                        showgrid=True,
-                        gridwidth=0.5,
-                        gridcolor='rgba(128,128,128,0.1)',
-                        zeroline=True,
-                        zerolinewidth=1,
-                        zerolinecolor='rgba(80,80,80,0.5)',
-                        linecolor='rgba(80,80,80,0.8)',
-                        linewidth=1,
-                        tickformat='%Y-%m',
-                        dtick="M1"
-                    )
-                    
-                    st.plotly_chart(fig_social, use_container_width=True)
+                    with perf.stage('social_figure') as stage:
+                        fig_social = cached_figure('social', figure_inputs + (social_platforms, show_engagement, show_posts), lambda: charts.build_social_figure(
+                            chart_df, selected_ips, social_platforms, show_engagement, show_posts, snapshot.schema, overlays
+                        ))
+                        stage.count(traces=len(fig_social.data))
+                    with perf.stage('social_render'):
+                        st.plotly_chart(fig_social, use_container_width=True)
                 else:
                     st.info("请选择至少一个社媒平台和IP来显示图表")
             
@@ -500,172 +846,45 @@ def dashboard_page():
                 st.markdown('<p class="chart-title">🛍️ 电商热度趋势</p>', unsafe_allow_html=True)
                 
                 if ecommerce_platforms and selected_ips:
-                    fig_ecommerce = make_subplots(specs=[[{"secondary_y": True}]])
-                    
-                    # 现代配色方案
-                    colors = ['#ff6b6b', '#ff9e00', '#06d6a0', '#118ab2', '#ef476f', '#ffd166', '#073b4c', '#7209b7']
-                    color_idx = 0
-                    
-                    # 电商销量数据（主纵轴）
-                    if show_sales:
-                        for platform in ecommerce_platforms:
-                            sales_col = f'电商热度_销量_{platform}'
-                            if sales_col in filtered_df.columns:
-                                for ip in selected_ips:
-                                    color = colors[color_idx % len(colors)]
-                                    color_idx += 1
-                                    ip_data = filtered_df[filtered_df['IP名称'] == ip]
-                                    # 实际数据
-                                    actual_data = ip_data[ip_data['数据状态'] == '实际']
-                                    if not actual_data.empty:
-                                        # 获取最后一天的数据点用于标签
-                                        last_date = actual_data['日期'].iloc[-1]
-                                        last_value = actual_data[sales_col].iloc[-1]
-                                        
-                                        fig_ecommerce.add_trace(
-                                            go.Scatter(
-                                                x=actual_data['日期'],
-                                                y=actual_data[sales_col],
-                                                name=f"{ip} {platform}销量",
-                                                line=dict(width=3, shape='spline', color=color),
-                                                mode='lines'
-                                            ),
-                                            secondary_y=False
-                                        )
-                                        # 在最后点添加标签
-                                        fig_ecommerce.add_annotation(
-                                            x=last_date,
-                                            y=last_value,
-                                            text=f"{ip} {platform}销量",
-                                            showarrow=False,
-                                            xshift=40,
-                                            yshift=0,
-                                            bgcolor="white",
-                                            bordercolor=color,
-                                            borderwidth=1,
-                                            borderpad=2,
-                                            font=dict(size=10, color=color)
-                                        )
-                                    # 预测数据
-                                    forecast_data = ip_data[ip_data['数据状态'] == '预测']
-                                    if not forecast_data.empty:
-                                        fig_ecommerce.add_trace(
-                                            go.Scatter(
-                                                x=forecast_data['日期'],
-                                                y=forecast_data[sales_col],
-                                                name=f"{ip} {platform}销量(预测)",
-                                                line=dict(width=2, dash='dash', shape='spline', color=color),
-                                                mode='lines',
-                                                showlegend=False
-                                            ),
-                                            secondary_y=False
-                                        )
-                    
-                    # 二手销量数据（副纵轴）
-                    if show_secondhand and '电商热度_二手销量' in filtered_df.columns:
-                        for ip in selected_ips:
-                            color = colors[color_idx % len(colors)]
-                            color_idx += 1
-                            ip_data = filtered_df[filtered_df['IP名称'] == ip]
-                            # 实际数据
-                            actual_data = ip_data[ip_data['数据状态'] == '实际']
-                            if not actual_data.empty:
-                                # 获取最后一天的数据点用于标签
-                                last_date = actual_data['日期'].iloc[-1]
-                                last_value = actual_data['电商热度_二手销量'].iloc[-1]
-                                
-                                fig_ecommerce.add_trace(
-                                    go.Scatter(
-                                        x=actual_data['日期'],
-                                        y=actual_data['电商热度_二手销量'],
-                                        name=f"{ip} 二手销量",
-                                        line=dict(width=2, dash='dot', shape='spline', color=color),
-                                        mode='lines'
-                                    ),
-                                    secondary_y=True
-                                )
-                                # 在最后点添加标签
-                                fig_ecommerce.add_annotation(
-                                    x=last_date,
-                                    y=last_value,
-                                    text=f"{ip} 二手销量",
-                                    showarrow=False,
-                                    xshift=40,
-                                    yshift=0,
-                                    bgcolor="white",
-                                    bordercolor=color,
-                                    borderwidth=1,
-                                    borderpad=2,
-                                    font=dict(size=10, color=color)
-                                )
-                            # 预测数据
-                            forecast_data = ip_data[ip_data['数据状态'] == '预测']
-                            if not forecast_data.empty:
-                                fig_ecommerce.add_trace(
-                                    go.Scatter(
-                                        x=forecast_data['日期'],
-                                        y=forecast_data['电商热度_二手销量'],
-                                        name=f"{ip} 二手销量(预测)",
-                                        line=dict(width=1.5, dash='dot', shape='spline', color=color),
-                                        mode='lines',
-                                        showlegend=False
-                                    ),
-                                    secondary_y=True
-                                )
-                    
-                    # 优化布局 - 深灰色坐标轴，紧凑间距
-                    fig_ecommerce.update_layout(
-                        height=450,
-                        plot_bgcolor='white',
-                        paper_bgcolor='white',
-                        font=dict(size=11),
-                        margin=dict(t=30, l=50, r=30, b=50),
-                        showlegend=False,
-                    )
-
-                    if show_sales:
-                        fig_ecommerce.update_yaxes(
-                            title_text="销量", 
-                            secondary_y=False, 
-                            showgrid=True,
-                            gridwidth=0.5,
-                            gridcolor='rgba(128,128,128,0.1)',
-                            zeroline=True,
-                            zerolinewidth=1,
-                            zerolinecolor='rgba(80,80,80,0.5)',
-                            linecolor='rgba(80,80,80,0.8)',
-                            linewidth=1
-                        )
-                    if show_secondhand:
-                        fig_ecommerce.update_yaxes(
-                            title_text="二手销量", 
-                            secondary_y=True, 
-                            showgrid=False,
-                            zeroline=True,
-                            zerolinewidth=1,
-                            zerolinecolor='rgba(80,80,80,0.5)',
-                            linecolor='rgba(80,80,80,0.8)',
-                            linewidth=1
-                        )
-                    # 深灰色X轴，中文日期格式
-                    fig_ecommerce.update_xaxes(
-                        showgrid=True,
-                        gridwidth=0.5,
-                        gridcolor='rgba(128,128,128,0.1)',
-                        zeroline=True,
-                        zerolinewidth=1,
-                        zerolinecolor='rgba(80,80,80,0.5)',
-                        linecolor='rgba(80,80,80,0.8)',
-                        linewidth=1,
-                        tickformat='%Y-%m',
-                        dtick="M1"
-                    )
-                    
-                    st.plotly_chart(fig_ecommerce, use_container_width=True)
+                    with perf.stage('ecommerce_figure') as stage:
+                        fig_ecommerce = cached_figure('ecommerce', figure_inputs + (ecommerce_platforms, show_sales, show_secondhand), lambda: charts.build_ecommerce_figure(
+                            chart_df, selected_ips, ecommerce_platforms, show_sales, show_secondhand, snapshot.schema, overlays
+                        ))
+                        stage.count(traces=len(fig_ecommerce.data))
+                    with perf.stage('ecommerce_render'):
+                        st.plotly_chart(fig_ecommerce, use_container_width=True)
                 else:
                     st.info("请选择至少一个电商平台和IP来显示图表")
 
         st.markdown('</div>', unsafe_allow_html=True)
+
+        if rolling_stats is not None:
+            import rolling
+            with st.expander("📐 滚动统计"):
+                series = rolling.chart_series(
+                    snapshot.schema, social_platforms, ecommerce_platforms, show_engagement, show_posts, show_sales, show_secondhand
+                )
+                st.caption(f"日期范围内最后一个实际数据日的移动平均和环比（与前一个窗口相比），异常天数为 |z| ≥ {rolling.ANOMALY_Z:g} 的天数")
+                st.dataframe(
+                    rolling_stats.summary(series, start_date, end_date),
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        f'{window}日环比': st.column_config.NumberColumn(format='percent') for window in rolling.WINDOWS
+                    }
+                )
+
+        if st.checkbox("🔗 社媒 → 电商 领先 / 滞后分析", key="lead_lag_enabled"):
+            show_lead_lag(backend, snapshot, selected_ips)
+
+        with st.expander("📤 导出筛选数据"):
+            import export
+            st.caption("按 日期 × IP × 平台 每个指标一行导出当前筛选范围内的每日数据")
+            show_export_button(
+                lambda: export.dashboard_chunks(filtered_df, social_platforms, ecommerce_platforms, snapshot.schema),
+                f"dashboard_{start_date}_{end_date}",
+                key="export_dashboard"
+            )
         
     except FileNotFoundError:
         st.error("找不到数据文件")
@@ -675,92 +894,126 @@ def dashboard_page():
 # 第二页：IP商品销量预测模拟器 - 最终修正版
 def predictor_page():
     try:
-        # 读取数据
-        @st.cache_data
-        def load_data():
-            df = pd.read_excel('demo_data.xlsx', sheet_name='预测结果底表')
-            if '销售起始日期' in df.columns:
-                df['销售起始日期'] = pd.to_datetime(df['销售起始日期']).dt.date
-            return df
+        st.markdown("<h2 style='text-align: left; margin-bottom: 1rem; margin-top: -1rem;'>🎯 IP商品销量预测模拟器</h2>", unsafe_allow_html=True)
         
-        df = load_data()
+        with perf.stage('import'):
+            import pandas as pd
+            import analytics
+            import data_loader
+            import scenario_store
         
-        st.markdown("<h2 style='text-align: left; margin-bottom: 1rem; margin-top: -1rem;'>🎯 IP商品销量预测模拟器</h2>", unsafe_allow_html=True)
+        # 读取数据（只读取本页使用的工作表）
+        backend = get_backend()
+        loader = get_data_loader(data_loader.PREDICTOR_SHEET)
+        with perf.stage('load') as stage:
+            snapshot = loader.get()
+            stage.count(rows=snapshot.rows)
         
         # 目标选择
         st.sidebar.markdown("**⭐ 目标选择**")
 
-        # 目标周数选择
+        # 以下控件的默认值只在第一次写入会话状态（打开已保存的场景时也直接写入这些key），控件本身不再传入 index / default
+        # 目标周数选择：可选周数由数据中的 销量_上市第N周 列决定
+        horizon = max(snapshot.schema.horizon, 1)
+        st.session_state.target_week_select = min(st.session_state.get('target_week_select', 8), horizon)  # 默认选择第8周
         target_week = st.sidebar.selectbox(
             "**目标周数**",
-            options=[1, 2, 3, 4, 5, 6, 7, 8],
-            index=7,  # 默认选择第8周
-            help="选择预测的目标周数"
+            options=list(range(1, horizon + 1)),
+            help="选择预测的目标周数",
+            key="target_week_select"
+        )
+
+        # 起始周：只分析第N周到目标周（如第5~12周），默认从第1周开始
+        if st.session_state.get('start_week_select', 1) > target_week:
+            st.session_state.start_week_select = 1
+        st.session_state.setdefault('start_week_select', 1)
+        start_week = st.sidebar.selectbox(
+            "**起始周**",
+            options=list(range(1, target_week + 1)),
+            help="图表、置信区间、下钻和门店明细只统计起始周到目标周的销量",
+            key="start_week_select"
+        )
+
+        # 图表单独显示的组合数，其余合并为"其他"
+        chart_top_k = st.sidebar.number_input(
+            "**图表显示组合数**",
+            min_value=1,
+            max_value=200,
+            value=analytics.CHART_TOP_K,
+            step=1,
+            help="环形图和趋势图只单独显示总销量最高的组合，其余合并为“其他”"
+        )
+
+        # 置信区间（勾选后才计算）
+        show_bands = st.sidebar.checkbox(
+            "显示置信区间",
+            value=False,
+            help="对每个组合选中的门店做1000次有放回重抽样，显示销量的95%区间",
+            key="show_bands"
         )
 
         # 市场筛选 - 改为下拉多选
+        st.session_state.setdefault('market_select', list(snapshot.indexes['市场']))  # 默认全选
         markets = st.sidebar.multiselect(
             "**市场**",
-            options=df['市场'].unique(),
-            default=df['市场'].unique(),  # 默认全选
-            help="选择目标市场"
+            options=snapshot.indexes['市场'],
+            help="选择目标市场",
+            key="market_select"
         )
 
         # 销售渠道筛选 - 改为下拉多选
+        st.session_state.setdefault('channel_select', list(snapshot.indexes['销售渠道']))  # 默认全选
         channels = st.sidebar.multiselect(
             "**销售渠道**",
-            options=df['销售渠道'].unique(),
-            default=df['销售渠道'].unique(),  # 默认全选
-            help="选择销售渠道"
+            options=snapshot.indexes['销售渠道'],
+            help="选择销售渠道",
+            key="channel_select"
         )
 
         # 商品选择
         st.sidebar.markdown("**🛍️ 商品选择**")
         # IP类别筛选
-        ip_categories = st.sidebar.multiselect(
+        ip_categories = searchable_multiselect(
             "IP类别",
-            options=df['IP类别'].unique(),
-            default=["IP类别_古风独家IP"],  # 默认选择古风独家IP
-            key="ip_category_select"
+            snapshot.indexes['IP类别'],
+            ["IP类别_古风独家IP"],  # 默认选择古风独家IP
+            "ip_category_select",
+            snapshot.version
         )
         
         # 商品材质筛选
-        materials = st.sidebar.multiselect(
+        materials = searchable_multiselect(
             "商品材质",
-            options=df['商品材质'].unique(),
-            default=["木质"],  # 默认选择木质
-            key="material_select"
+            snapshot.indexes['商品材质'],
+            ["木质"],  # 默认选择木质
+            "material_select",
+            snapshot.version
         )
         
         # 商品用途筛选
-        purposes = st.sidebar.multiselect(
+        purposes = searchable_multiselect(
             "商品用途",
-            options=df['商品用途'].unique(),
-            default=["箱包配饰"],  # 默认选择箱包配饰
-            key="purpose_select"
+            snapshot.indexes['商品用途'],
+            ["箱包配饰"],  # 默认选择箱包配饰
+            "purpose_select",
+            snapshot.version
         )
         
-        # 数据过滤
-        filtered_df = df.copy()
+        show_data_version(loader, snapshot)
         
-        if markets:
-            filtered_df = filtered_df[filtered_df['市场'].isin(markets)]
-        if channels:
-            filtered_df = filtered_df[filtered_df['销售渠道'].isin(channels)]
-        if ip_categories:
-            filtered_df = filtered_df[filtered_df['IP类别'].isin(ip_categories)]
-        if materials:
-            filtered_df = filtered_df[filtered_df['商品材质'].isin(materials)]
-        if purposes:
-            filtered_df = filtered_df[filtered_df['商品用途'].isin(purposes)]
+        # 数据过滤
+        with perf.stage('filter') as stage:
+            filters = {
+                'markets': markets, 'channels': channels, 'ip_categories': ip_categories,
+                'materials': materials, 'purposes': purposes,
+            }
+            filtered_df = backend.filter_predictor(snapshot, filters)
+            stage.count(rows=len(filtered_df))
         
         if filtered_df.empty:
             st.warning("没有找到符合条件的数据，请调整筛选条件")
             return
         
-        # 获取唯一组合
-        unique_combinations = filtered_df[['IP名称', '商品编号', '销售渠道', '市场']].drop_duplicates()
-        
         # 初始化session state
         if 'deleted_combinations' not in st.session_state:
             st.session_state.deleted_combinations = set()
@@ -772,93 +1025,15 @@ def predictor_page():
             st.session_state.store_types = {}
         
         # 构建active_configs和表格数据
-        active_configs = {}
-        table_data = []
-        
-        # 收集所有可用的门店类型和最大门店数
-        all_available_types = set()
-        max_possible_stores = 0
-        
-        for idx, combo in unique_combinations.iterrows():
-            combo_key = f"{combo['IP名称']}|{combo['商品编号']}|{combo['销售渠道']}|{combo['市场']}"
-            
-            if combo_key in st.session_state.deleted_combinations:
-                continue
-                
-            # 获取该组合的数据
-            combo_data = filtered_df[
-                (filtered_df['IP名称'] == combo['IP名称']) &
-                (filtered_df['商品编号'] == combo['商品编号']) &
-                (filtered_df['销售渠道'] == combo['销售渠道']) &
-                (filtered_df['市场'] == combo['市场'])
-            ]
-            
-            # 获取销售起始日期
-            start_date = combo_data['销售起始日期'].min() if '销售起始日期' in combo_data.columns else datetime.date.today()
-            
-            # 获取最大门店数和可用门店类型
-            max_stores = len(combo_data['门店编号'].unique()) if '门店编号' in combo_data.columns else 0
-            
-            # 获取可用门店类型
-            available_types = []
-            if '门店信息_门店商圈类型' in combo_data.columns:
-                available_types = combo_data['门店信息_门店商圈类型'].dropna().unique().tolist()
-            elif '门店商圈类型' in combo_data.columns:
-                available_types = combo_data['门店商圈类型'].dropna().unique().tolist()
-            
-            # 更新全局选项
-            all_available_types.update(available_types)
-            max_possible_stores = max(max_possible_stores, max_stores)
-            
-            # 初始化配置
-            if combo_key not in st.session_state.store_counts:
-                st.session_state.store_counts[combo_key] = max_stores
-            
-            if combo_key not in st.session_state.store_types:
-                valid_default_types = [t for t in available_types if t in available_types]
-                st.session_state.store_types[combo_key] = valid_default_types
-            
-            # 商品信息
-            if not combo_data.empty:
-                sample = combo_data.iloc[0]
-                material = sample.get("商品材质", "N/A")
-                purpose = sample.get("商品用途", "N/A")
-                color = sample.get("商品颜色", "N/A")
-                size = sample.get("商品尺寸", "N/A")
-                price = str(sample.get("商品价格", "N/A"))
-            else:
-                material = purpose = color = size = price = "N/A"
-            
-            # 添加到表格数据
-            table_data.append({
-                'IP名称-商品编号': f"{combo['IP名称']}-{combo['商品编号']}",
-                '渠道': combo['销售渠道'],
-                '市场': combo['市场'],
-                '首次销售日期': str(start_date),
-                '覆盖门店种类': st.session_state.store_types[combo_key][0] if st.session_state.store_types[combo_key] else (available_types[0] if available_types else "N/A"),
-                '覆盖门店数': st.session_state.store_counts[combo_key],
-                '商品材质': material,
-                '商品用途': purpose,
-                '商品颜色': color,
-                '商品尺寸': size,
-                '商品价格': price,
-                '删除': False,
-                '确认': False,
-                'combo_key': combo_key,
-                'available_types': available_types,
-                'max_stores': max_stores
-            })
-            
-            # 添加到active_configs
-            active_configs[combo_key] = {
-                'ip_name': combo['IP名称'],
-                'product_code': combo['商品编号'],
-                'channel': combo['销售渠道'],
-                'market': combo['市场'],
-                'start_date': start_date,
-                'store_count': st.session_state.store_counts[combo_key],
-                'store_types': st.session_state.store_types[combo_key]
-            }
+        with perf.stage('config_table') as stage:
+            table_data, active_configs, all_available_types, max_possible_stores = analytics.build_config_table(
+                filtered_df,
+                st.session_state.deleted_combinations,
+                st.session_state.store_counts,
+                st.session_state.store_types,
+                snapshot.schema
+            )
+            stage.count(combos=len(table_data))
         
         st.markdown("### 📋 商品配置选择")
         
@@ -1017,14 +1192,15 @@ def predictor_page():
             """, unsafe_allow_html=True)
 
             # 显示可编辑表格
-            edited_df = st.data_editor(
-                display_df,
-                column_config=column_config,
-                use_container_width=True,
-                height=250,  # 固定高度250
-                hide_index=True,
-                key="config_editor"
-            )
+            with perf.stage('config_editor'):
+                edited_df = st.data_editor(
+                    display_df,
+                    column_config=column_config,
+                    use_container_width=True,
+                    height=250,  # 固定高度250
+                    hide_index=True,
+                    key="config_editor"
+                )
             
             # 更新session state中的配置
             for idx, row in edited_df.iterrows():
@@ -1051,211 +1227,151 @@ def predictor_page():
             with st.container():
                 st.markdown("### 📊 销量分析")
                 
-                # 销量计算函数
-                def calculate_sales_data(config):
-                    # 筛选数据
-                    market_channel_df = filtered_df[
-                        (filtered_df['IP名称'] == config['ip_name']) &
-                        (filtered_df['商品编号'] == config['product_code']) & 
-                        (filtered_df['销售渠道'] == config['channel']) & 
-                        (filtered_df['市场'] == config['market'])
-                    ]
-                    
-                    # 按门店类型筛选
-                    if config['store_types']:
-                        if '门店信息_门店商圈类型' in market_channel_df.columns:
-                            market_channel_df = market_channel_df[market_channel_df['门店信息_门店商圈类型'].isin(config['store_types'])]
-                        elif '门店商圈类型' in market_channel_df.columns:
-                            market_channel_df = market_channel_df[market_channel_df['门店商圈类型'].isin(config['store_types'])]
-                    
-                    if market_channel_df.empty:
-                        return 0, []
-                    
-                    # 按销量_上市首周排序选择前N个门店
-                    store_sales = []
-                    for store in market_channel_df['门店编号'].unique():
-                        store_data = market_channel_df[market_channel_df['门店编号'] == store]
-                        # 获取该门店的销量_上市首周
-                        if '销量_上市首周' in store_data.columns:
-                            first_week_sales = store_data['销量_上市首周'].iloc[0]
-                        else:
-                            # 如果没有首周列，使用第一周数据
-                            first_week_sales = store_data[f'销量_上市第1周'].iloc[0] if f'销量_上市第1周' in store_data.columns else 0
-                        
-                        store_sales.append({'门店编号': store, '首周销量': first_week_sales})
-                    
-                    # 按首周销量排序并选择前N个门店
-                    store_sales.sort(key=lambda x: x['首周销量'], reverse=True)
-                    top_store_ids = [store['门店编号'] for store in store_sales[:config['store_count']]]
-                    
-                    # 计算总销量（目标周数的总和）
-                    total_sales = 0
-                    for week in range(1, target_week + 1):
-                        sales_col = f'销量_上市第{week}周'
-                        if sales_col in market_channel_df.columns:
-                            week_sales = market_channel_df[
-                                market_channel_df['门店编号'].isin(top_store_ids)
-                            ][sales_col].sum()
-                            total_sales += week_sales
-                    
-                    return total_sales, top_store_ids
-                
                 # 准备环形图和趋势图数据
-                pie_data = []
-                trend_data = []
-                
-                for combo_key, config in active_configs.items():
-                    total_sales, top_store_ids = calculate_sales_data(config)
-                    label = f"{config['ip_name']}-{config['product_code']}"
-                    
-                    if total_sales > 0:  # 只添加有销量的数据
-                        pie_data.append({'label': label, 'value': total_sales})
-                        
-                        # 趋势数据计算
-                        market_channel_df = filtered_df[
-                            (filtered_df['IP名称'] == config['ip_name']) &
-                            (filtered_df['商品编号'] == config['product_code']) & 
-                            (filtered_df['销售渠道'] == config['channel']) & 
-                            (filtered_df['市场'] == config['market'])
-                        ]
-                        
-                        # 按门店类型筛选
-                        if config['store_types']:
-                            if '门店信息_门店商圈类型' in market_channel_df.columns:
-                                market_channel_df = market_channel_df[market_channel_df['门店信息_门店商圈类型'].isin(config['store_types'])]
-                            elif '门店商圈类型' in market_channel_df.columns:
-                                market_channel_df = market_channel_df[market_channel_df['门店商圈类型'].isin(config['store_types'])]
-                        
-                        if not market_channel_df.empty and top_store_ids:
-                            # 计算每周销量
-                            weekly_sales = []
-                            dates = []
-                            
-                            for week in range(1, target_week + 1):
-                                sales_col = f'销量_上市第{week}周'
-                                if sales_col in market_channel_df.columns:
-                                    week_sales = market_channel_df[
-                                        market_channel_df['门店编号'].isin(top_store_ids)
-                                    ][sales_col].sum()
-                                    weekly_sales.append(week_sales)
-                                else:
-                                    weekly_sales.append(0)
-                                
-                                # 计算日期（从首次销售日期开始）
-                                week_date = config['start_date'] + datetime.timedelta(weeks=week-1)
-                                dates.append(week_date)
-                            
-                            trend_data.append({
-                                'label': label,
-                                'dates': dates,
-                                'sales': weekly_sales
-                            })
+                # 同一数据版本下已保存过的配置直接读取场景存档中的结果
+                store = get_scenario_store()
+                result_fingerprint = scenario_store.fingerprint(target_week, filters, active_configs)
+                with perf.stage('sales_calc') as stage:
+                    cached_results = store.cached_results(snapshot.version, result_fingerprint)
+                    if cached_results is not None:
+                        pie_data, trend_data = cached_results
+                    else:
+                        pie_data, trend_data = backend.prediction_results(snapshot, filters, filtered_df, active_configs, target_week)
+                    stage.count(combos=len(active_configs), slices=len(pie_data), cached=int(cached_results is not None))
+                results = (pie_data, trend_data)
+                pie_data, trend_data = analytics.slice_weeks(pie_data, trend_data, start_week)
+                sliced = (pie_data, trend_data)
+                pie_data, trend_data = analytics.fold_top_k(pie_data, trend_data, chart_top_k)
+                pie_intervals = trend_bands = None
+                # 环形图和趋势图由场景结果、起始周、显示组合数和是否显示置信区间决定
+                chart_inputs = (snapshot.version, snapshot.generation, result_fingerprint, start_week, chart_top_k, show_bands)
+                if show_bands and pie_data:
+                    with perf.stage('bootstrap') as stage:
+                        bands = get_sales_bands(snapshot, filters, filtered_df, active_configs, target_week, start_week)
+                        pie_intervals = bands.pie_intervals([item['value'] for item in sliced[0]], chart_top_k)
+                        trend_bands = bands.trend_bands([sum(item['sales']) for item in sliced[1]], chart_top_k)
+                        stage.count(combos=bands.samples.shape[1], resamples=bands.samples.shape[0])
                 
                 # 显示图表
                 if pie_data:
+                    with perf.stage('import_charts'):
+                        import charts
                     col1, col2 = st.columns([1, 2])
                     
                     with col1:
                         # 销量占比分析容器
                         with st.container():
                             st.markdown("#### 🥧 销量占比分析")
-                            fig_pie = go.Figure(data=[go.Pie(
-                                labels=[item['label'] for item in pie_data],
-                                values=[item['value'] for item in pie_data],
-                                hole=0.4,
-                                textinfo='percent+label',
-                                marker=dict(colors=['#4361ee', '#3a0ca3', '#4cc9f0', '#f72585', '#7209b7']),
-                                showlegend=False
-                            )])
-                            fig_pie.update_layout(
-                                height=275,
-                                margin=dict(l=10, r=10, t=30, b=10)
-                            )
-                            st.plotly_chart(fig_pie, use_container_width=True)
+                            with perf.stage('pie_figure'):
+                                fig_pie = cached_figure('pie', chart_inputs, lambda: charts.build_pie_figure(pie_data, pie_intervals))
+                            with perf.stage('pie_render'):
+                                st.plotly_chart(fig_pie, use_container_width=True)
                     
                     with col2:
                         # 销量趋势分析容器
                         with st.container():
                             st.markdown("#### 📈 销量趋势分析")
                             if trend_data:
-                                fig_trend = go.Figure()
-                                
-                                colors = ['#4361ee', '#3a0ca3', '#4cc9f0', '#f72585', '#7209b7']
-                                
-                                for i, data in enumerate(trend_data):
-                                    if data['sales'] and any(sales > 0 for sales in data['sales']):
-                                        color = colors[i % len(colors)]
-                                        fig_trend.add_trace(go.Scatter(
-                                            x=data['dates'],
-                                            y=data['sales'],
-                                            mode='lines',
-                                            name=data['label'],
-                                            line=dict(width=3, color=color, shape='spline'),
-                                            showlegend=False
-                                        ))
-                                        
-                                        # 在最后一个数据点添加标签
-                                        if data['dates'] and data['sales']:
-                                            last_date = data['dates'][-1]
-                                            last_sales = data['sales'][-1]
-                                            
-                                            fig_trend.add_annotation(
-                                                x=last_date,
-                                                y=last_sales,
-                                                text=data['label'],
-                                                showarrow=True,
-                                                arrowhead=2,
-                                                arrowsize=1,
-                                                arrowwidth=2,
-                                                arrowcolor=color,
-                                                bgcolor="white",
-                                                bordercolor=color,
-                                                borderwidth=1,
-                                                borderpad=4,
-                                                font=dict(size=10, color=color),
-                                                yshift=20
-                                            )
-                                
-                                fig_trend.update_layout(
-                                    height=300,
-                                    margin=dict(l=10, r=10, t=30, b=10),
-                                    xaxis_title="日期",
-                                    yaxis_title="销量",
-                                    showlegend=False,
-                                    xaxis=dict(
-                                        tickformat='%Y-%m-%d',
-                                        tickangle=45,
-                                        linecolor='#666666',
-                                        gridcolor='rgba(128,128,128,0.2)',
-                                        zerolinecolor='rgba(128,128,128,0.5)'
-                                    ),
-                                    yaxis=dict(
-                                        linecolor='#666666',
-                                        gridcolor='rgba(128,128,128,0.2)',
-                                        zerolinecolor='rgba(128,128,128,0.5)'
-                                    )
-                                )
-                                st.plotly_chart(fig_trend, use_container_width=True)
+                                with perf.stage('trend_figure') as stage:
+                                    fig_trend = cached_figure('trend', chart_inputs, lambda: charts.build_trend_figure(trend_data, trend_bands))
+                                    stage.count(traces=len(fig_trend.data))
+                                with perf.stage('trend_render'):
+                                    st.plotly_chart(fig_trend, use_container_width=True)
                             else:
                                 st.info("无法生成趋势图，请检查数据")
+
+                    if cached_results is not None:
+                        st.caption("已从场景存档读取计算结果")
+                    with st.expander("💾 保存 / 打开场景"):
+                        show_saved_scenarios(store, snapshot, filters, target_week, start_week, result_fingerprint, results)
+
+                    with st.expander("📤 导出预测结果"):
+                        import copy
+                        import export
+                        table = st.radio(
+                            "内容", list(export.PREDICTION_TABLES), format_func=export.PREDICTION_TABLES.get,
+                            horizontal=True, key="export_table"
+                        )
+                        # 下载在本次运行结束后才执行，使用当前配置的副本
+                        export_configs = copy.deepcopy(active_configs)
+                        show_export_button(
+                            lambda: backend.prediction_chunks(snapshot, filters, filtered_df, export_configs, target_week, table),
+                            f"prediction_{table}_week{target_week}",
+                            key="export_prediction"
+                        )
+
+                    # 销量下钻（勾选后才计算）
+                    if st.checkbox("🔎 按 市场 → 渠道 → IP类别 → IP → 商品 → 门店类型 → 门店 下钻", key="drilldown_enabled"):
+                        show_drilldown(backend, snapshot, filters, filtered_df, active_configs, target_week, start_week)
+
+                    # 门店明细（勾选后才计算）
+                    if st.checkbox("🏪 查看选中门店明细", key="store_detail_enabled"):
+                        show_store_detail(snapshot, filtered_df, active_configs, target_week, start_week)
+
+                    # 场景对比
+                    if st.checkbox("🆚 场景对比", key="scenario_enabled"):
+                        show_scenario_comparison(snapshot, filters, filtered_df, active_configs, target_week, chart_top_k)
                 else:
                     st.warning("没有找到销量数据，请检查筛选条件和配置")
         
         else:
             st.info("请选择商品配置进行分析")
+
+        # 新品模拟（勾选后才加载模型）
+        if st.checkbox("🆕 新品模拟（底表中没有的商品）", key="new_product_enabled"):
+            show_new_products(backend, snapshot, target_week)
             
     except FileNotFoundError:
         st.error("找不到数据文件")
     except Exception as e:
         st.error(f"加载数据时出现错误: {str(e)}")
 
+# 本地指标端点 - 设置 IP_APP_METRICS_PORT 后每个进程启动一次
+@st.cache_resource
+def start_metrics_server():
+    port = os.environ.get(perf.METRICS_PORT_ENV)
+    return perf.serve_metrics(int(port)) if port else None
+
+# 性能调试面板（默认关闭，勾选后从下一次运行开始记录）
+def show_perf_panel():
+    with st.sidebar.expander("🛠️ 性能调试"):
+        st.checkbox("记录各阶段耗时", value=perf.ENV_ENABLED, key="perf_debug")
+        last_run = st.session_state.get('perf_last_run')
+        if not last_run:
+            st.caption("暂无记录")
+            return
+        import pandas as pd
+        st.caption(f"{last_run['page']} · 总耗时 {last_run['total_seconds'] * 1000:,.1f} ms")
+        stages_df = pd.DataFrame(last_run['stages'])
+        stages_df['seconds'] = (stages_df['seconds'] * 1000).round(1)
+        stages_df = stages_df.rename(columns={'stage': '阶段', 'seconds': '耗时(ms)'})
+        st.dataframe(stages_df, hide_index=True, use_container_width=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("JSON", perf.to_json(last_run), file_name="perf_metrics.json", mime="application/json")
+        with col2:
+            st.download_button("Prometheus", perf.to_prometheus(), file_name="perf_metrics.prom", mime="text/plain")
+        if st.button("导出到本地文件", key="perf_export"):
+            paths = [perf.export('perf_metrics.json', last_run), perf.export('perf_metrics.prom')]
+            st.caption("已写入 " + ", ".join(paths))
+
 # 主应用逻辑
 def main():
     create_navigation()
-    if st.session_state.current_page == "dashboard":
-        dashboard_page()
-    elif st.session_state.current_page == "predictor":
-        predictor_page()
+    start_metrics_server()
+    page = st.session_state.current_page
+    perf_enabled = perf.ENV_ENABLED or st.session_state.get('perf_debug', False)
+    if perf_enabled:
+        perf.start_run(page)
+    try:
+        if page == "dashboard":
+            dashboard_page()
+        elif page == "predictor":
+            predictor_page()
+    finally:
+        if perf_enabled:
+            st.session_state.perf_last_run = perf.finish_run()
+    show_perf_panel()
 
 if __name__ == "__main__":
 
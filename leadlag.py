@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+from schema import DashboardSchema
+
+# 社媒热度 → 电商销量 领先 / 滞后分析
+# 每个IP的实际数据按日期对齐为 IP × 天 × 指标 数组，各序列标准化后用批量FFT一次算出
+# 所有 IP × 社媒指标 × 销量指标 在滞后窗口内的互相关，不按指标对逐个循环；
+# 滞后 k > 0 表示社媒指标领先销量 k 天（第 t 天的社媒与第 t+k 天的销量相关）
+#   result = compute_lead_lag(dashboard_df, schema, max_lag=28)
+#   result.pair_matrix()   ->  (指标对名称, 滞后天数, 各IP平均相关系数矩阵)，供热力图使用
+#   result.best_lags()     ->  每个 IP × 指标对 相关系数最高的滞后天数
+
+DEFAULT_MAX_LAG = 28
+# 重叠天数少于该值的滞后不计算相关系数
+MIN_OVERLAP = 14
+# 标准差小于该比例 × |均值| 时视为常数序列
+STD_TOLERANCE = 1e-9
+# 每批FFT中间结果（复数）的大致上限
+BATCH_BYTES = 64 * 1024 * 1024
+
+
+# 社媒指标（各平台互动量 + 同人热度）和销量指标：[(显示名称, 列名)]
+def lead_lag_metrics(schema):
+    social = [(f'{platform}互动量', column) for platform, column in schema.engagement_columns.items()]
+    if schema.fan_heat_column:
+        social.append(('同人热度', schema.fan_heat_column))
+    sales = [(f'{platform}销量', column) for platform, column in schema.sales_columns.items()]
+    return social, sales
+
+
+# 实际数据对齐为 (IP数, 天数, 列数) 数组，缺失的日期为 NaN
+def align_daily(df, columns):
+    actual = df[df['数据状态'] == '实际']
+    ip_codes, ips = pd.factorize(actual['IP名称'])
+    dates = actual['日期'].to_numpy(dtype='datetime64[D]')
+    days = (dates - dates.min()).astype(np.int64) if len(dates) else np.array([], dtype=np.int64)
+    cube = np.full((len(ips), int(days.max()) + 1 if len(days) else 0, len(columns)), np.nan)
+    cube[ip_codes, days] = actual[columns].to_numpy(dtype=float)
+    return list(ips), cube
+
+
+# 每个序列按自身均值和标准差标准化；缺失值和常数序列记为0，并返回有效值掩码
+def standardize(cube):
+    valid = ~np.isnan(cube)
+    count = valid.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, cube, 0.0).sum(axis=1, keepdims=True) / count
+        deviation = np.where(valid, cube - mean, 0.0)
+        std = np.sqrt((deviation ** 2).sum(axis=1, keepdims=True) / count)
+        # 取值全部相同的序列由于舍入误差标准差不为0，按相对均值的阈值判断
+        constant = ~(std > STD_TOLERANCE * np.maximum(np.abs(mean), 1.0))
+        z = deviation / np.where(constant, 1.0, std)
+    valid &= ~constant
+    return np.where(valid, z, 0.0), valid.astype(float)
+
+
+def _fft_size(n):
+    size = 1
+    while size < n:
+        size *= 2
+    return size
+
+
+class LeadLagResult:
+    def __init__(self, ips, social_labels, sales_labels, lags, corr):
+        self.ips = ips
+        self.social_labels = social_labels
+        self.sales_labels = sales_labels
+        self.lags = lags
+        # (IP数, 社媒指标数, 销量指标数, 滞后数)
+        self.corr = corr
+
+    def pair_labels(self):
+        return [f'{social} → {sales}' for social in self.social_labels for sales in self.sales_labels]
+
+    # 各指标对在每个滞后上的平均相关系数（所有IP）：(指标对名称, 滞后天数, 矩阵)
+    def pair_matrix(self):
+        valid = ~np.isnan(self.corr)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            matrix = np.where(valid, self.corr, 0.0).sum(axis=0) / valid.sum(axis=0)
+        return self.pair_labels(), self.lags, matrix.reshape(-1, len(self.lags))
+
+    # 每个 IP × 指标对 相关系数最高的滞后天数和相关系数（没有有效滞后时为空）
+    def best_lags(self):
+        corr = self.corr.reshape(len(self.ips), -1, len(self.lags))
+        empty = np.all(np.isnan(corr), axis=2)
+        index = np.argmax(np.where(np.isnan(corr), -np.inf, corr), axis=2)
+        best = np.take_along_axis(corr, index[..., None], axis=2)[..., 0]
+        lag = np.where(empty, np.nan, self.lags[index])
+        return pd.DataFrame({
+            'IP': np.repeat(self.ips, corr.shape[1]),
+            '指标对': np.tile(self.pair_labels(), len(self.ips)),
+            '领先天数': lag.ravel(),
+            '相关系数': np.where(empty, np.nan, best).ravel(),
+        })
+
+    # 每个指标对一行：各IP最佳滞后的中位数、社媒领先（最佳滞后 > 0）的IP占比、平均峰值相关系数
+    def pair_summary(self):
+        best = self.best_lags().dropna(subset=['领先天数'])
+        grouped = best.groupby('指标对', sort=False)
+        summary = pd.DataFrame({
+            'IP数': grouped.size(),
+            '中位领先天数': grouped['领先天数'].median(),
+            '社媒领先占比': grouped['领先天数'].apply(lambda lags: (lags > 0).mean()),
+            '平均峰值相关': grouped['相关系数'].mean(),
+        })
+        return summary.reindex(self.pair_labels()).rename_axis('指标对').reset_index()
+
+    # 指定IP在某个指标对上各滞后的相关系数：(IP列表, 滞后天数, 矩阵)
+    def ip_matrix(self, ips, social_index, sales_index):
+        positions = {ip: index for index, ip in enumerate(self.ips)}
+        rows = [positions[ip] for ip in ips if ip in positions]
+        return [self.ips[row] for row in rows], self.lags, self.corr[rows, social_index, sales_index]
+
+
+# dashboard_df 为数据大屏的完整数据（可以包含预测行，只使用实际数据）
+def compute_lead_lag(dashboard_df, schema=None, max_lag=DEFAULT_MAX_LAG):
+    schema = schema or DashboardSchema(dashboard_df.columns)
+    social, sales = lead_lag_metrics(schema)
+    columns = [column for _, column in social] + [column for _, column in sales]
+    ips, cube = align_daily(dashboard_df, columns)
+    values, masks = standardize(cube)
+
+    social_count, sales_count = len(social), len(sales)
+    ip_count, days = cube.shape[0], cube.shape[1]
+    lags = np.arange(-max_lag, max_lag + 1)
+    corr = np.full((ip_count, social_count, sales_count, len(lags)), np.nan)
+    if not ip_count or not social_count or not sales_count:
+        return LeadLagResult(ips, [label for label, _ in social], [label for label, _ in sales], lags, corr)
+
+    # 补零到至少 天数 + 最大滞后，循环相关等价于线性相关
+    size = _fft_size(days + max_lag)
+    batch = max(1, BATCH_BYTES // (social_count * sales_count * (size // 2 + 1) * 16 * 2))
+    for start in range(0, ip_count, batch):
+        stop = min(start + batch, ip_count)
+        # 沿天数轴变换：(批, 指标, 频率)
+        x = np.fft.rfft(values[start:stop, :, :social_count], n=size, axis=1).transpose(0, 2, 1)
+        y = np.fft.rfft(values[start:stop, :, social_count:], n=size, axis=1).transpose(0, 2, 1)
+        mx = np.fft.rfft(masks[start:stop, :, :social_count], n=size, axis=1).transpose(0, 2, 1)
+        my = np.fft.rfft(masks[start:stop, :, social_count:], n=size, axis=1).transpose(0, 2, 1)
+        # c[k] = Σ_t x[t]·y[t+k]，overlap[k] 为两边都有数据的天数
+        cross = np.fft.irfft(np.conj(x)[:, :, None, :] * y[:, None, :, :], n=size, axis=3)[..., lags % size]
+        overlap = np.rint(np.fft.irfft(np.conj(mx)[:, :, None, :] * my[:, None, :, :], n=size, axis=3)[..., lags % size])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr[start:stop] = np.where(overlap >= MIN_OVERLAP, cross / overlap, np.nan)
+    return LeadLagResult(ips, [label for label, _ in social], [label for label, _ in sales], lags, np.clip(corr, -1, 1))
@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+
+import parallel
+
+# 预测表数值数组的磁盘缓存
+# 工作簿旁的 <文件名>.arrays/<数据版本>/ 目录下每个数组保存为一个 .npy 文件（组合编码、门店编码、门店类型编码、
+# 首周销量、每周销量矩阵），index.json 记录门店类型和组合的编码表。所有会话、命令行和工作进程都用
+# np.load(mmap_mode='r') 只读映射同一份文件，数据页由操作系统页缓存共享，内存不随使用方数量增加
+#   python matrix_store.py build demo_data.xlsx
+#   arrays = matrix_store.load(matrix_store.ensure(snapshot, 'demo_data.xlsx'))
+
+INDEX_FILE = 'index.json'
+
+
+# demo_data.xlsx -> demo_data.arrays
+def store_dir(source):
+    return f'{os.path.splitext(os.path.normpath(source))[0]}.arrays'
+
+
+def version_dir(source, version):
+    return os.path.join(store_dir(source), version)
+
+
+def _json_value(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+# 写入一个版本：先写临时目录再整体改名，其他进程不会读到写了一半的文件
+def write(predictor_arrays, directory, version):
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    tmp = f'{directory}.tmp-{uuid.uuid4().hex[:8]}'
+    os.makedirs(tmp)
+    try:
+        for name, array in predictor_arrays.arrays.items():
+            np.save(os.path.join(tmp, f'{name}.npy'), array)
+        index = {
+            'version': version,
+            'rows': len(predictor_arrays.arrays['weekly']),
+            'horizon': predictor_arrays.horizon,
+            'arrays': list(predictor_arrays.arrays),
+            'type_labels': [_json_value(label) for label in predictor_arrays.type_labels],
+            'combo_labels': [[_json_value(value) for value in label] for label in predictor_arrays.combo_labels],
+        }
+        with open(os.path.join(tmp, INDEX_FILE), 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        try:
+            os.rename(tmp, directory)
+        except OSError:
+            # 其他进程已经写好了同一版本
+            shutil.rmtree(tmp, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+# 只读映射 .npy 文件（空数组无法映射，直接读取）
+def map_arrays(directory, names):
+    arrays = {}
+    for name in names:
+        path = os.path.join(directory, f'{name}.npy')
+        try:
+            arrays[name] = np.load(path, mmap_mode='r')
+        except ValueError:
+            arrays[name] = np.load(path)
+    return arrays
+
+
+def load(directory):
+    with open(os.path.join(directory, INDEX_FILE), encoding='utf-8') as f:
+        index = json.load(f)
+    arrays = map_arrays(directory, index['arrays'])
+    return parallel.PredictorArrays(arrays, index['type_labels'], [tuple(label) for label in index['combo_labels']])
+
+
+# 删除其他版本；仍被映射的文件在 Windows 上删除会失败，留到下次清理
+def remove_stale(source, keep):
+    root = store_dir(source)
+    for entry in os.listdir(root):
+        if entry != keep and '.tmp-' not in entry:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+
+# 返回快照对应版本的目录，不存在时从快照数据生成
+def ensure(snapshot, source):
+    directory = version_dir(source, snapshot.version)
+    if not os.path.exists(os.path.join(directory, INDEX_FILE)):
+        write(parallel.PredictorArrays.from_frame(snapshot.df, snapshot.schema), directory, snapshot.version)
+        remove_stale(source, snapshot.version)
+    return directory
+
+
+# 与 parallel.SharedPredictorArrays 相同的接口，工作进程按目录重新映射
+class MappedPredictorArrays:
+    def __init__(self, directory):
+        self.local = load(directory)
+        self.handle = {'key': directory, 'kind': 'npy', 'directory': directory, 'arrays': list(self.local.arrays)}
+
+    # 映射的文件由操作系统回收，不需要显式释放
+    def close(self):
+        self.local = None
+
+
+def main():
+    import data_loader
+
+    parser = argparse.ArgumentParser(description='生成预测表数值数组的内存映射文件')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='从工作簿生成当前版本的 .npy 文件')
+    build_parser.add_argument('source', nargs='?', default=data_loader.DATA_FILE, help='xlsx 工作簿')
+    args = parser.parse_args()
+
+    snapshot = data_loader.SnapshotLoader(args.source, data_loader.PREDICTOR_SHEET).get()
+    directory = ensure(snapshot, args.source)
+    arrays = load(directory)
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    print(f"已生成 {directory}（{len(arrays.arrays['weekly']):,} 行，{arrays.horizon} 周，{size / 1024 / 1024:.1f} MB）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,348 @@
+import atexit
+import datetime
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 多进程并行计算大量商品配置的销量
+# 预测表中参与计算的数值列（门店编码、门店类型编码、首周销量、每周销量矩阵）按快照复制一次到共享内存，
+# 工作进程只读映射同一块内存，每个任务只传递组合对应的行号；排名和汇总规则与 analytics.calculate_sales_data 相同
+#   evaluator = ParallelEvaluator(workers=4)
+#   pie_data, trend_data = evaluator.build_prediction_results(snapshot, filtered_df, active_configs, target_week)
+
+WORKERS_ENV = 'IP_APP_WORKERS'
+# 组合数少于该值时并行的调度开销大于收益，直接在当前进程计算
+MIN_PARALLEL_COMBOS = 32
+
+
+# 每周销量矩阵（行 × 数据中的周数，第N周为第 N-1 列），周数由加载时的列名决定
+# 全部为整数列时保持整数，汇总结果与 Pandas 的 sum 类型一致；取值范围允许时用 int32 存储，52周的矩阵内存减半
+def weekly_matrix(df, schema):
+    present = [column for column in schema.weekly_columns if column]
+    integer = all(np.issubdtype(df[column].dtype, np.integer) for column in present)
+    dtype = np.float64
+    if integer:
+        limits = np.iinfo(np.int32)
+        fits = all(df[column].empty or limits.min <= df[column].min() and df[column].max() <= limits.max for column in present)
+        dtype = np.int32 if fits else np.int64
+    weekly = np.zeros((len(df), schema.horizon), dtype=dtype)
+    for week, column in enumerate(schema.weekly_columns):
+        if column:
+            weekly[:, week] = df[column].to_numpy()
+    return weekly
+
+
+# 预测表的数值数组（按快照中的行顺序）：组合编码、门店编码、门店类型编码、首周销量和每周销量矩阵
+class PredictorArrays:
+    def __init__(self, arrays, type_labels, combo_labels):
+        self.arrays = arrays
+        self.type_labels = type_labels
+        self.type_codes = {label: code for code, label in enumerate(type_labels)}
+        self.combo_labels = combo_labels
+        self.combo_codes = {tuple(label): code for code, label in enumerate(combo_labels)}
+
+    @property
+    def horizon(self):
+        return self.arrays['weekly'].shape[1]
+
+    @classmethod
+    def from_frame(cls, df, schema):
+        import pandas as pd
+
+        import analytics
+
+        # 组合编码与 groupby 的分组一致（任一列为空的行编码为 -1）
+        combo_codes = df.groupby(analytics.COMBO_COLUMNS, sort=False).ngroup().to_numpy()
+        codes, first_rows = np.unique(combo_codes, return_index=True)
+        combo_labels = list(df[analytics.COMBO_COLUMNS].iloc[first_rows[codes >= 0]].itertuples(index=False, name=None))
+        store_codes, _ = pd.factorize(df['门店编号'])
+        if schema.store_type_column:
+            type_codes, type_labels = pd.factorize(df[schema.store_type_column])
+            type_labels = list(type_labels)
+        else:
+            type_codes, type_labels = np.full(len(df), -1), []
+        if schema.first_week_column:
+            first_week = df[schema.first_week_column].to_numpy()
+        else:
+            first_week = np.zeros(len(df), dtype=np.int64)
+
+        weekly = weekly_matrix(df, schema)
+
+        arrays = {
+            'combo_codes': np.ascontiguousarray(combo_codes, dtype=np.int64),
+            'store_codes': np.ascontiguousarray(store_codes, dtype=np.int64),
+            'type_codes': np.ascontiguousarray(type_codes, dtype=np.int64),
+            'first_week': np.ascontiguousarray(first_week),
+            'weekly': weekly,
+        }
+        return cls(arrays, type_labels, combo_labels)
+
+    # 按组合分组行号（组内保持原有顺序）：{(IP名称, 商品编号, 销售渠道, 市场): 行号数组}
+    def combo_rows(self, positions):
+        codes = self.arrays['combo_codes'][positions]
+        order = np.argsort(codes, kind='stable')
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        groups = {}
+        for rows in np.split(positions[order], bounds):
+            if rows.size:
+                code = self.arrays['combo_codes'][rows[0]]
+                if code >= 0:
+                    groups[self.combo_labels[code]] = rows
+        return groups
+
+    # 门店类型名称 -> 编码；返回 None 表示不按门店类型筛选
+    def allowed_types(self, store_types):
+        if not store_types or not self.type_labels:
+            return None
+        return np.array([self.type_codes[label] for label in store_types if label in self.type_codes], dtype=np.int64)
+
+
+# 一个组合按首周销量排名的前N门店：返回 (符合门店类型的行号, 各行的门店编码, 前N门店各自第一行的行号（按排名）)
+def rank_top_stores(arrays, rows, allowed_types, store_count):
+    if allowed_types is not None:
+        rows = rows[np.isin(arrays['type_codes'][rows], allowed_types)]
+
+    # 门店按首次出现的顺序排列，首周销量取各门店的第一行
+    stores = arrays['store_codes'][rows]
+    _, first_index = np.unique(stores, return_index=True)
+    first_index.sort()
+    first_week = arrays['first_week'][rows[first_index]]
+    # 稳定排序：首周销量相同时先出现的门店排在前面
+    ranking = np.argsort(-first_week, kind='stable')
+    return rows, stores, rows[first_index[ranking[:store_count]]]
+
+
+# 一个组合的前N门店每周销量；没有符合条件的门店时返回 None
+def evaluate_combo(arrays, rows, allowed_types, store_count, weeks):
+    return top_weekly_sales(arrays, *rank_top_stores(arrays, rows, allowed_types, store_count), weeks)
+
+
+# rank_top_stores 选出的前N门店前 weeks 周的销量合计；没有门店时返回 None
+def top_weekly_sales(arrays, rows, stores, first_rows, weeks):
+    if first_rows.size == 0:
+        return None
+
+    top_rows = rows[np.isin(stores, arrays['store_codes'][first_rows])]
+    weekly = arrays['weekly'][top_rows, :weeks]
+    return np.nansum(weekly, axis=0) if weekly.dtype.kind == 'f' else weekly.sum(axis=0, dtype=np.int64)
+
+
+# 一个组合选中的前N门店（排名规则与 analytics.calculate_sales_data 相同，见 rank_top_stores）
+# 返回 (前N门店各自第一行的行号, 每周销量矩阵)，矩阵行为门店（按排名）、列为周，超出数据周数的部分为0
+def top_store_sales(arrays, rows, config, target_week):
+    rows, stores, first_rows = rank_top_stores(
+        arrays.arrays, rows, arrays.allowed_types(config['store_types']), int(config['store_count'])
+    )
+    weekly = arrays.arrays['weekly']
+    sales = np.zeros((first_rows.size, target_week), dtype=np.float64 if weekly.dtype.kind == 'f' else np.int64)
+    if first_rows.size:
+        top_stores = arrays.arrays['store_codes'][first_rows]
+        selected = np.isin(stores, top_stores)
+        # 每行对应的门店在排名中的位置
+        order = np.argsort(top_stores)
+        position = order[np.searchsorted(top_stores, stores[selected], sorter=order)]
+        weeks = min(target_week, arrays.horizon)
+        np.add.at(sales[:, :weeks], position, np.nan_to_num(weekly[rows[selected], :weeks]))
+    return first_rows, sales
+
+
+# ---------- 共享内存 ----------
+
+# 把数组复制到共享内存；handle 可以传给工作进程重新映射
+class SharedPredictorArrays:
+    def __init__(self, predictor_arrays):
+        self.key = uuid.uuid4().hex[:12]
+        self.segments = []
+        self.handle = {'key': self.key, 'kind': 'shm', 'arrays': {}}
+        for name, array in predictor_arrays.arrays.items():
+            segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            view = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf)
+            view[...] = array
+            self.segments.append(segment)
+            self.handle['arrays'][name] = (segment.name, array.shape, array.dtype.str)
+        self.local = PredictorArrays(
+            {name: np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+             for segment, (name, (_, shape, dtype)) in zip(self.segments, self.handle['arrays'].items())},
+            predictor_arrays.type_labels,
+            predictor_arrays.combo_labels,
+        )
+
+    def close(self):
+        self.local = None
+        for segment in self.segments:
+            segment.close()
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+        self.segments = []
+
+
+# 工作进程中已映射的数组（只保留最近使用的一份）
+# handle 的 kind 为 shm（共享内存）或 npy（磁盘上的 .npy 文件，见 matrix_store.py）
+_attached = {}
+
+
+def open_arrays(handle):
+    entry = _attached.get(handle['key'])
+    if entry is not None:
+        return entry[1]
+    for segments, _ in _attached.values():
+        for segment in segments:
+            segment.close()
+    _attached.clear()
+
+    segments = []
+    arrays = {}
+    if handle['kind'] == 'npy':
+        import matrix_store
+
+        arrays = matrix_store.map_arrays(handle['directory'], handle['arrays'])
+    else:
+        for name, (segment_name, shape, dtype) in handle['arrays'].items():
+            segment = shared_memory.SharedMemory(name=segment_name)
+            segments.append(segment)
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+    _attached[handle['key']] = (segments, arrays)
+    return arrays
+
+
+# 工作进程任务：计算一批组合，返回 [(序号, 每周销量)]
+def evaluate_shard(handle, tasks, weeks):
+    arrays = open_arrays(handle)
+    results = []
+    for index, rows, allowed_types, store_count in tasks:
+        weekly = evaluate_combo(arrays, rows, allowed_types, store_count, weeks)
+        results.append((index, None if weekly is None else weekly.tolist()))
+    return results
+
+
+# ---------- 调度 ----------
+
+# 每个组合一个任务：(序号, 行号, 允许的门店类型编码, 门店数)；positions 为筛选后的行在数组中的行号
+def combo_tasks(arrays, positions, active_configs):
+    groups = arrays.combo_rows(positions)
+    empty = np.array([], dtype=np.int64)
+    tasks = []
+    for index, config in enumerate(active_configs.values()):
+        rows = groups.get((config['ip_name'], config['product_code'], config['channel'], config['market']), empty)
+        tasks.append((index, rows, arrays.allowed_types(config['store_types']), int(config['store_count'])))
+    return tasks
+
+
+# 在当前进程中计算全部任务：[每周销量]，与 tasks 一一对应
+def evaluate_tasks(arrays, tasks, weeks):
+    results = []
+    for _, rows, allowed_types, store_count in tasks:
+        weekly = evaluate_combo(arrays.arrays, rows, allowed_types, store_count, weeks)
+        results.append(None if weekly is None else weekly.tolist())
+    return results
+
+
+# 不启动工作进程的计算：每个组合只取选中门店的行和前 target_week 列求和，不按周逐列查找列名
+def build_prediction_results(arrays, positions, active_configs, target_week):
+    tasks = combo_tasks(arrays, positions, active_configs)
+    return assemble_results(active_configs, evaluate_tasks(arrays, tasks, min(target_week, arrays.horizon)), target_week)
+
+
+# 按 active_configs 的顺序整理环形图和趋势图数据，规则与 analytics.build_prediction_results 相同
+def assemble_results(active_configs, weekly_results, target_week):
+    pie_data = []
+    trend_data = []
+    for (combo_key, config), weekly in zip(active_configs.items(), weekly_results):
+        if weekly is None:
+            continue
+        # 超出数据周数的部分销量为0
+        weekly_sales = list(weekly) + [0] * (target_week - len(weekly))
+        total_sales = sum(weekly_sales)
+        if total_sales > 0:
+            label = f"{config['ip_name']}-{config['product_code']}"
+            pie_data.append({'label': label, 'value': total_sales})
+            trend_data.append({
+                'label': label,
+                'dates': [config['start_date'] + datetime.timedelta(weeks=week) for week in range(target_week)],
+                'sales': weekly_sales,
+            })
+    return pie_data, trend_data
+
+
+# source 为工作簿路径时，数组保存在工作簿旁并以内存映射方式共享（见 matrix_store.py）；否则复制到共享内存
+class ParallelEvaluator:
+    def __init__(self, workers, source=None):
+        self.workers = workers
+        self.source = source
+        self._executor = None
+        self._shared = None
+        self._shared_for = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    # 工作进程用 spawn 启动，不继承 Streamlit 服务进程的线程和状态
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    # 每个快照只准备一次数组；快照替换后释放旧的共享内存
+    def shared_arrays(self, snapshot):
+        with self._lock:
+            if self._shared_for is not snapshot:
+                if self._shared is not None:
+                    self._shared.close()
+                if self.source is not None and snapshot.version:
+                    import matrix_store
+
+                    self._shared = matrix_store.MappedPredictorArrays(matrix_store.ensure(snapshot, self.source))
+                else:
+                    self._shared = SharedPredictorArrays(PredictorArrays.from_frame(snapshot.df, snapshot.schema))
+                self._shared_for = snapshot
+            return self._shared
+
+    def build_prediction_results(self, snapshot, filtered_df, active_configs, target_week):
+        shared = self.shared_arrays(snapshot)
+        arrays = shared.local
+        weeks = min(target_week, arrays.horizon)
+
+        # filtered_df 保留了快照中的行标签，换算成数组中的行号
+        tasks = combo_tasks(arrays, snapshot.df.index.get_indexer(filtered_df.index), active_configs)
+
+        weekly_results = [None] * len(tasks)
+        try:
+            shard_count = max(1, min(len(tasks), self.workers * 4))
+            shards = [tasks[i::shard_count] for i in range(shard_count)]
+            futures = [self.executor().submit(evaluate_shard, shared.handle, shard, weeks) for shard in shards]
+            for future in futures:
+                for index, weekly in future.result():
+                    weekly_results[index] = weekly
+        except BrokenProcessPool:
+            # 工作进程异常退出时丢弃进程池，本次在当前进程中计算
+            with self._lock:
+                self._executor = None
+            weekly_results = evaluate_tasks(arrays, tasks, weeks)
+        return assemble_results(active_configs, weekly_results, target_week)
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+            if self._shared is not None:
+                self._shared.close()
+                self._shared = None
+                self._shared_for = None
+
+
+def workers_from_env():
+    try:
+        return int(os.environ.get(WORKERS_ENV, 0))
+    except ValueError:
+        return 0
@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 轻量级阶段计时
+# 未开始记录时 stage() 返回共享的空上下文，热路径上只多一次线程局部变量查找
+#   recorder = perf.start_run('dashboard')
+#   with perf.stage('filter') as s:
+#       ...
+#       s.count(rows=len(filtered_df))
+#   perf.finish_run()
+
+ENV_ENABLED = os.environ.get('IP_APP_PERF', '') == '1'
+METRICS_PORT_ENV = 'IP_APP_METRICS_PORT'
+
+# Prometheus 直方图分桶（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+_registry_lock = threading.Lock()
+_registry = {}
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def count(self, **counters):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.counters = {}
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.stages.append({
+            'stage': self.name,
+            'seconds': time.perf_counter() - self.start,
+            **self.counters,
+        })
+        return False
+
+    def count(self, **counters):
+        self.counters.update(counters)
+
+
+# 一次页面运行中各阶段的记录
+class RunRecorder:
+    def __init__(self, page):
+        self.page = page
+        self.stages = []
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+
+    def to_dict(self):
+        return {
+            'page': self.page,
+            'started_at': self.started_at,
+            'total_seconds': time.perf_counter() - self.start,
+            'stages': self.stages,
+        }
+
+
+def stage(name):
+    recorder = getattr(_local, 'recorder', None)
+    if recorder is None:
+        return _NULL_STAGE
+    return _Stage(recorder, name)
+
+
+def start_run(page):
+    recorder = RunRecorder(page)
+    _local.recorder = recorder
+    return recorder
+
+
+# 结束当前线程的记录，汇总到进程级指标并返回本次运行记录
+def finish_run():
+    recorder = getattr(_local, 'recorder', None)
+    _local.recorder = None
+    if recorder is None:
+        return None
+    run = recorder.to_dict()
+    with _registry_lock:
+        for item in run['stages'] + [{'stage': 'total', 'seconds': run['total_seconds']}]:
+            key = (run['page'], item['stage'])
+            entry = _registry.setdefault(key, {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(BUCKETS), 'last': {}})
+            entry['count'] += 1
+            entry['sum'] += item['seconds']
+            entry['max'] = max(entry['max'], item['seconds'])
+            for i, bound in enumerate(BUCKETS):
+                if item['seconds'] <= bound:
+                    entry['buckets'][i] += 1
+            entry['last'] = {k: v for k, v in item.items() if k not in ('stage', 'seconds')}
+    return run
+
+
+def snapshot_metrics():
+    with _registry_lock:
+        return {key: dict(entry, buckets=list(entry['buckets']), last=dict(entry['last'])) for key, entry in _registry.items()}
+
+
+def to_json(last_run=None):
+    metrics = [
+        {'page': page, 'stage': name, **entry}
+        for (page, name), entry in sorted(snapshot_metrics().items())
+    ]
+    return json.dumps({'last_run': last_run, 'metrics': metrics, 'buckets': BUCKETS}, ensure_ascii=False, indent=2)
+
+
+def _labels(page, name, **extra):
+    labels = {'page': page, 'stage': name, **extra}
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}'
+
+
+# Prometheus 文本格式
+def to_prometheus():
+    metrics = sorted(snapshot_metrics().items())
+    lines = [
+        '# HELP ip_app_stage_seconds Page stage duration in seconds.',
+        '# TYPE ip_app_stage_seconds histogram',
+    ]
+    for (page, name), entry in metrics:
+        for bound, count in zip(BUCKETS, entry['buckets']):
+            lines.append(f'ip_app_stage_seconds_bucket{_labels(page, name, le=bound)} {count}')
+        lines.append(f'ip_app_stage_seconds_bucket{_labels(page, name, le="+Inf")} {entry["count"]}')
+        lines.append(f'ip_app_stage_seconds_sum{_labels(page, name)} {entry["sum"]:.6f}')
+        lines.append(f'ip_app_stage_seconds_count{_labels(page, name)} {entry["count"]}')
+    lines += [
+        '# HELP ip_app_stage_items Row/trace counters of the most recent run of each stage.',
+        '# TYPE ip_app_stage_items gauge',
+    ]
+    for (page, name), entry in metrics:
+        for counter, value in entry['last'].items():
+            lines.append(f'ip_app_stage_items{_labels(page, name, counter=counter)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+# 导出到文件：.prom / .txt 为 Prometheus 文本，其余为 JSON
+def export(path, last_run=None):
+    content = to_prometheus() if path.endswith(('.prom', '.txt')) else to_json(last_run)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = to_prometheus(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = to_json(), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# 在本地端口提供 /metrics（Prometheus）和 /metrics.json
+def serve_metrics(port, host='127.0.0.1'):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='perf-metrics', daemon=True)
+    thread.start()
+    return server
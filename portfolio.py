@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from schema import DashboardSchema
+
+# 数据大屏组合视图（不依赖Streamlit）：日期范围内全部IP按所选指标排名，汇总表列出所有IP，图表只画前N个
+# 日期范围内的实际数据按 (IP, 周) 用 np.bincount 一次分组累加，得到每个IP每周的互动量和销量矩阵；
+# 合计、增长率、排名和迷你走势图都由这两个矩阵算出，不按IP逐个过滤数据或生成曲线
+# 周从最后一天实际数据（不晚于结束日期）往前每7天为一周，第一周可能不满7天；
+# 日期范围包含预测期时不会因末尾没有实际数据而把增长率算成空值
+#   overview = PortfolioOverview.build(history, schema, social_platforms, ecommerce_platforms, start_date, end_date)
+#   overview.table('销量')          ->  每个IP一行：排名、合计、增长率和每周走势（列表，供 LineChartColumn 显示）
+#   overview.top_series('销量', 10) ->  (IP列表, 周结束日期, 每周数值矩阵)
+
+# 排名指标 -> (基础序列, 合计 / 增长率)
+RANK_METRICS = {
+    '互动量': ('engagement', 'total'),
+    '销量': ('sales', 'total'),
+    '互动量增长率': ('engagement', 'growth'),
+    '销量增长率': ('sales', 'growth'),
+}
+SERIES_LABELS = {'engagement': '互动量', 'sales': '销量'}
+# 增长率：最近 GROWTH_WEEKS 周合计相对之前 GROWTH_WEEKS 周合计的变化（周数不足或之前为0时为空）
+GROWTH_WEEKS = 4
+# 汇总表的迷你走势图最多显示最近的周数
+SPARKLINE_WEEKS = 52
+
+
+class PortfolioOverview:
+    def __init__(self, ips, week_ends, weekly):
+        self.ips = ips
+        # 每周的结束日期
+        self.week_ends = week_ends
+        # {'engagement' / 'sales': (IP数, 周数) 矩阵}
+        self.weekly = weekly
+        self.totals = {name: matrix.sum(axis=1) for name, matrix in weekly.items()}
+        self.growth = {name: _growth(matrix) for name, matrix in weekly.items()}
+
+    @classmethod
+    def build(cls, history, schema, social_platforms, ecommerce_platforms, start_date, end_date):
+        schema = schema or DashboardSchema(history.columns)
+        start, end = pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize()
+        dates = pd.to_datetime(history['日期']).dt.normalize()
+        mask = ((history['数据状态'] == '实际') & (dates >= start) & (dates <= end)).to_numpy()
+        actual = history[mask]
+        if len(actual):
+            end = dates[mask].max()
+        weeks = (end - start).days // 7 + 1
+        week_ends = [(end - pd.Timedelta(weeks=weeks - 1 - week)).date() for week in range(weeks)]
+        codes, ips = pd.factorize(actual['IP名称'])
+        days = (end - dates[mask]).dt.days.to_numpy()
+        cells = codes * weeks + (weeks - 1 - days // 7)
+
+        weekly = {}
+        for name, mapping, platforms in [
+            ('engagement', schema.engagement_columns, social_platforms),
+            ('sales', schema.sales_columns, ecommerce_platforms),
+        ]:
+            columns = schema.select(mapping, platforms)
+            values = np.nan_to_num(actual[columns].to_numpy(dtype=float)).sum(axis=1) if columns else np.zeros(len(actual))
+            weekly[name] = np.bincount(cells, weights=values, minlength=len(ips) * weeks).reshape(len(ips), weeks)
+        return cls(list(ips), week_ends, weekly)
+
+    def __len__(self):
+        return len(self.ips)
+
+    def scores(self, metric):
+        series, kind = RANK_METRICS[metric]
+        return self.growth[series] if kind == 'growth' else self.totals[series]
+
+    # 按指标从高到低的IP下标；值为空（增长率无法计算）的排在最后，值相同时保持IP原有顺序
+    def ranking(self, metric):
+        scores = self.scores(metric)
+        return np.lexsort((np.arange(len(scores)), -np.nan_to_num(scores), np.isnan(scores)))
+
+    def table(self, metric):
+        order = self.ranking(metric)
+        spark = slice(max(0, len(self.week_ends) - SPARKLINE_WEEKS), None)
+        table = pd.DataFrame({'排名': np.arange(1, len(order) + 1), 'IP': [self.ips[i] for i in order]})
+        for series, label in SERIES_LABELS.items():
+            table[label] = self.totals[series][order]
+        for series, label in SERIES_LABELS.items():
+            table[f'{label}增长率'] = self.growth[series][order]
+        for series, label in SERIES_LABELS.items():
+            table[f'{label}走势'] = self.weekly[series][order, spark].tolist()
+        return table
+
+    # 前N个IP的每周序列（图表只画这些IP），series 缺省时为排名指标的基础序列
+    def top_series(self, metric, n, series=None):
+        order = self.ranking(metric)[:n]
+        series = series or RANK_METRICS[metric][0]
+        return [self.ips[i] for i in order], self.week_ends, self.weekly[series][order]
+
+
+def _growth(matrix):
+    if matrix.shape[1] < 2 * GROWTH_WEEKS:
+        return np.full(len(matrix), np.nan)
+    recent = matrix[:, -GROWTH_WEEKS:].sum(axis=1)
+    prior = matrix[:, -2 * GROWTH_WEEKS:-GROWTH_WEEKS].sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(prior > 0, recent / prior - 1, np.nan)
@@ -0,0 +1,588 @@
+import argparse
+import datetime
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import analytics
+import data_loader
+import parallel
+import schema
+
+# 可插拔的数据后端，由环境变量 IP_APP_BACKEND 选择：
+#   pandas（默认）：读取整张工作表到内存，用 analytics 中的 Pandas 逻辑计算；销量预测使用的每周销量矩阵
+#           映射工作簿旁的 .npy 文件（见 matrix_store.py）；
+#           设置 IP_APP_WORKERS>1 时，组合较多的销量预测分片到多个进程并行计算（见 parallel.py）
+#   sqlite：从本地 SQLite 数据库查询，筛选、指标和按组合取前N门店的汇总（环形图 / 趋势图、下钻、导出）都在 SQL 中完成，
+#           只有筛选后的行、且只有页面用到的列才会读入内存；Excel / parquet 只作为导入来源
+#   python query_backend.py import demo_data.xlsx --db ip_data.sqlite
+
+BACKEND_ENV = 'IP_APP_BACKEND'
+DB_PATH_ENV = 'IP_APP_DB'
+DEFAULT_DB_PATH = 'ip_data.sqlite'
+
+# 工作表 -> 数据库表名
+TABLES = {
+    data_loader.DASHBOARD_SHEET: 'dashboard',
+    data_loader.PREDICTOR_SHEET: 'predictor',
+}
+
+# 建表后创建的索引（表名, 索引列）
+INDEXES = [
+    ('dashboard', ['IP名称', '日期']),
+    ('dashboard', ['日期']),
+    ('predictor', ['IP名称', '商品编号', '销售渠道', '市场']),
+    ('predictor', ['市场']),
+    ('predictor', ['销售渠道']),
+    ('predictor', ['门店编号']),
+]
+
+PREDICTOR_FILTER_COLUMNS = {
+    'markets': '市场',
+    'channels': '销售渠道',
+    'ip_categories': 'IP类别',
+    'materials': '商品材质',
+    'purposes': '商品用途',
+}
+# SQLite 后端筛选预测表时读取的列（另加门店类型、首周销量、销售起始日期和每周销量列）：
+# 组合、下钻层级和配置表中显示的商品信息，其余 IP / 门店属性列不读入内存
+PREDICTOR_COLUMNS = ['IP名称', '商品编号', '销售渠道', '市场', '门店编号', 'IP类别', '商品材质', '商品用途', '商品颜色', '商品尺寸', '商品价格']
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def placeholders(values):
+    return ', '.join('?' for _ in values)
+
+
+# ---------- Pandas 后端 ----------
+
+class PandasBackend:
+    name = 'pandas'
+
+    def __init__(self, workers=0):
+        self.evaluator = parallel.ParallelEvaluator(workers, data_loader.DATA_FILE) if workers > 1 else None
+        self._arrays = None
+        self._lock = threading.Lock()
+
+    def loader(self, sheet_name):
+        return data_loader.SnapshotLoader(data_loader.DATA_FILE, sheet_name)
+
+    def filter_dashboard(self, snapshot, filters):
+        return analytics.filter_dashboard_data(snapshot.df, filters['selected_ips'], filters['start_date'], filters['end_date'])
+
+    def dashboard_kpis(self, snapshot, filters, filtered_df, social_platforms, ecommerce_platforms):
+        return analytics.compute_dashboard_kpis(filtered_df, social_platforms, ecommerce_platforms, snapshot.schema)
+
+    def filter_predictor(self, snapshot, filters):
+        return analytics.filter_predictor_data(snapshot.df, *(filters.get(key) for key in PREDICTOR_FILTER_COLUMNS))
+
+    def prediction_results(self, snapshot, filters, filtered_df, active_configs, target_week):
+        if self.evaluator is not None and len(active_configs) >= parallel.MIN_PARALLEL_COMBOS:
+            return self.evaluator.build_prediction_results(snapshot, filtered_df, active_configs, target_week)
+        positions = snapshot.df.index.get_indexer(filtered_df.index)
+        return parallel.build_prediction_results(self.predictor_arrays(snapshot), positions, active_configs, target_week)
+
+    # 新品销量模型的训练数据（见 sales_model.py）：整张表已在内存中
+    def training_frame(self, snapshot):
+        return snapshot.df
+
+    # 下钻明细与环形图、趋势图使用同一份数组和同一套前N门店选择
+    def drilldown_detail(self, snapshot, filters, filtered_df, active_configs, target_week, start_week):
+        import drilldown
+
+        positions = snapshot.df.index.get_indexer(filtered_df.index)
+        return drilldown.top_store_detail(
+            self.predictor_arrays(snapshot), positions, snapshot.df, active_configs, target_week, snapshot.schema, start_week
+        )
+
+    # 导出预测结果（见 export.prediction_chunks），同样使用快照的数组
+    def prediction_chunks(self, snapshot, filters, filtered_df, active_configs, target_week, table):
+        import export
+
+        positions = snapshot.df.index.get_indexer(filtered_df.index)
+        return export.prediction_chunks(
+            self.predictor_arrays(snapshot), positions, snapshot.df, active_configs, target_week, table, snapshot.schema
+        )
+
+    # 每个快照只准备一次数值数组（每周销量为按周排列的矩阵），目标周数不同只是取的列数不同；
+    # 数组映射工作簿旁按数据版本保存的 .npy 文件（见 matrix_store.py），所有会话、命令行和工作进程共用同一份文件，
+    # 快照没有数据版本时才在内存中整理
+    def predictor_arrays(self, snapshot):
+        with self._lock:
+            if self._arrays is None or self._arrays[0] is not snapshot:
+                if snapshot.version:
+                    import matrix_store
+
+                    arrays = matrix_store.MappedPredictorArrays(matrix_store.ensure(snapshot, data_loader.DATA_FILE)).local
+                else:
+                    arrays = parallel.PredictorArrays.from_frame(snapshot.df, snapshot.schema)
+                self._arrays = (snapshot, arrays)
+            return self._arrays[1]
+
+
+# ---------- SQLite 导入 ----------
+
+# 写入数据库前把日期列转为ISO文本，读取时再还原
+def to_sql_frame(sheet_name, df):
+    df = df.copy()
+    if sheet_name == data_loader.DASHBOARD_SHEET:
+        df['日期'] = pd.to_datetime(df['日期']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    elif '销售起始日期' in df.columns:
+        df['销售起始日期'] = pd.to_datetime(df['销售起始日期']).dt.strftime('%Y-%m-%d')
+    return df
+
+
+def from_sql_frame(sheet_name, df):
+    if sheet_name == data_loader.DASHBOARD_SHEET:
+        df['日期'] = pd.to_datetime(df['日期'])
+    elif '销售起始日期' in df.columns:
+        df['销售起始日期'] = pd.to_datetime(df['销售起始日期']).dt.date
+    return df
+
+
+# 逐批读取来源数据：parquet 目录按批次读取，xlsx 一次读取后分批写入
+def iter_source_batches(source, sheet_name, batch_size):
+    if os.path.isdir(source):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(os.path.join(source, f'{sheet_name}.parquet'))
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            yield to_sql_frame(sheet_name, batch.to_pandas())
+    else:
+        df, _ = data_loader.load_sheet(source, sheet_name)
+        df = to_sql_frame(sheet_name, df)
+        for start in range(0, len(df), batch_size):
+            yield df.iloc[start:start + batch_size]
+
+
+def source_version(source):
+    digest = hashlib.sha1()
+    paths = [source] if not os.path.isdir(source) else [
+        os.path.join(source, f'{sheet_name}.parquet') for sheet_name in TABLES
+    ]
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+# 把来源数据导入数据库（先写入临时文件，完成后整体替换，查询方不会读到写了一半的库）
+def import_source(source, db_path, batch_size=50000):
+    tmp_path = f'{db_path}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    generation = 1
+    if os.path.exists(db_path):
+        generation = int(SqliteBackend(db_path).meta().get('generation', 0)) + 1
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        for sheet_name, table in TABLES.items():
+            for i, batch in enumerate(iter_source_batches(source, sheet_name, batch_size)):
+                batch.to_sql(table, conn, if_exists='replace' if i == 0 else 'append', index=False)
+        for table, columns in INDEXES:
+            index_name = f"idx_{table}_{'_'.join(columns)}"
+            conn.execute(f"CREATE INDEX {quote(index_name)} ON {table} ({', '.join(quote(c) for c in columns)})")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ('source', os.path.abspath(source)),
+            ('version', source_version(source)),
+            ('generation', str(generation)),
+            ('imported_at', datetime.datetime.now().isoformat(timespec='seconds')),
+        ])
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+    return db_path
+
+
+# ---------- SQLite 后端 ----------
+
+# 与 SnapshotLoader 接口一致的加载器：快照中不含数据，只有可选值索引和版本信息
+class SqliteSnapshotLoader:
+    def __init__(self, backend, sheet_name):
+        self.backend = backend
+        self.sheet_name = sheet_name
+        self.table = TABLES[sheet_name]
+        self.last_error = None
+        self.refreshing = False
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    # 数据库文件替换后重新读取索引
+    def get(self):
+        mtime = os.stat(self.backend.db_path).st_mtime_ns
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.source_mtime == mtime:
+            return snapshot
+        with self._lock:
+            if self._snapshot is None or self._snapshot.source_mtime != mtime:
+                meta = self.backend.meta()
+                indexes, rows = self.backend.table_indexes(self.table)
+                self._snapshot = data_loader.DataSnapshot(
+                    None, indexes, meta.get('version', ''), int(meta.get('generation', 1)), mtime, rows=rows
+                )
+            return self._snapshot
+
+
+class SqliteBackend:
+    name = 'sqlite'
+
+    def __init__(self, db_path, source=None):
+        self.db_path = db_path
+        self.source = source
+
+    def connect(self):
+        # 只读打开；每次查询单独连接，可在多个会话线程中并发使用
+        return sqlite3.connect(f'file:{os.path.abspath(self.db_path)}?mode=ro', uri=True)
+
+    def query(self, sql, params=()):
+        conn = self.connect()
+        try:
+            return pd.read_sql_query(sql, conn, params=params)
+        finally:
+            conn.close()
+
+    def meta(self):
+        conn = self.connect()
+        try:
+            return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        finally:
+            conn.close()
+
+    # 数据库不存在时从来源数据导入
+    def loader(self, sheet_name):
+        if not os.path.exists(self.db_path):
+            import_source(self.source or data_loader.DATA_FILE, self.db_path)
+        return SqliteSnapshotLoader(self, sheet_name)
+
+    def columns(self, table):
+        return list(self.column_types(table))
+
+    # 列名 -> 建表时声明的类型（to_sql 把浮点列声明为 REAL、整数列声明为 INTEGER）
+    def column_types(self, table):
+        conn = self.connect()
+        try:
+            return {row[1]: row[2] for row in conn.execute(f"PRAGMA table_info({table})")}
+        finally:
+            conn.close()
+
+    # wanted 中在表里存在的列（保持表中的列顺序）
+    def select_columns(self, snapshot, wanted):
+        return [column for column in snapshot.indexes['columns'] if column in wanted]
+
+    # 可选值按首次出现的顺序排列，与 Pandas 的 unique() 一致
+    def distinct_values(self, table, column):
+        sql = f"SELECT {quote(column)} AS value FROM {table} GROUP BY {quote(column)} ORDER BY MIN(rowid)"
+        return self.query(sql)['value'].tolist()
+
+    def table_indexes(self, table):
+        columns = self.columns(table)
+        rows = int(self.query(f"SELECT COUNT(*) AS n FROM {table}")['n'].iloc[0])
+        indexes = {'columns': columns}
+        if table == 'dashboard':
+            dates = self.query('SELECT MIN("日期") AS min_date, MAX("日期") AS max_date FROM dashboard').iloc[0]
+            indexes['ip_options'] = self.distinct_values(table, 'IP名称')
+            indexes['min_date'] = pd.Timestamp(dates['min_date']).date() if dates['min_date'] else None
+            indexes['max_date'] = pd.Timestamp(dates['max_date']).date() if dates['max_date'] else None
+            indexes['schema'] = schema.DashboardSchema(columns)
+        else:
+            for column in PREDICTOR_FILTER_COLUMNS.values():
+                if column in columns:
+                    indexes[column] = self.distinct_values(table, column)
+            indexes['schema'] = schema.PredictorSchema(columns)
+        return indexes, rows
+
+    # ----- 数据大屏 -----
+
+    def dashboard_where(self, filters):
+        ips = list(filters['selected_ips'])
+        sql = f'"IP名称" IN ({placeholders(ips)}) AND "日期" >= ? AND "日期" <= ?'
+        params = ips + [
+            str(pd.to_datetime(filters['start_date'])),
+            str(pd.to_datetime(filters['end_date'])),
+        ]
+        return sql, params
+
+    # 数据大屏用到的列：必需列和按平台解析出的指标列
+    def dashboard_columns(self, snapshot):
+        sheet_schema = snapshot.schema
+        wanted = set(schema.DASHBOARD_REQUIRED) | {sheet_schema.fan_heat_column, sheet_schema.secondhand_column}
+        for mapping in (sheet_schema.post_columns, sheet_schema.engagement_columns, sheet_schema.sales_columns):
+            wanted.update(mapping.values())
+        return self.select_columns(snapshot, wanted)
+
+    def filter_dashboard(self, snapshot, filters):
+        columns = self.dashboard_columns(snapshot)
+        if not filters['selected_ips']:
+            return pd.DataFrame(columns=columns)
+        where, params = self.dashboard_where(filters)
+        select = ', '.join(quote(column) for column in columns)
+        df = self.query(f'SELECT {select} FROM dashboard WHERE {where} ORDER BY "日期", rowid', params)
+        return from_sql_frame(data_loader.DASHBOARD_SHEET, df)
+
+    # 各指标在数据库中按日均值聚合，卡片格式与 analytics.compute_dashboard_kpis 相同
+    def dashboard_kpis(self, snapshot, filters, filtered_df, social_platforms, ecommerce_platforms):
+        sheet_schema = snapshot.schema
+
+        def row_sum(names):
+            return ' + '.join(f'COALESCE({quote(name)}, 0)' for name in names)
+
+        post_columns = sheet_schema.select(sheet_schema.post_columns, social_platforms)
+        engagement_columns = sheet_schema.select(sheet_schema.engagement_columns, social_platforms)
+        sales_columns = sheet_schema.select(sheet_schema.sales_columns, ecommerce_platforms)
+        fan_heat_column = sheet_schema.fan_heat_column
+        secondhand_column = sheet_schema.secondhand_column
+        expressions = {
+            'posts': f'AVG({row_sum(post_columns)})' if post_columns else 'NULL',
+            'engagement': f'AVG({row_sum(engagement_columns)})' if engagement_columns else 'NULL',
+            'fan_heat': f'AVG({quote(fan_heat_column)})' if fan_heat_column else 'NULL',
+            'sales': f'AVG({row_sum(sales_columns)})' if sales_columns else 'NULL',
+            'secondhand': f'AVG({quote(secondhand_column)})' if secondhand_column else 'NULL',
+        }
+        values = {key: float('nan') for key in expressions}
+        if filters['selected_ips']:
+            where, params = self.dashboard_where(filters)
+            select = ', '.join(f'{expression} AS {key}' for key, expression in expressions.items())
+            row = self.query(f'SELECT {select} FROM dashboard WHERE {where} AND "数据状态" = ?', params + ['实际']).iloc[0]
+            values = {key: float('nan') if pd.isna(row[key]) else row[key] for key in expressions}
+
+        cards = []
+        for title, value, selected in [
+            ("📤 日均发帖数", values['posts'], post_columns),
+            ("💬 日均互动量", values['engagement'], engagement_columns),
+        ]:
+            if not social_platforms:
+                cards.append((title, "0", "未选择平台"))
+            elif selected:
+                cards.append((title, f"{value:,.0f}", f"共{len(selected)}个平台"))
+            else:
+                cards.append((title, "0", "列不存在"))
+        if fan_heat_column:
+            cards.append(("🔥 日均同人热度", f"{values['fan_heat']:.1f}", "热度指数"))
+        else:
+            cards.append(("🔥 日均同人热度", "0", "数据不可用"))
+        if not ecommerce_platforms:
+            cards.append(("🛒 日均电商销量", "0", "未选择平台"))
+        elif sales_columns:
+            cards.append(("🛒 日均电商销量", f"{values['sales']:,.0f}", f"共{len(sales_columns)}个平台"))
+        else:
+            cards.append(("🛒 日均电商销量", "0", "列不存在"))
+        if secondhand_column:
+            cards.append(("🔄 日均二手销量", f"{values['secondhand']:,.0f}", "二手市场"))
+        else:
+            cards.append(("🔄 日均二手销量", "0", "数据不可用"))
+        return cards
+
+    # ----- 预测模拟器 -----
+
+    def predictor_where(self, filters, alias=''):
+        clauses = []
+        params = []
+        for key, column in PREDICTOR_FILTER_COLUMNS.items():
+            values = filters.get(key)
+            if values:
+                clauses.append(f'{alias}{quote(column)} IN ({placeholders(values)})')
+                params.extend(values)
+        return ' AND '.join(clauses) or '1', params
+
+    def predictor_columns(self, snapshot):
+        sheet_schema = snapshot.schema
+        wanted = set(PREDICTOR_COLUMNS) | set(sheet_schema.weekly_columns) | {
+            sheet_schema.store_type_column, sheet_schema.first_week_column, sheet_schema.start_date_column,
+        }
+        return self.select_columns(snapshot, wanted)
+
+    def filter_predictor(self, snapshot, filters):
+        where, params = self.predictor_where(filters)
+        select = ', '.join(quote(column) for column in self.predictor_columns(snapshot))
+        df = self.query(f'SELECT {select} FROM predictor WHERE {where} ORDER BY rowid', params)
+        return from_sql_frame(data_loader.PREDICTOR_SHEET, df)
+
+    # 新品销量模型的训练数据：整张表的行，只读取模型用到的列
+    def training_frame(self, snapshot):
+        import sales_model
+
+        columns = sales_model.training_columns(snapshot.schema, snapshot.indexes['columns'])
+        df = self.query(f"SELECT {', '.join(quote(column) for column in columns)} FROM predictor ORDER BY rowid")
+        return from_sql_frame(data_loader.PREDICTOR_SHEET, df)
+
+    # 按组合取前N门店，排名规则与 analytics.calculate_sales_data 相同：首周销量降序（为空的排在最后），
+    # 相同时按门店首次出现的顺序。查询中可以使用：
+    #   matched：符合组合和门店类型的行（combo_id, rid, store, first_week, 前 target_week 周的销量 w0, w1, ... 和 columns 中的列）
+    #   top：每个组合选中的前N门店（combo_id, store, first_rid 门店的第一行, rn 名次）
+    # select 为在其上执行的查询，combo_id 为 active_configs 中的序号
+    def query_top_stores(self, snapshot, filters, active_configs, target_week, select, columns=()):
+        sheet_schema = snapshot.schema
+        first_week = f'p.{quote(sheet_schema.first_week_column)}' if sheet_schema.first_week_column else '0'
+        week_select = ', '.join(
+            f'p.{quote(column)} AS w{i}' if column else f'0 AS w{i}'
+            for i, column in enumerate(sheet_schema.week_columns(target_week))
+        )
+        extra_select = ''.join(f', p.{quote(column)} AS {quote(column)}' for column in columns)
+        type_column = sheet_schema.store_type_column
+
+        configs = list(active_configs.values())
+        where, params = self.predictor_where(filters, alias='p.')
+        type_filter = '1'
+        if type_column:
+            type_filter = (
+                f'(NOT EXISTS (SELECT 1 FROM temp.config_types t WHERE t.combo_id = c.combo_id) '
+                f'OR p.{quote(type_column)} IN (SELECT t.store_type FROM temp.config_types t WHERE t.combo_id = c.combo_id))'
+            )
+        sql = f"""
+            WITH matched AS (
+                SELECT c.combo_id, c.store_count, p.rowid AS rid, p."门店编号" AS store,
+                       {first_week} AS first_week, {week_select}{extra_select}
+                FROM predictor p
+                JOIN temp.configs c
+                  ON p."IP名称" = c.ip_name AND p."商品编号" = c.product_code
+                 AND p."销售渠道" = c.channel AND p."市场" = c.market
+                WHERE {where} AND {type_filter}
+            ),
+            stores AS (
+                SELECT combo_id, store, MIN(rid) AS first_rid FROM matched GROUP BY combo_id, store
+            ),
+            ranked AS (
+                SELECT s.combo_id, s.store, s.first_rid,
+                       ROW_NUMBER() OVER (PARTITION BY s.combo_id ORDER BY m.first_week DESC, s.first_rid) AS rn,
+                       m.store_count
+                FROM stores s JOIN matched m ON m.rid = s.first_rid AND m.combo_id = s.combo_id
+            ),
+            top AS (
+                SELECT combo_id, store, first_rid, rn FROM ranked WHERE rn <= store_count
+            )
+            {select}
+        """
+        conn = self.connect()
+        try:
+            conn.execute("CREATE TEMP TABLE configs (combo_id INTEGER, ip_name, product_code, channel, market, store_count INTEGER)")
+            conn.execute("CREATE TEMP TABLE config_types (combo_id INTEGER, store_type)")
+            conn.executemany("INSERT INTO temp.configs VALUES (?, ?, ?, ?, ?, ?)", [
+                (i, config['ip_name'], config['product_code'], config['channel'], config['market'], int(config['store_count']))
+                for i, config in enumerate(configs)
+            ])
+            conn.executemany("INSERT INTO temp.config_types VALUES (?, ?)", [
+                (i, store_type) for i, config in enumerate(configs) for store_type in config['store_types']
+            ])
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    # 每个组合前N门店的每周销量合计，全部在一条SQL中完成
+    def top_store_weekly_sales(self, snapshot, filters, active_configs, target_week):
+        week_sums = ', '.join(f'COALESCE(SUM(m.w{i}), 0) AS w{i}' for i in range(target_week))
+        rows = self.query_top_stores(snapshot, filters, active_configs, target_week, f"""
+            SELECT m.combo_id, {week_sums}
+            FROM matched m JOIN top t ON t.combo_id = m.combo_id AND t.store = m.store
+            GROUP BY m.combo_id
+        """)
+        combo_keys = list(active_configs)
+        return {combo_keys[row[0]]: list(row[1:]) for row in rows}
+
+    def prediction_results(self, snapshot, filters, filtered_df, active_configs, target_week):
+        weekly_by_combo = self.top_store_weekly_sales(snapshot, filters, active_configs, target_week)
+        pie_data = []
+        trend_data = []
+        for combo_key, config in active_configs.items():
+            weekly_sales = weekly_by_combo.get(combo_key)
+            if weekly_sales is None:
+                continue
+            total_sales = sum(weekly_sales)
+            if total_sales > 0:
+                label = f"{config['ip_name']}-{config['product_code']}"
+                pie_data.append({'label': label, 'value': total_sales})
+                trend_data.append({
+                    'label': label,
+                    'dates': [config['start_date'] + datetime.timedelta(weeks=week) for week in range(target_week)],
+                    'sales': weekly_sales,
+                })
+        return pie_data, trend_data
+
+    # 下钻明细：前N门店的每一行及其起始周到目标周的销量合计，在SQL中选出，只读取下钻层级列
+    def drilldown_detail(self, snapshot, filters, filtered_df, active_configs, target_week, start_week):
+        import drilldown
+
+        levels = drilldown.drilldown_levels(snapshot.indexes['columns'], snapshot.schema)
+        sales = ' + '.join(f'COALESCE(m.w{i}, 0)' for i in range(start_week - 1, target_week)) or '0'
+        rows = self.query_top_stores(snapshot, filters, active_configs, target_week, f"""
+            SELECT {', '.join(f'm.{quote(level)}' for level in levels)}, {sales}
+            FROM matched m JOIN top t ON t.combo_id = m.combo_id AND t.store = m.store
+            ORDER BY m.combo_id, m.rid
+        """, levels)
+        return pd.DataFrame(rows, columns=levels + [drilldown.SALES_COLUMN])
+
+    # 导出预测结果：每个组合选中的门店（按名次）及各自每周销量在SQL中汇总，见 export.top_store_chunks
+    def prediction_chunks(self, snapshot, filters, filtered_df, active_configs, target_week, table):
+        import export
+
+        sheet_schema = snapshot.schema
+        type_column = sheet_schema.store_type_column
+        store_type = f'f.{quote(type_column)}' if type_column else 'NULL'
+        week_sums = ', '.join(f'COALESCE(SUM(m.w{i}), 0)' for i in range(target_week))
+        rows = self.query_top_stores(snapshot, filters, active_configs, target_week, f"""
+            SELECT t.combo_id, t.store, {store_type}, f.first_week, {week_sums}
+            FROM top t
+            JOIN matched f ON f.combo_id = t.combo_id AND f.rid = t.first_rid
+            JOIN matched m ON m.combo_id = t.combo_id AND m.store = t.store
+            GROUP BY t.combo_id, t.rn
+            ORDER BY t.combo_id, t.rn
+        """, [type_column] if type_column else [])
+
+        # 与 parallel.weekly_matrix 相同：每周销量列全为整数列时按整数汇总
+        types = self.column_types('predictor')
+        integer = all(types.get(column) == 'INTEGER' for column in sheet_schema.weekly_columns if column)
+        dtype = np.int64 if integer else np.float64
+        by_combo = {}
+        for row in rows:
+            by_combo.setdefault(row[0], []).append(row[1:])
+        top_stores = {}
+        for i, combo_key in enumerate(active_configs):
+            stores = by_combo.get(i, [])
+            top_stores[combo_key] = (
+                [row[0] for row in stores], [row[1] for row in stores], [row[2] for row in stores],
+                np.array([row[3:] for row in stores], dtype=dtype).reshape(len(stores), target_week),
+            )
+        return export.top_store_chunks(top_stores, active_configs, target_week, table)
+
+BACKENDS = {
+    'pandas': lambda: PandasBackend(parallel.workers_from_env()),
+    'sqlite': lambda: SqliteBackend(os.environ.get(DB_PATH_ENV, DEFAULT_DB_PATH)),
+}
+
+
+def create_backend(name=None):
+    name = name or os.environ.get(BACKEND_ENV, 'pandas')
+    if name not in BACKENDS:
+        raise ValueError(f"未知的数据后端: {name}（可选: {', '.join(BACKENDS)}）")
+    return BACKENDS[name]()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据后端工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='把xlsx文件或parquet目录导入SQLite数据库')
+    import_parser.add_argument('source', nargs='?', default=data_loader.DATA_FILE)
+    import_parser.add_argument('--db', default=os.environ.get(DB_PATH_ENV, DEFAULT_DB_PATH))
+    import_parser.add_argument('--batch-size', type=int, default=50000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    import_source(args.source, args.db, args.batch_size)
+    meta = SqliteBackend(args.db).meta()
+    print(f"已导入 {args.source} -> {args.db}（版本 {meta['version']}，第{meta['generation']}次导入），{time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
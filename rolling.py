@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+
+# 数据大屏滚动统计：每个 IP × 指标列的 7 / 28 日移动平均、环比增长率和 z-score 异常标记
+# 数据按（IP, 日期）排序后，所有列、所有IP在同一组累加和上一次向量化算出，不按曲线逐条计算；
+# 窗口按行计数（每个IP每天一行）。末尾追加新日期时只计算新增的行，每个IP取最后 CONTEXT_ROWS 行作为窗口上下文
+#   stats = RollingStats.build(history, columns)
+#   stats = stats.update(new_history)     # 只是追加了新日期时增量计算，否则重新计算
+#   stats.between(start_date, end_date)   ->  原始列 + '列名|ma7'、'列名|growth7'、'列名|z'、'列名|anomaly' 等
+
+WINDOWS = (7, 28)
+# z-score 使用前 Z_WINDOW 天（不含当天）的均值和标准差
+Z_WINDOW = 28
+ANOMALY_Z = 3.0
+# 标准差小于该比例 × 整列标准差时视为0
+STD_TOLERANCE = 1e-5
+# 增量计算时每个IP需要的历史行数：增长率比较相隔一个窗口的两个移动平均
+CONTEXT_ROWS = max(2 * max(WINDOWS), Z_WINDOW)
+
+KEY_COLUMNS = ['IP名称', '日期', '数据状态']
+
+
+# 参与计算的指标列：各平台发帖数、互动量、电商销量，以及同人热度和二手销量
+def metric_columns(schema):
+    columns = list(schema.post_columns.values()) + list(schema.engagement_columns.values()) + list(schema.sales_columns.values())
+    return columns + [column for column in (schema.fan_heat_column, schema.secondhand_column) if column]
+
+
+# 趋势图中显示的序列 [(显示名称, 列名)]，与 charts.build_social_figure / build_ecommerce_figure 一致
+def chart_series(schema, social_platforms, ecommerce_platforms, show_engagement, show_posts, show_sales, show_secondhand):
+    series = []
+    for enabled, metric, mapping, platforms in [
+        (show_engagement, '互动量', schema.engagement_columns, social_platforms),
+        (show_posts, '发帖数', schema.post_columns, social_platforms),
+        (show_sales, '销量', schema.sales_columns, ecommerce_platforms),
+    ]:
+        if enabled:
+            series.extend((f'{platform}{metric}', mapping[platform]) for platform in platforms if platform in mapping)
+    if show_secondhand and schema.secondhand_column:
+        series.append(('二手销量', schema.secondhand_column))
+    return series
+
+
+def stat_column(column, stat):
+    return f'{column}|{stat}'
+
+
+# 窗口内的合计和有效值个数：窗口为 [end - window, end) 行，跨越IP边界的窗口无效
+def _window_sums(cumsum, counts, end, window, valid):
+    start = np.where(valid, end - window, 0)
+    return cumsum[end] - cumsum[start], counts[end] - counts[start]
+
+
+# frame 已按（IP, 日期）排序；返回各统计列组成的 DataFrame（与 frame 行对齐）
+def _compute(frame, columns):
+    n = len(frame)
+    values = frame[columns].to_numpy(dtype=float)
+    # 先减去各列均值，平方和的累加不会因数值过大而丢失精度
+    center = np.nan_to_num(np.nanmean(values, axis=0)) if n else np.zeros(len(columns))
+    centered = values - center
+    missing = np.isnan(centered)
+    filled = np.where(missing, 0.0, centered)
+    zero = np.zeros((1, len(columns)))
+    cumsum = np.vstack([zero, np.cumsum(filled, axis=0)])
+    cumsq = np.vstack([zero, np.cumsum(filled ** 2, axis=0)])
+    counts = np.vstack([zero, np.cumsum(~missing, axis=0)])
+
+    ip_codes = pd.factorize(frame['IP名称'])[0]
+    starts = np.flatnonzero(np.r_[True, ip_codes[1:] != ip_codes[:-1]]) if n else np.array([], dtype=int)
+    position = np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+    rows = np.arange(n)
+
+    result = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for window in WINDOWS:
+            # 含当天在内的最近 window 天，窗口内有缺失值时为空
+            valid = (position + 1 >= window)[:, None]
+            total, count = _window_sums(cumsum, counts, rows + 1, window, valid[:, 0])
+            ma = np.where(valid & (count == window), total / window + center, np.nan)
+            previous = np.full_like(ma, np.nan)
+            shifted = position >= window
+            previous[shifted] = ma[rows[shifted] - window]
+            growth = np.where(previous != 0, ma / previous - 1, np.nan)
+            for index, column in enumerate(columns):
+                result[stat_column(column, f'ma{window}')] = ma[:, index]
+                result[stat_column(column, f'growth{window}')] = growth[:, index]
+
+        valid = position >= Z_WINDOW
+        total, count = _window_sums(cumsum, counts, rows, Z_WINDOW, valid)
+        squares, _ = _window_sums(cumsq, counts, rows, Z_WINDOW, valid)
+        full = valid[:, None] & (count == Z_WINDOW)
+        mean = total / Z_WINDOW
+        std = np.sqrt(np.maximum(squares - total * mean, 0) / (Z_WINDOW - 1))
+        # 方差由累加和相减得到，带有舍入误差；窗口内取值全部相同时标准差按0处理（z-score为空）
+        tolerance = STD_TOLERANCE * np.nan_to_num(np.nanstd(values, axis=0)) if n else 0
+        z = np.where(full & (std > tolerance), (centered - mean) / std, np.nan)
+        # 只标记实际数据，预测数据不参与异常判断
+        actual = (frame['数据状态'] == '实际').to_numpy()[:, None]
+        anomaly = actual & (np.abs(z) >= ANOMALY_Z)
+        for index, column in enumerate(columns):
+            result[stat_column(column, 'z')] = z[:, index]
+            result[stat_column(column, 'anomaly')] = anomaly[:, index]
+    return pd.DataFrame(result, index=frame.index)
+
+
+def _prepare(history, columns):
+    frame = history[KEY_COLUMNS + columns].sort_values(['IP名称', '日期'], kind='stable')
+    return frame.reset_index(drop=True)
+
+
+class RollingStats:
+    def __init__(self, table, columns):
+        # 按（IP, 日期）排序：原始列 + 统计列
+        self.table = table
+        self.columns = columns
+
+    @classmethod
+    def build(cls, history, columns):
+        frame = _prepare(history, columns)
+        return cls(pd.concat([frame, _compute(frame, columns)], axis=1), columns)
+
+    # history 为同一批IP的最新完整数据；已有日期的数据未变化时只计算新追加的日期
+    def update(self, history):
+        frame = _prepare(history, self.columns)
+        old = self.table
+        last = old.groupby('IP名称', sort=False)['日期'].max()
+        if set(frame['IP名称'].unique()) != set(last.index):
+            return RollingStats.build(history, self.columns)
+        cutoff = frame['IP名称'].map(last)
+        appended = frame['日期'] > cutoff
+        base = KEY_COLUMNS + self.columns
+        head = frame.loc[~appended, base].reset_index(drop=True)
+        if not head.equals(old[base]):
+            return RollingStats.build(history, self.columns)
+        if not appended.any():
+            return self
+
+        context = old.groupby('IP名称', sort=False).tail(CONTEXT_ROWS)[base].assign(_new=False)
+        combined = pd.concat([context, frame.loc[appended, base].assign(_new=True)], ignore_index=True)
+        combined = combined.sort_values(['IP名称', '日期'], kind='stable').reset_index(drop=True)
+        computed = pd.concat([combined[base], _compute(combined[base], self.columns)], axis=1)[combined['_new'].to_numpy()]
+        table = pd.concat([old, computed], ignore_index=True)
+        table = table.sort_values(['IP名称', '日期'], kind='stable').reset_index(drop=True)
+        return RollingStats(table, self.columns)
+
+    def between(self, start_date, end_date):
+        dates = self.table['日期']
+        return self.table[(dates >= pd.to_datetime(start_date)) & (dates <= pd.to_datetime(end_date))]
+
+    # 每个 IP × 序列一行：日期范围内最后一个实际数据日的移动平均和增长率，以及范围内的异常天数
+    # series: [(显示名称, 列名)]
+    def summary(self, series, start_date, end_date):
+        table = self.between(start_date, end_date)
+        table = table[table['数据状态'] == '实际']
+        rows = []
+        for ip, ip_rows in table.groupby('IP名称', sort=False):
+            last = ip_rows.iloc[-1]
+            for label, column in series:
+                row = {'IP': ip, '指标': label, '日期': last['日期'].date(), '当日': last[column]}
+                for window in WINDOWS:
+                    row[f'{window}日均值'] = last[stat_column(column, f'ma{window}')]
+                    row[f'{window}日环比'] = last[stat_column(column, f'growth{window}')]
+                row['异常天数'] = int(ip_rows[stat_column(column, 'anomaly')].sum())
+                rows.append(row)
+        return pd.DataFrame(rows)
@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from schema import PredictorSchema
+
+# 新品销量模型（不依赖Streamlit）：为预测结果底表中没有的 门店 × 商品 组合预测每周销量曲线
+# 门店特征（商圈类型、市场）和商品特征（所属IP、材质、用途、颜色、尺寸、价格）中，类别特征独热编码、数值特征取 log(1+x) 后标准化；
+# 目标为 log(1 + 第1..N周销量)，带少量岭正则的最小二乘一次解出所有周的系数（CPU上不到一秒）。
+# 模型按数据版本保存为 <模型目录>/<数据版本>.npz，所有会话、进程和命令行共用；
+# 模型对门店特征和商品特征是可加的，所有候选 门店 × 商品 组合的预测是两组得分的一次广播相加
+#   model = sales_model.ensure(snapshot.version, lambda: backend.training_frame(snapshot), snapshot.schema)
+#   curves = model.predict_pairs(model.stores, products)   ->  (门店数, 商品数, 周数)
+#   python sales_model.py train demo_data.xlsx --holdout 0.2
+
+MODEL_DIR_ENV = 'IP_APP_MODEL_DIR'
+DEFAULT_MODEL_DIR = 'sales_models'
+
+STORE_CATEGORICAL = ['市场']
+PRODUCT_CATEGORICAL = ['IP名称', '商品材质', '商品用途', '商品颜色']
+PRODUCT_NUMERIC = ['商品尺寸', '商品价格']
+# 门店表中保存的列（不参与训练的列只用于显示）
+STORE_INFO = ['门店编号', '销售渠道']
+# 岭正则系数（不作用于截距）
+RIDGE = 1.0
+
+
+def model_dir():
+    return os.environ.get(MODEL_DIR_ENV, DEFAULT_MODEL_DIR)
+
+
+def model_path(version, directory=None):
+    return os.path.join(directory or model_dir(), f'{version}.npz')
+
+
+# 独热编码：不在类别表中的取值（新类别、缺失值）全为0，即按所有类别的平均水平预测
+def _one_hot(values, categories):
+    index = pd.Index(categories).get_indexer(pd.Series(values, dtype=object).astype(str))
+    encoded = np.zeros((len(index), len(categories)))
+    known = index >= 0
+    encoded[np.flatnonzero(known), index[known]] = 1.0
+    return encoded
+
+
+class SalesModel:
+    def __init__(self, version, features, categories, numeric_mean, numeric_std, intercept, store_coef, product_coef,
+                 stores, rows=0, r2=None):
+        self.version = version
+        # {'store_categorical': [...], 'product_categorical': [...], 'product_numeric': [...]}
+        self.features = features
+        self.categories = categories
+        self.numeric_mean = numeric_mean
+        self.numeric_std = numeric_std
+        # 截距 (周数,)，门店特征系数 (门店特征数, 周数)，商品特征系数 (商品特征数, 周数)
+        self.intercept = intercept
+        self.store_coef = store_coef
+        self.product_coef = product_coef
+        # 训练数据中的门店（每个门店一行），作为候选门店
+        self.stores = stores
+        self.rows = rows
+        # 训练集上每周 log 销量的 R²
+        self.r2 = r2 if r2 is not None else np.full(len(intercept), np.nan)
+
+    @property
+    def horizon(self):
+        return len(self.intercept)
+
+    def encode_stores(self, stores):
+        blocks = [_one_hot(stores[column], self.categories[column]) for column in self.features['store_categorical']]
+        return np.hstack(blocks) if blocks else np.zeros((len(stores), 0))
+
+    def encode_products(self, products):
+        blocks = [_one_hot(products[column], self.categories[column]) for column in self.features['product_categorical']]
+        numeric = self.features['product_numeric']
+        if numeric:
+            values = np.log1p(np.clip(products[numeric].to_numpy(dtype=float), 0, None))
+            # 缺失的数值按均值处理
+            blocks.append(np.nan_to_num((values - self.numeric_mean) / self.numeric_std))
+        return np.hstack(blocks) if blocks else np.zeros((len(products), 0))
+
+    # 逐行预测（每行同时包含门店和商品特征）：(行数, 周数)
+    def predict_rows(self, frame):
+        log_sales = self.intercept + self.encode_stores(frame) @ self.store_coef + self.encode_products(frame) @ self.product_coef
+        return np.clip(np.expm1(log_sales), 0, None)
+
+    # 所有 门店 × 商品 组合：(门店数, 商品数, 周数)
+    def predict_pairs(self, stores, products):
+        store_scores = self.encode_stores(stores) @ self.store_coef
+        product_scores = self.encode_products(products) @ self.product_coef
+        log_sales = self.intercept + store_scores[:, None, :] + product_scores[None, :, :]
+        return np.clip(np.expm1(log_sales), 0, None)
+
+    # 每个商品在每个市场取预测首周销量最高的前 store_count 个门店，汇总第1..target_week周销量
+    # 返回 (市场列表, 各市场选中的门店数, 每周销量 (商品数, 市场数, target_week))，超出模型周数的部分为0
+    def top_store_curves(self, stores, products, store_count, target_week):
+        curves = self.predict_pairs(stores, products)
+        markets = list(pd.unique(stores['市场']))
+        counts = []
+        sales = np.zeros((len(products), len(markets), target_week))
+        weeks = min(target_week, self.horizon)
+        for index, market in enumerate(markets):
+            market_curves = curves[(stores['市场'] == market).to_numpy()]
+            count = min(int(store_count), len(market_curves))
+            # 按首周销量降序，相同时保持门店顺序
+            order = np.argsort(-market_curves[:, :, 0], axis=0, kind='stable')[:count]
+            top = np.take_along_axis(market_curves, order[:, :, None], axis=0)
+            sales[:, index, :weeks] = top[:, :, :weeks].sum(axis=0)
+            counts.append(count)
+        return markets, counts, sales
+
+    # 新品的默认取值：各类别特征取最常见的类别，数值特征取训练数据的中位水平
+    def default_product(self):
+        product = {column: self.categories[column][0] for column in self.features['product_categorical']}
+        for column, mean in zip(self.features['product_numeric'], self.numeric_mean):
+            product[column] = round(float(np.expm1(mean)))
+        return product
+
+    def save(self, path):
+        meta = {
+            'version': self.version, 'features': self.features, 'categories': self.categories,
+            'rows': self.rows, 'store_columns': list(self.stores.columns),
+        }
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # 先写临时文件再改名，其他进程不会读到写了一半的文件
+        tmp = os.path.join(directory, f'.{os.path.basename(path)}.tmp-{uuid.uuid4().hex[:8]}.npz')
+        try:
+            np.savez(
+                tmp, meta=np.array(json.dumps(meta, ensure_ascii=False)),
+                numeric_mean=self.numeric_mean, numeric_std=self.numeric_std, intercept=self.intercept,
+                store_coef=self.store_coef, product_coef=self.product_coef, r2=self.r2,
+                **{f'store_{index}': self.stores[column].astype(str).to_numpy(dtype=str)
+                   for index, column in enumerate(self.stores.columns)}
+            )
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            stores = pd.DataFrame({
+                column: data[f'store_{index}'].astype(object) for index, column in enumerate(meta['store_columns'])
+            })
+            return cls(
+                meta['version'], meta['features'], meta['categories'], data['numeric_mean'], data['numeric_std'],
+                data['intercept'], data['store_coef'], data['product_coef'], stores, meta['rows'], data['r2'],
+            )
+
+
+# 实际存在的特征列（门店类型列按 schema 解析）
+def feature_columns(schema, columns):
+    store_categorical = ([schema.store_type_column] if schema.store_type_column else []) + STORE_CATEGORICAL
+    return {
+        'store_categorical': [column for column in store_categorical if column in columns],
+        'product_categorical': [column for column in PRODUCT_CATEGORICAL if column in columns],
+        'product_numeric': [column for column in PRODUCT_NUMERIC if column in columns],
+    }
+
+
+# 训练用到的列（门店表中保存的列、特征列和每周销量列），数据后端只需读取这些列
+def training_columns(schema, columns):
+    features = feature_columns(schema, columns)
+    wanted = set(STORE_INFO).union(*features.values(), (column for column in schema.weekly_columns if column))
+    return [column for column in columns if column in wanted]
+
+
+# 训练目标：第1..N周销量，缺失的周和缺失值按0处理
+def weekly_targets(df, schema):
+    return np.column_stack([
+        df[column].to_numpy(dtype=float) if column else np.zeros(len(df)) for column in schema.weekly_columns
+    ]) if schema.horizon else np.zeros((len(df), 0))
+
+
+def train(df, schema=None, version=''):
+    schema = schema or PredictorSchema(df.columns)
+    features = feature_columns(schema, df.columns)
+    # 类别按出现次数降序，第一个即最常见的类别
+    categories = {
+        column: [str(value) for value in df[column].dropna().astype(str).value_counts().index]
+        for column in features['store_categorical'] + features['product_categorical']
+    }
+    numeric = np.log1p(np.clip(df[features['product_numeric']].to_numpy(dtype=float), 0, None))
+    numeric_mean = np.nan_to_num(np.nanmean(numeric, axis=0)) if len(df) else np.zeros(numeric.shape[1])
+    numeric_std = np.nan_to_num(np.nanstd(numeric, axis=0)) if len(df) else np.ones(numeric.shape[1])
+    numeric_std[numeric_std == 0] = 1.0
+
+    store_info = [column for column in STORE_INFO if column in df.columns]
+    stores = df[store_info + [column for column in features['store_categorical'] if column not in store_info]]
+    stores = stores.drop_duplicates('门店编号').reset_index(drop=True)
+    model = SalesModel(version, features, categories, numeric_mean, numeric_std, np.zeros(schema.horizon),
+                       None, None, stores, len(df))
+
+    store_x = model.encode_stores(df)
+    product_x = model.encode_products(df)
+    x = np.hstack([np.ones((len(df), 1)), store_x, product_x])
+    y = np.log1p(np.clip(np.nan_to_num(weekly_targets(df, schema)), 0, None))
+    # 岭回归：在样本后追加 sqrt(λ)·I 行（截距不加正则），用最小二乘求解
+    penalty = np.sqrt(RIDGE) * np.eye(x.shape[1])[1:]
+    coef = np.linalg.lstsq(np.vstack([x, penalty]), np.vstack([y, np.zeros((len(penalty), y.shape[1]))]), rcond=None)[0]
+    model.intercept = coef[0]
+    model.store_coef = coef[1:1 + store_x.shape[1]]
+    model.product_coef = coef[1 + store_x.shape[1]:]
+    model.r2 = r_squared(y, x @ coef)
+    return model
+
+
+# 每周 log 销量的 R²
+def r_squared(actual, predicted):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total = ((actual - actual.mean(axis=0)) ** 2).sum(axis=0)
+        return 1 - ((actual - predicted) ** 2).sum(axis=0) / total
+
+
+# 删除其他版本的模型文件
+def remove_stale(directory, keep):
+    for entry in os.listdir(directory):
+        if entry.endswith('.npz') and entry != os.path.basename(keep):
+            try:
+                os.remove(os.path.join(directory, entry))
+            except OSError:
+                pass
+
+
+# 返回数据版本对应的模型：已保存时直接读取，否则用 load_frame() 的数据训练并保存
+def ensure(version, load_frame, schema=None, directory=None):
+    path = model_path(version, directory)
+    if os.path.exists(path):
+        return SalesModel.load(path)
+    model = train(load_frame(), schema, version)
+    model.save(path)
+    remove_stale(os.path.dirname(path) or '.', path)
+    return model
+
+
+def main():
+    import data_loader
+
+    parser = argparse.ArgumentParser(description='训练并保存新品销量模型')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    train_parser = subparsers.add_parser('train', help='按当前数据版本训练模型')
+    train_parser.add_argument('source', nargs='?', default=data_loader.DATA_FILE, help='xlsx 工作簿')
+    train_parser.add_argument('--model-dir', default=model_dir(), help='模型目录')
+    train_parser.add_argument('--holdout', type=float, default=0.0, help='按商品留出该比例评估对未见商品的预测效果')
+    train_parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    snapshot = data_loader.SnapshotLoader(args.source, data_loader.PREDICTOR_SHEET).get()
+    df, sheet_schema = snapshot.df, snapshot.schema
+    if args.holdout > 0:
+        products = df['商品编号'].unique()
+        held_out = np.random.default_rng(args.seed).choice(products, int(len(products) * args.holdout), replace=False)
+        test = df['商品编号'].isin(held_out)
+        model = train(df[~test], sheet_schema)
+        actual = np.log1p(np.clip(np.nan_to_num(weekly_targets(df[test], sheet_schema)), 0, None))
+        r2 = r_squared(actual, np.log1p(model.predict_rows(df[test])))
+        print(f"留出 {len(held_out)} 个商品（{int(test.sum()):,} 行），每周 log 销量 R²: "
+              + ', '.join(f'{value:.3f}' for value in r2))
+
+    path = model_path(snapshot.version, args.model_dir)
+    model = ensure(snapshot.version, lambda: df, sheet_schema, args.model_dir)
+    print(f"已保存 {path}（{model.rows:,} 行，{len(model.stores)} 个门店，{model.horizon} 周），"
+          f"训练集每周 log 销量 R²: " + ', '.join(f'{value:.3f}' for value in model.r2))
+
+
+if __name__ == '__main__':
+    main()
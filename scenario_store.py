@@ -0,0 +1,165 @@
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# 预测模拟器场景的本地存储（SQLite）
+# 保存命名的页面配置（目标周数、起始周、筛选条件、各组合门店数/门店类型、已删除的组合），
+# 以及保存时计算出的环形图和趋势图数据；计算结果按 数据版本 + 配置指纹 缓存，
+# 数据未变化时重新打开场景直接读取结果，不再计算
+#   store = ScenarioStore('ip_scenarios.sqlite')
+#   key = fingerprint(target_week, filters, active_configs)
+#   store.save('古风木质', make_settings(...), snapshot.version, key, pie_data, trend_data)
+#   store.cached_results(snapshot.version, key)  ->  (pie_data, trend_data) 或 None
+
+DB_PATH_ENV = 'IP_APP_SCENARIO_DB'
+DEFAULT_DB_PATH = 'ip_scenarios.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenarios (
+    name TEXT PRIMARY KEY,
+    settings TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    data_version TEXT,
+    saved_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    data_version TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    pie_data TEXT NOT NULL,
+    trend_data TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (data_version, fingerprint)
+);
+"""
+
+# 不再被任何场景引用的结果一并清理
+PRUNE_RESULTS = (
+    "DELETE FROM results WHERE NOT EXISTS (SELECT 1 FROM scenarios s "
+    "WHERE s.fingerprint = results.fingerprint AND s.data_version = results.data_version)"
+)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, set):
+        return sorted(value, key=str)
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"无法序列化: {type(value).__name__}")
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, default=_json_default)
+
+
+# 页面配置：settings 包含 target_week、start_week、filters、store_counts、store_types、deleted_combinations
+def make_settings(target_week, filters, store_counts, store_types, deleted_combinations, start_week=1):
+    return {
+        'target_week': int(target_week),
+        'start_week': int(start_week),
+        'filters': {key: list(values) for key, values in filters.items()},
+        'store_counts': {key: int(value) for key, value in store_counts.items()},
+        'store_types': {key: list(value) for key, value in store_types.items()},
+        'deleted_combinations': sorted(deleted_combinations),
+    }
+
+
+# 决定计算结果的配置指纹：目标周数、筛选条件和实际参与计算的各组合门店数 / 门店类型
+def fingerprint(target_week, filters, active_configs):
+    payload = {
+        'target_week': int(target_week),
+        'filters': {key: list(values) for key, values in filters.items()},
+        'configs': [
+            [key, int(config['store_count']), list(config['store_types'])]
+            for key, config in sorted(active_configs.items())
+        ],
+    }
+    return hashlib.sha1(_dumps(payload).encode('utf-8')).hexdigest()
+
+
+def _load_trend(trend_data):
+    for item in trend_data:
+        item['dates'] = [datetime.date.fromisoformat(date[:10]) for date in item['dates']]
+    return trend_data
+
+
+class ScenarioStore:
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.executescript(SCHEMA)
+        return connection
+
+    # 数据库不存在时只读操作直接返回空结果，不创建文件
+    def _exists(self):
+        return os.path.exists(self.path)
+
+    def save(self, name, settings, data_version, result_fingerprint, pie_data, trend_data):
+        now = time.time()
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO scenarios (name, settings, fingerprint, data_version, saved_at) VALUES (?, ?, ?, ?, ?)",
+                    (name, _dumps(settings), result_fingerprint, data_version, now),
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO results (data_version, fingerprint, pie_data, trend_data, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (data_version, result_fingerprint, _dumps(pie_data), _dumps(trend_data), now),
+                )
+                connection.execute(PRUNE_RESULTS)
+        finally:
+            connection.close()
+
+    # [(名称, 保存时间)]，最近保存的在前
+    def saved(self):
+        if not self._exists():
+            return []
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT name, saved_at FROM scenarios ORDER BY saved_at DESC").fetchall()
+        finally:
+            connection.close()
+
+    def load(self, name):
+        if not self._exists():
+            return None
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT settings FROM scenarios WHERE name = ?", (name,)).fetchone()
+        finally:
+            connection.close()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, name):
+        if not self._exists():
+            return
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("DELETE FROM scenarios WHERE name = ?", (name,))
+                connection.execute(PRUNE_RESULTS)
+        finally:
+            connection.close()
+
+    # 同一数据版本、同一配置已保存过结果时返回 (pie_data, trend_data)，否则返回 None
+    def cached_results(self, data_version, result_fingerprint):
+        if not self._exists():
+            return None
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT pie_data, trend_data FROM results WHERE data_version = ? AND fingerprint = ?",
+                (data_version, result_fingerprint),
+            ).fetchone()
+        finally:
+            connection.close()
+        if row is None:
+            return None
+        return json.loads(row[0]), _load_trend(json.loads(row[1]))
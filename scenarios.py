@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+import analytics
+from schema import PredictorSchema
+
+# 场景对比：多个命名的配置集合（各组合的门店数、门店类型和目标周数）一起计算
+# 所有场景共用筛选后的数据和组合行索引；每个组合 × 门店类型集合只做一次门店排名，
+# 并按排名累加每周销量，任意门店数N的结果就是累加矩阵的第N行，门店选择与 analytics.calculate_sales_data 相同
+#   comparison = compare_scenarios(filtered_df, [('当前', 8, active_configs), ('扩店', 8, other_configs)], schema)
+#   comparison.weekly['扩店'][combo_key]  ->  每周销量数组（超出该场景目标周数的部分为0）
+#   comparison.delta('扩店', '当前')      ->  (差值矩阵, 差值百分比矩阵)，行为组合、列为周
+
+# 最多同时对比的场景数
+MAX_SCENARIOS = 5
+
+
+def combo_label(config):
+    return f"{config['ip_name']}-{config['product_code']} · {config['channel']} · {config['market']}"
+
+
+# 一个组合在某个门店类型集合下的门店排名，cumulative[i] 为前 i+1 个门店的每周销量合计
+def rank_stores(rows, schema, weeks):
+    if rows.empty:
+        return np.zeros((0, weeks))
+    stores = rows['门店编号']
+    first_rows = rows[~stores.duplicated()]
+    first_week = first_rows[schema.first_week_column].to_numpy() if schema.first_week_column else np.zeros(len(first_rows))
+    ranking = np.argsort(-first_week, kind='stable')
+
+    columns = [column for column in schema.week_columns(weeks) if column]
+    sums = rows.groupby('门店编号', sort=False, dropna=False)[columns].sum()
+    weekly = np.zeros((len(sums), weeks), dtype=sums.to_numpy().dtype if columns else np.int64)
+    for week, column in enumerate(schema.week_columns(weeks)):
+        if column:
+            weekly[:, week] = sums[column].to_numpy()
+    return np.cumsum(weekly[ranking], axis=0)
+
+
+class ScenarioComparison:
+    def __init__(self, names, labels, weekly, weeks):
+        self.names = names
+        # {combo_key: 显示名称}，按首次出现的顺序
+        self.labels = labels
+        # {场景名称: {combo_key: 每周销量数组}}
+        self.weekly = weekly
+        self.weeks = weeks
+
+    # 只保留指定下标的组合（用于图表只显示差异最大的组合）
+    def subset(self, positions):
+        keys = list(self.labels)
+        labels = {keys[i]: self.labels[keys[i]] for i in positions}
+        weekly = {name: {key: sales[key] for key in labels} for name, sales in self.weekly.items()}
+        return ScenarioComparison(self.names, labels, weekly, self.weeks)
+
+    def matrix(self, name):
+        return np.array([self.weekly[name][key] for key in self.labels], dtype=float).reshape(len(self.labels), self.weeks)
+
+    def totals(self, name):
+        return self.matrix(name).sum(axis=1)
+
+    # 相对基准场景的差值和差值百分比（基准为0时百分比为空）
+    def delta(self, name, baseline):
+        current, base = self.matrix(name), self.matrix(baseline)
+        diff = current - base
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct = np.where(base != 0, diff / base, np.nan)
+        return diff, pct
+
+    def total_delta(self, name, baseline):
+        current, base = self.totals(name), self.totals(baseline)
+        diff = current - base
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct = np.where(base != 0, diff / base, np.nan)
+        return diff, pct
+
+    # 各组合在所有场景中相对基准的最大差值绝对值
+    def max_abs_delta(self, baseline):
+        deltas = [np.abs(self.total_delta(name, baseline)[0]) for name in self.names if name != baseline]
+        return np.max(deltas, axis=0) if deltas else np.zeros(len(self.labels))
+
+    # 汇总表：每个组合一行，各场景的总销量以及相对基准的差值
+    def summary(self, baseline):
+        table = pd.DataFrame({'组合': list(self.labels.values())})
+        for name in self.names:
+            table[name] = self.totals(name)
+            if name != baseline:
+                diff, pct = self.total_delta(name, baseline)
+                table[f'{name} 差值'] = diff
+                table[f'{name} 差值%'] = pct
+        return table
+
+
+# scenarios: [(名称, 目标周数, active_configs)]；某场景中没有的组合销量记为0
+def compare_scenarios(filtered_df, scenarios, schema=None):
+    schema = schema or PredictorSchema(filtered_df.columns)
+    weeks = max((target_week for _, target_week, _ in scenarios), default=0)
+    positions = filtered_df.groupby(analytics.COMBO_COLUMNS, sort=False).indices
+
+    labels = {}
+    for _, _, configs in scenarios:
+        for key, config in configs.items():
+            labels.setdefault(key, combo_label(config))
+
+    rankings = {}
+    weekly = {}
+    for name, target_week, configs in scenarios:
+        result = {}
+        for key in labels:
+            config = configs.get(key)
+            sales = np.zeros(weeks)
+            if config is not None:
+                types = tuple(config['store_types']) if config['store_types'] and schema.store_type_column else None
+                cumulative = rankings.get((key, types))
+                if cumulative is None:
+                    index = positions.get((config['ip_name'], config['product_code'], config['channel'], config['market']), [])
+                    rows = filtered_df.iloc[index]
+                    if types is not None:
+                        rows = rows[rows[schema.store_type_column].isin(types)]
+                    cumulative = rankings[(key, types)] = rank_stores(rows, schema, weeks)
+                count = min(int(config['store_count']), len(cumulative))
+                if count > 0:
+                    sales[:target_week] = cumulative[count - 1, :target_week]
+            result[key] = sales
+        weekly[name] = result
+    return ScenarioComparison([name for name, _, _ in scenarios], labels, weekly, weeks)
@@ -0,0 +1,76 @@
+import re
+
+# 列结构：每张表在加载时校验一次并解析出计算中用到的列名，之后的计算直接使用解析结果，
+# 不再在循环里拼接列名或判断列是否存在
+#   schema = PredictorSchema(df.columns)
+#   schema.first_week_column, schema.week_columns(8), schema.store_type_column
+#   schema.horizon（数据中的周数）, schema.week_columns(12, start_week=5)  ->  第5~12周的列名
+
+SOCIAL_PLATFORMS = ['tiktok_social', 'ins', 'facebook', 'twitter', 'news']
+ECOMMERCE_PLATFORMS = ['amazon', 'tiktok_sale']
+
+DASHBOARD_REQUIRED = ['日期', 'IP名称', '数据状态']
+PREDICTOR_REQUIRED = ['IP名称', '商品编号', '销售渠道', '市场', '门店编号']
+
+# 门店类型列（按优先级）
+STORE_TYPE_COLUMNS = ['门店信息_门店商圈类型', '门店商圈类型']
+# 用于门店排名的首周销量列（按优先级）
+FIRST_WEEK_COLUMNS = ['销量_上市首周', '销量_上市第1周', '销量_上市第一周']
+# 第1周销量列（按优先级），其余周为 销量_上市第N周
+WEEK_ONE_COLUMNS = ['销量_上市第1周', '销量_上市第一周', '销量_上市首周']
+WEEK_COLUMN_PATTERN = re.compile(r'^销量_上市第(\d+)周$')
+
+
+def check_required(columns, required, sheet_label):
+    missing = [column for column in required if column not in columns]
+    if missing:
+        raise ValueError(f"{sheet_label}缺少必需的列: {', '.join(missing)}")
+
+
+def first_present(columns, candidates):
+    return next((column for column in candidates if column in columns), None)
+
+
+def platform_columns(columns, prefix, platforms):
+    return {platform: f'{prefix}{platform}' for platform in platforms if f'{prefix}{platform}' in columns}
+
+
+class DashboardSchema:
+    def __init__(self, columns):
+        columns = set(columns)
+        check_required(columns, DASHBOARD_REQUIRED, '数据大屏')
+        self.post_columns = platform_columns(columns, '社媒热度_发帖数_', SOCIAL_PLATFORMS)
+        self.engagement_columns = platform_columns(columns, '社媒热度_互动量_', SOCIAL_PLATFORMS)
+        self.sales_columns = platform_columns(columns, '电商热度_销量_', ECOMMERCE_PLATFORMS)
+        self.fan_heat_column = '社媒热度_同人热度' if '社媒热度_同人热度' in columns else None
+        self.secondhand_column = '电商热度_二手销量' if '电商热度_二手销量' in columns else None
+
+    # 按选中平台返回存在的列（保持平台顺序）
+    def select(self, mapping, platforms):
+        return [mapping[platform] for platform in platforms if platform in mapping]
+
+
+class PredictorSchema:
+    def __init__(self, columns):
+        columns = set(columns)
+        check_required(columns, PREDICTOR_REQUIRED, '预测结果底表')
+        self.store_type_column = first_present(columns, STORE_TYPE_COLUMNS)
+        self.first_week_column = first_present(columns, FIRST_WEEK_COLUMNS)
+        self.start_date_column = '销售起始日期' if '销售起始日期' in columns else None
+
+        weeks = {}
+        week_one = first_present(columns, WEEK_ONE_COLUMNS)
+        if week_one:
+            weeks[1] = week_one
+        for column in columns:
+            match = WEEK_COLUMN_PATTERN.match(column)
+            if match and int(match.group(1)) > 1:
+                weeks[int(match.group(1))] = column
+        # 第N周的列名（下标 N-1），中间缺失的周为 None
+        self.weekly_columns = tuple(weeks.get(week) for week in range(1, max(weeks, default=0) + 1))
+        self.horizon = len(self.weekly_columns)
+
+    # 起始周到目标周的列名，不存在的周为 None
+    def week_columns(self, target_week, start_week=1):
+        columns = list(self.weekly_columns[:target_week]) + [None] * max(target_week - self.horizon, 0)
+        return columns[start_week - 1:]
@@ -0,0 +1,99 @@
+import heapq
+import importlib.util
+import threading
+
+import numpy as np
+
+# 筛选项的搜索索引（不依赖Streamlit）：IP名称、商品属性等可选值多达数万个时，多选框只列出搜索结果，
+# 不再把全部选项发送到浏览器
+# 每个可选值的搜索键（去空白、小写；安装了 pypinyin 时再加上全拼和拼音首字母）按二元字符组建倒排索引，
+# 查询时对各二元组的行号列表求交集，再逐个确认是否包含完整查询串；同一数据版本的同一列只建一次索引，所有会话共用
+#   index = search_index.get_index(snapshot.version, 'ip_selector', options)
+#   index.search('甄嬛', limit=100)   ->  匹配的可选值（完全匹配、前缀匹配优先，其次按匹配位置和长度）
+
+# 可选值不超过该数量时直接使用普通多选框
+PLAIN_LIMIT = 200
+# 每次搜索最多列出的结果数
+RESULT_LIMIT = 100
+
+
+def normalize(text):
+    return ''.join(str(text).split()).casefold()
+
+
+def _grams(key):
+    return {key[i:i + 2] for i in range(len(key) - 1)} if len(key) > 1 else {key}
+
+
+# 名称的拼音搜索键（全拼、首字母）；未安装 pypinyin 时为空
+def pinyin_keys(name):
+    if importlib.util.find_spec('pypinyin') is None:
+        return []
+    from pypinyin import Style, lazy_pinyin
+
+    syllables = lazy_pinyin(name)
+    initials = lazy_pinyin(name, style=Style.FIRST_LETTER)
+    return [normalize(''.join(syllables)), normalize(''.join(initials))]
+
+
+class SearchIndex:
+    def __init__(self, options, pinyin=None):
+        self.options = list(options)
+        pinyin = importlib.util.find_spec('pypinyin') is not None if pinyin is None else pinyin
+        # 每个可选值的搜索键，第一个为名称本身
+        self.keys = []
+        postings = {}
+        for position, option in enumerate(self.options):
+            keys = [normalize(option)]
+            if pinyin:
+                keys.extend(key for key in pinyin_keys(str(option)) if key and key != keys[0])
+            self.keys.append(keys)
+            for key in keys:
+                for gram in _grams(key) | set(key):
+                    postings.setdefault(gram, []).append(position)
+        # 行号升序且不重复，便于求交集
+        self.postings = {gram: np.unique(positions) for gram, positions in postings.items()}
+
+    def __len__(self):
+        return len(self.options)
+
+    def _candidates(self, query):
+        lists = [self.postings.get(gram) for gram in _grams(query)]
+        if any(positions is None for positions in lists):
+            return np.array([], dtype=np.int64)
+        lists.sort(key=len)
+        candidates = lists[0]
+        for positions in lists[1:]:
+            candidates = np.intersect1d(candidates, positions, assume_unique=True)
+        return candidates
+
+    # 空查询返回前 limit 个可选值
+    def search(self, query, limit=RESULT_LIMIT):
+        query = normalize(query)
+        if not query:
+            return self.options[:limit]
+        ranked = []
+        for position in self._candidates(query).tolist():
+            best = None
+            for key in self.keys[position]:
+                found = key.find(query)
+                if found >= 0:
+                    rank = (key != query, found > 0, found, len(key))
+                    best = rank if best is None else min(best, rank)
+            if best is not None:
+                ranked.append(best + (position,))
+        return [self.options[rank[-1]] for rank in heapq.nsmallest(limit, ranked)]
+
+
+_cache = {}
+_lock = threading.Lock()
+
+
+# name 区分不同的筛选项；每个筛选项只保留最新数据版本的索引
+def get_index(version, name, options):
+    with _lock:
+        cached = _cache.get(name)
+        if cached is None or cached[0] != version:
+            cached = (version, SearchIndex(options))
+            _cache[name] = cached
+        return cached[1]
@@ -0,0 +1,222 @@
+import datetime
+import heapq
+import os
+
+import pandas as pd
+
+import analytics
+import data_loader
+import schema
+
+# 流式处理预测结果底表（不把整张表读入内存）
+# 按块读取门店级数据（xlsx 用 openpyxl 只读模式逐行迭代，parquet 按批读取），
+# 逐块累积每个组合的首周销量排名和每周销量，结果与 analytics.calculate_sales_data 相同
+#   chunks = iter_predictor_chunks('demo_data.xlsx', chunk_rows=50000, progress=print)
+#   configs = collect_combo_configs(chunks, filters)
+#   accumulator = StreamingSalesAccumulator(configs, target_week=8)
+#   for chunk in iter_predictor_chunks(...):
+#       accumulator.add(filter_chunk(chunk, filters))
+#   accumulator.results()
+
+
+# 逐块读取预测结果底表，progress(已读行数, 总行数或None) 在每块后调用
+def iter_predictor_chunks(source, chunk_rows=50000, progress=None, columns=None):
+    if os.path.isdir(source):
+        chunks = _iter_parquet(os.path.join(source, f'{data_loader.PREDICTOR_SHEET}.parquet'), chunk_rows, columns)
+    else:
+        chunks = _iter_xlsx(source, data_loader.PREDICTOR_SHEET, chunk_rows, columns)
+    done = 0
+    for chunk, total in chunks:
+        done += len(chunk)
+        chunk, _ = data_loader.prepare_predictor(chunk)
+        yield chunk
+        if progress is not None:
+            progress(done, total)
+
+
+def _iter_parquet(path, chunk_rows, columns):
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    total = parquet_file.metadata.num_rows
+    if columns is not None:
+        columns = [column for column in columns if column in parquet_file.schema_arrow.names]
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+        yield batch.to_pandas(), total
+
+
+def _iter_xlsx(path, sheet_name, chunk_rows, columns):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet_name]
+        # 只读模式下 max_row 来自工作表的 dimension 记录，可能不存在
+        total = worksheet.max_row - 1 if worksheet.max_row else None
+        rows = worksheet.iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        keep = [i for i, name in enumerate(header) if columns is None or name in columns]
+        names = [header[i] for i in keep]
+        buffer = []
+        for row in rows:
+            buffer.append([row[i] if i < len(row) else None for i in keep])
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame(buffer, columns=names), total
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=names), total
+    finally:
+        workbook.close()
+
+
+# 流式计算需要的列（parquet 只读取这些列）
+def required_columns(target_week):
+    return list(dict.fromkeys(
+        analytics.COMBO_COLUMNS
+        + ['IP类别', '商品材质', '商品用途', '门店编号', '销售起始日期']
+        + schema.STORE_TYPE_COLUMNS + schema.FIRST_WEEK_COLUMNS + schema.WEEK_ONE_COLUMNS
+        + [f'销量_上市第{week}周' for week in range(2, target_week + 1)]
+    ))
+
+
+def filter_chunk(chunk, filters):
+    return analytics.filter_predictor_data(
+        chunk, filters.get('markets'), filters.get('channels'), filters.get('ip_categories'),
+        filters.get('materials'), filters.get('purposes')
+    )
+
+
+# 第一遍：收集每个组合的默认配置（与 analytics.build_config_table 的默认值一致）
+# 每个组合只保存首次销售日期、门店编号集合和门店类型列表
+def collect_combo_configs(chunks, filters, store_counts=None, store_types=None, deleted_combinations=()):
+    store_counts = store_counts or {}
+    store_types = store_types or {}
+    combos = {}
+    sheet_schema = None
+    for chunk in chunks:
+        sheet_schema = sheet_schema or schema.PredictorSchema(chunk.columns)
+        chunk = filter_chunk(chunk, filters)
+        if chunk.empty:
+            continue
+        for key, group in chunk.groupby(analytics.COMBO_COLUMNS, sort=False):
+            combo = combos.get(key)
+            if combo is None:
+                combo = combos[key] = {'start_date': None, 'stores': set(), 'types': []}
+            if sheet_schema.start_date_column:
+                start_date = group[sheet_schema.start_date_column].min()
+                if combo['start_date'] is None or start_date < combo['start_date']:
+                    combo['start_date'] = start_date
+            combo['stores'].update(group['门店编号'].unique())
+            if sheet_schema.store_type_column:
+                for store_type in group[sheet_schema.store_type_column].dropna().unique():
+                    if store_type not in combo['types']:
+                        combo['types'].append(store_type)
+
+    configs = {}
+    for (ip_name, product_code, channel, market), combo in combos.items():
+        combo_key = analytics.make_combo_key(ip_name, product_code, channel, market)
+        if combo_key in deleted_combinations:
+            continue
+        available_types = combo['types']
+        # 页面表格每个组合只选择一个门店类型；显式给出的类型列表保持原样
+        default_types = [available_types[0] if available_types else "N/A"]
+        configs[combo_key] = {
+            'ip_name': ip_name,
+            'product_code': product_code,
+            'channel': channel,
+            'market': market,
+            'start_date': combo['start_date'] if combo['start_date'] is not None else datetime.date.today(),
+            'store_count': store_counts.get(combo_key, len(combo['stores'])),
+            'store_types': list(store_types[combo_key]) if combo_key in store_types else default_types,
+        }
+    return configs
+
+
+# 一个组合的累积状态：按首周销量保留前N个门店的小顶堆
+class _ComboState:
+    def __init__(self, store_count, weeks):
+        self.store_count = store_count
+        self.weeks = weeks
+        self.heap = []
+        self.top = {}
+        self.seen = set()
+        self.seq = 0
+
+    def add(self, store, first_week, weekly):
+        if store in self.seen:
+            # 门店排名由首次出现的行决定，后续行只累加到仍在前N中的门店
+            sums = self.top.get(store)
+            if sums is not None:
+                for i, value in enumerate(weekly):
+                    sums[i] += value
+            return
+        self.seen.add(store)
+        # 首周销量为空的门店排在最后（见 analytics.first_week_rank_key），相同时先出现的门店排在前面（与稳定排序一致）
+        key = analytics.first_week_rank_key(first_week) + (-self.seq, store)
+        self.seq += 1
+        if self.store_count <= 0:
+            return
+        if len(self.heap) < self.store_count:
+            heapq.heappush(self.heap, key)
+            self.top[store] = list(weekly)
+        elif key[:3] > self.heap[0][:3]:
+            evicted = heapq.heapreplace(self.heap, key)
+            del self.top[evicted[-1]]
+            self.top[store] = list(weekly)
+
+    # 按排名返回门店列表和每周销量合计
+    def result(self):
+        ranked = sorted(self.heap, key=lambda item: item[:3], reverse=True)
+        store_ids = [item[-1] for item in ranked]
+        weekly = [0] * self.weeks
+        for store in store_ids:
+            for i, value in enumerate(self.top[store]):
+                weekly[i] += value
+        return store_ids, weekly
+
+
+# 第二遍：逐块累积各组合前N门店的每周销量
+class StreamingSalesAccumulator:
+    def __init__(self, configs, target_week):
+        self.configs = configs
+        self.target_week = target_week
+        self.states = {
+            (config['ip_name'], config['product_code'], config['channel'], config['market']): (combo_key, _ComboState(int(config['store_count']), target_week))
+            for combo_key, config in configs.items()
+        }
+        self.rows = 0
+        self.schema = None
+
+    def add(self, chunk):
+        self.rows += len(chunk)
+        if chunk.empty:
+            return
+        self.schema = self.schema or schema.PredictorSchema(chunk.columns)
+        first_week_column = self.schema.first_week_column
+        type_column = self.schema.store_type_column
+        week_columns = self.schema.week_columns(self.target_week)
+
+        for key, group in chunk.groupby(analytics.COMBO_COLUMNS, sort=False):
+            entry = self.states.get(key)
+            if entry is None:
+                continue
+            combo_key, state = entry
+            store_types = self.configs[combo_key]['store_types']
+            if store_types and type_column:
+                group = group[group[type_column].isin(store_types)]
+            stores = group['门店编号'].tolist()
+            first_weeks = group[first_week_column].tolist() if first_week_column else [0] * len(group)
+            weekly_columns = [
+                group[column].fillna(0).tolist() if column else [0] * len(group)
+                for column in week_columns
+            ]
+            for i, store in enumerate(stores):
+                state.add(store, first_weeks[i], [values[i] for values in weekly_columns])
+
+    # 返回 {combo_key: (总销量, 前N门店列表, 每周销量)}，与 calculate_sales_data / calculate_weekly_sales 一致
+    def results(self):
+        results = {}
+        for combo_key, state in self.states.values():
+            store_ids, weekly = state.result()
+            results[combo_key] = (sum(weekly), store_ids, weekly)
+        return results